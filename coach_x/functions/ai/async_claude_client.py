@@ -0,0 +1,372 @@
+"""
+异步 Claude API 客户端
+
+基于 AsyncAnthropic，所有请求共享同一个 httpx.AsyncClient 连接池
+（keep-alive + HTTP/2 多路复用），避免每个请求重新建立 TLS 连接。
+
+## 使用方式
+
+- 异步代码：`client = get_async_claude_client()`，直接 `await client.call_claude(...)`
+- 同步 handler：设置 ANTHROPIC_ASYNC_CLIENT=true 后 `get_claude_client()`
+  返回 BridgedClaudeClient，接口与 ClaudeClient 完全相同，
+  内部在后台事件循环线程上执行异步调用
+
+## 注意
+
+httpx.AsyncClient 的连接绑定在创建它们的事件循环上，
+因此单例客户端只应在同一个事件循环中使用（BridgedClaudeClient 使用的后台循环）
+"""
+
+import os
+import asyncio
+import threading
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List
+import httpx
+from anthropic import AsyncAnthropic, APIError
+from utils.logger import logger
+from .claude_client import _ClaudeClientBase, SKILL_MODEL
+from .rate_limiter import RateLimitQueueTimeout, rate_limit_user, current_rate_limit_user
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 连接池配置（可通过环境变量覆盖默认值）
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+
+def _build_limits() -> httpx.Limits:
+    """
+    配置连接池上限
+
+    - max_connections: 最大并发连接数
+    - max_keepalive_connections: 保持空闲的连接数（热实例复用）
+    - keepalive_expiry: 空闲连接保活秒数
+    """
+    return httpx.Limits(
+        max_connections=int(os.environ.get('ANTHROPIC_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(
+            os.environ.get('ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS', DEFAULT_MAX_KEEPALIVE_CONNECTIONS)
+        ),
+        keepalive_expiry=float(os.environ.get('ANTHROPIC_KEEPALIVE_EXPIRY', DEFAULT_KEEPALIVE_EXPIRY)),
+    )
+
+
+class AsyncClaudeClient(_ClaudeClientBase):
+    """异步 Claude API 客户端（共享连接池）"""
+
+    def __init__(self):
+        """初始化客户端，创建共享的 httpx.AsyncClient 连接池"""
+        super().__init__()
+
+        self.http_client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=_build_limits(),
+            http2=HTTP2_AVAILABLE,
+        )
+
+        self.client = AsyncAnthropic(
+            api_key=self.api_key,
+            timeout=self.timeout,
+            max_retries=3,  # 自动重试 3 次（默认 2 次）
+            http_client=self.http_client,
+        )
+
+        logger.info(f'🔌 AsyncClaudeClient 已初始化 (HTTP/2: {HTTP2_AVAILABLE})')
+
+    async def _acquire_slot(self, api_params: Dict[str, Any], user: Optional[str] = None):
+        """
+        在线程中排队获取准入额度，避免阻塞事件循环
+
+        Returns:
+            RateLimitTicket，调用完成后必须 release()
+        """
+        return await asyncio.to_thread(self._acquire_ticket, api_params, user)
+
+    async def call_claude(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_format: str = 'json',
+        cached_context: Optional[str] = None,
+        endpoint: str = 'call_claude',
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        调用 Claude API（异步）
+
+        参数和返回值与 ClaudeClient.call_claude 相同
+        """
+        try:
+            logger.info(f'🤖 调用 Claude API (async) - Model: {self.model}')
+            logger.debug(f'User Prompt (前100字): {user_prompt[:100]}...')
+
+            api_params = self._build_message_params(system_prompt, user_prompt, cached_context=cached_context)
+
+            ticket = await self._acquire_slot(api_params, user_id)
+            try:
+                response = await self.client.messages.create(**api_params)
+                result = self._parse_message_response(response, response_format, 'Claude')
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            finally:
+                ticket.release()
+            return result
+
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
+
+        except APIError as e:
+            return self._api_error_result(e, 'Claude')
+
+        except Exception as e:
+            return self._unknown_error_result(e)
+
+    async def call_claude_vision(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        image_url: str,
+        response_format: str = 'json',
+        cached_context: Optional[str] = None,
+        endpoint: str = 'call_claude_vision',
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        调用 Claude Vision API 分析图片（异步）
+
+        参数和返回值与 ClaudeClient.call_claude_vision 相同
+        """
+        try:
+            logger.info(f'🤖 调用 Claude Vision API (async) - Model: {self.model}')
+            logger.info(f'图片 URL: {image_url[:100]}...')
+
+            api_params = self._build_message_params(
+                system_prompt, user_prompt, cached_context=cached_context, image_url=image_url
+            )
+
+            ticket = await self._acquire_slot(api_params, user_id)
+            try:
+                response = await self.client.messages.create(**api_params)
+                result = self._parse_message_response(response, response_format, 'Claude Vision')
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            finally:
+                ticket.release()
+            return result
+
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
+
+        except APIError as e:
+            return self._api_error_result(e, 'Claude Vision')
+
+        except Exception as e:
+            return self._unknown_error_result(e)
+
+    async def call_claude_streaming(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tools: list = None,
+        cached_context: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        endpoint: str = 'call_claude_streaming',
+        user_id: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        使用 Tool Use + Streaming 调用 Claude（异步生成器）
+
+        事件格式与 ClaudeClient.call_claude_streaming 相同
+        """
+        try:
+            logger.info(f'🔄 开始流式调用 Claude (async) - Model: {self.model}')
+            if tools:
+                logger.info(f'Tools: {[t["name"] for t in tools]}')
+            else:
+                logger.info('Tools: None (纯文本模式)')
+
+            api_params = self._build_message_params(
+                system_prompt, user_prompt, tools=tools, cached_context=cached_context, history=history
+            )
+
+            ticket = await self._acquire_slot(api_params, user_id)
+            try:
+                async with self.client.messages.stream(**api_params) as stream:
+                    async for event in stream:
+                        translated = self._translate_stream_event(event)
+                        if translated:
+                            yield translated
+
+                    final_message = await stream.get_final_message()
+                    final_events = self._final_message_events(final_message)
+                    self._record_usage(ticket, final_events[0]['usage'], endpoint)
+                    for final_event in final_events:
+                        yield final_event
+            finally:
+                ticket.release()
+
+        except RateLimitQueueTimeout as e:
+            yield {
+                'type': 'error',
+                'error': self._queue_timeout_result(e)['error']
+            }
+
+        except Exception as e:
+            logger.error(f'❌ Streaming 调用失败: {str(e)}', exc_info=True)
+            yield {
+                'type': 'error',
+                'error': str(e)
+            }
+
+    async def call_claude_with_skill(
+        self,
+        user_prompt: str,
+        skill_id: str,
+        system_prompt: Optional[str] = None,
+        endpoint: str = 'call_claude_with_skill',
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        使用 Claude Skill 调用 API（异步）
+
+        参数和返回值与 ClaudeClient.call_claude_with_skill 相同
+        """
+        try:
+            logger.info('🤖 调用 Claude API with Skill (async)')
+            logger.info(f'🔧 Skill ID: {skill_id}')
+            logger.info(f'📝 Model: {SKILL_MODEL} (强制)')
+
+            api_params = self._build_skill_params(user_prompt, skill_id, system_prompt)
+
+            ticket = await self._acquire_slot(api_params, user_id)
+            try:
+                response = await self.client.beta.messages.create(**api_params)
+                result = self._parse_skill_response(response)
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            finally:
+                ticket.release()
+            return result
+
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
+
+        except APIError as e:
+            return self._api_error_result(e, 'Claude')
+
+        except Exception as e:
+            return self._unknown_error_result(e)
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self.http_client.aclose()
+
+
+# ==================== 同步桥接 ====================
+
+class _EventLoopThread:
+    """
+    后台事件循环线程
+
+    同步代码通过 run_sync / iterate_sync 在该循环上执行协程，
+    所有调用共享同一个循环，因此也共享 AsyncClaudeClient 的连接池
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='claude-async-loop',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run_sync(self, coro) -> Any:
+        """
+        在后台循环上执行协程，阻塞等待结果
+
+        协程运行在后台线程的上下文中，因此显式带上调用方的限流用户标识
+        """
+        user = current_rate_limit_user()
+        return asyncio.run_coroutine_threadsafe(_run_as_user(user, coro), self.loop).result()
+
+    def iterate_sync(self, agen) -> Iterator[Any]:
+        """将异步生成器转换为同步生成器（逐个事件转发）"""
+        try:
+            while True:
+                try:
+                    item = self.run_sync(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield item
+        finally:
+            # 调用方提前停止迭代时，关闭底层 stream 释放连接
+            self.run_sync(agen.aclose())
+
+
+async def _run_as_user(user: str, coro) -> Any:
+    """在指定限流用户标识下执行协程"""
+    with rate_limit_user(user):
+        return await coro
+
+
+_event_loop_thread: Optional[_EventLoopThread] = None
+_async_claude_client: Optional[AsyncClaudeClient] = None
+_singleton_lock = threading.Lock()
+
+
+def _get_event_loop_thread() -> _EventLoopThread:
+    """获取后台事件循环线程单例"""
+    global _event_loop_thread
+    with _singleton_lock:
+        if _event_loop_thread is None:
+            _event_loop_thread = _EventLoopThread()
+        return _event_loop_thread
+
+
+def get_async_claude_client() -> AsyncClaudeClient:
+    """获取异步 Claude 客户端单例"""
+    global _async_claude_client
+    with _singleton_lock:
+        if _async_claude_client is None:
+            _async_claude_client = AsyncClaudeClient()
+        return _async_claude_client
+
+
+class BridgedClaudeClient:
+    """
+    同步桥接客户端
+
+    接口与 ClaudeClient 相同，内部通过后台事件循环调用 AsyncClaudeClient，
+    让现有同步 handler 无需修改即可共享连接池
+    """
+
+    def __init__(self):
+        self._loop_thread = _get_event_loop_thread()
+        self._async_client = get_async_claude_client()
+
+    def __getattr__(self, name: str) -> Any:
+        # model / max_tokens / _build_* 等属性直接读取异步客户端
+        return getattr(self._async_client, name)
+
+    def call_claude(self, *args, **kwargs) -> Dict[str, Any]:
+        """同 ClaudeClient.call_claude"""
+        return self._loop_thread.run_sync(self._async_client.call_claude(*args, **kwargs))
+
+    def call_claude_vision(self, *args, **kwargs) -> Dict[str, Any]:
+        """同 ClaudeClient.call_claude_vision"""
+        return self._loop_thread.run_sync(self._async_client.call_claude_vision(*args, **kwargs))
+
+    def call_claude_streaming(self, *args, **kwargs) -> Iterator[Dict[str, Any]]:
+        """同 ClaudeClient.call_claude_streaming"""
+        return self._loop_thread.iterate_sync(self._async_client.call_claude_streaming(*args, **kwargs))
+
+    def call_claude_with_skill(self, *args, **kwargs) -> Dict[str, Any]:
+        """同 ClaudeClient.call_claude_with_skill"""
+        return self._loop_thread.run_sync(self._async_client.call_claude_with_skill(*args, **kwargs))
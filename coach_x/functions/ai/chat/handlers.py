@@ -13,7 +13,10 @@ from datetime import datetime, timedelta
 
 from utils.logger import logger
 from ..memory_manager import MemoryManager
+from ..rate_limiter import rate_limit_user
 from .streaming import stream_chat_with_ai
+from students.training_rollups import summarize_trainings
+from utils.concurrency import run_with_dependencies
 
 @https_fn.on_request(
     timeout_sec=540,
@@ -60,13 +63,7 @@ def chat_with_ai(req: https_fn.Request) -> Response:
             
         logger.info(f"💬 [Chat] User: {user_id}, Message: {message[:50]}...")
         
-        # Fetch Context (Profile, Plans, History)
-        user_profile, exercise_plan, diet_plan, conversation_history = _fetch_chat_context(user_id)
-        
-        # Check for shortcut intents and fetch extra context
-        extra_context = {}
-        db = firestore.client()
-        
+        # Check for shortcut intents (decides which extra context to fetch)
         # Shortcuts keywords (English and Chinese)
         analyze_training_history_keywords = ["Analyze Training History", "分析训练历史"]
         analyze_diet_keywords = ["Analyze Diet Plan", "分析饮食计划"]
@@ -92,23 +89,24 @@ def chat_with_ai(req: https_fn.Request) -> Response:
             should_fetch_trainings = True 
             logger.info("🔍 Detected intent: Analyze Training Plan")
             
-        if should_fetch_weight:
-            extra_context['weight_history'] = _fetch_weight_history(db, user_id)
-            
-        if should_fetch_trainings:
-            extra_context['recent_trainings'] = _fetch_recent_trainings(db, user_id)
+        # Fetch Context (Profile, Plans, History, extra context) concurrently
+        (
+            user_profile, exercise_plan, diet_plan, conversation_history, conversation_summary, extra_context
+        ) = _fetch_chat_context(user_id, should_fetch_weight, should_fetch_trainings)
 
         def generate():
-            for event in stream_chat_with_ai(
-                user_id=user_id,
-                user_message=message,
-                user_profile=user_profile,
-                exercise_plan=exercise_plan,
-                diet_plan=diet_plan,
-                conversation_history=conversation_history,
-                extra_context=extra_context
-            ):
-                yield f'data: {json.dumps(event, ensure_ascii=False)}\n\n'
+            with rate_limit_user(user_id):
+                for event in stream_chat_with_ai(
+                    user_id=user_id,
+                    user_message=message,
+                    user_profile=user_profile,
+                    exercise_plan=exercise_plan,
+                    diet_plan=diet_plan,
+                    conversation_history=conversation_history,
+                    extra_context=extra_context,
+                    conversation_summary=conversation_summary
+                ):
+                    yield f'data: {json.dumps(event, ensure_ascii=False)}\n\n'
                 
         return Response(
             generate(),
@@ -127,60 +125,104 @@ def chat_with_ai(req: https_fn.Request) -> Response:
             mimetype='text/event-stream'
         )
 
-def _fetch_chat_context(user_id: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]], list]:
+def _fetch_chat_context(
+    user_id: str,
+    fetch_weight: bool = False,
+    fetch_trainings: bool = False
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[Dict[str, Any]], list, str, Dict[str, Any]]:
     """
     Fetch all necessary context for chat.
     
+    Reads run concurrently: the memory profile, weight and training queries start
+    immediately alongside the user doc; both plan reads start (as one batched get)
+    as soon as the user doc arrives.
+    
     Returns:
-        (user_profile, exercise_plan, diet_plan, conversation_history)
+        (user_profile, exercise_plan, diet_plan, conversation_history, conversation_summary, extra_context)
     """
     db = firestore.client()
     
-    # 1. Fetch User Profile
-    user_ref = db.collection('users').document(user_id)
-    user_doc = user_ref.get()
+    tasks = {
+        'user_profile': lambda: _fetch_user_profile(db, user_id),
+        'plans': lambda user_profile: _fetch_active_plans(db, user_profile),
+        'memory': lambda: _fetch_conversation_memory(user_id),
+    }
+    if fetch_weight:
+        tasks['weight_history'] = lambda: _fetch_weight_history(db, user_id)
+    if fetch_trainings:
+        tasks['recent_trainings'] = lambda: _fetch_recent_trainings(db, user_id)
+    
+    results = run_with_dependencies(
+        tasks,
+        dependencies={'plans': ['user_profile']},
+        thread_name_prefix='chat-context'
+    )
+    
+    exercise_plan, diet_plan = results['plans']
+    conversation_history, conversation_summary = results['memory']
+    extra_context = {
+        key: results[key]
+        for key in ('weight_history', 'recent_trainings')
+        if key in results
+    }
+    
+    return (
+        results['user_profile'], exercise_plan, diet_plan,
+        conversation_history, conversation_summary, extra_context
+    )
+
+def _fetch_user_profile(db, user_id: str) -> Dict[str, Any]:
+    """Fetch the user doc."""
+    user_doc = db.collection('users').document(user_id).get()
     
     if not user_doc.exists:
         # Should ideally error out, but fallback to empty for robustness
         logger.warning(f"⚠️ [Chat] User doc not found: {user_id}")
-        user_profile = {'id': user_id, 'name': '学员'}
-    else:
-        user_profile = user_doc.to_dict()
-        user_profile['id'] = user_id
-        
-    # 2. Fetch Active Plans
+        return {'id': user_id, 'name': '学员'}
+    
+    user_profile = user_doc.to_dict()
+    user_profile['id'] = user_id
+    return user_profile
+
+def _fetch_active_plans(db, user_profile: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Fetch the active exercise and diet plans in one batched read."""
+    refs = {}
     exercise_plan_id = user_profile.get('activeExercisePlanId')
     diet_plan_id = user_profile.get('activeDietPlanId')
-    
-    exercise_plan = None
     if exercise_plan_id:
-        try:
-            ep_doc = db.collection('exercisePlans').document(exercise_plan_id).get()
-            if ep_doc.exists:
-                exercise_plan = ep_doc.to_dict()
-        except Exception as e:
-            logger.warning(f"⚠️ [Chat] Failed to fetch exercise plan {exercise_plan_id}: {e}")
-            
-    diet_plan = None
+        refs['exercise'] = db.collection('exercisePlans').document(exercise_plan_id)
     if diet_plan_id:
-        try:
-            dp_doc = db.collection('dietPlans').document(diet_plan_id).get()
-            if dp_doc.exists:
-                diet_plan = dp_doc.to_dict()
-        except Exception as e:
-            logger.warning(f"⚠️ [Chat] Failed to fetch diet plan {diet_plan_id}: {e}")
-            
-    # 3. Fetch Conversation History (from MemoryManager)
+        refs['diet'] = db.collection('dietPlans').document(diet_plan_id)
+    
+    if not refs:
+        return None, None
+    
+    try:
+        docs = {doc.reference.path: doc for doc in db.get_all(list(refs.values()))}
+    except Exception as e:
+        logger.warning(f"⚠️ [Chat] Failed to fetch active plans {exercise_plan_id}, {diet_plan_id}: {e}")
+        return None, None
+    
+    plans = {}
+    for key, ref in refs.items():
+        doc = docs.get(ref.path)
+        if doc and doc.exists:
+            plans[key] = doc.to_dict()
+            plans[key]['id'] = doc.id
+        else:
+            plans[key] = None
+    
+    return plans.get('exercise'), plans.get('diet')
+
+def _fetch_conversation_memory(user_id: str) -> Tuple[list, str]:
+    """Fetch stored raw turns + rolling summary of older ones (from MemoryManager)."""
+    # (raw turns are bounded by compaction and only grow by appending between compactions)
     try:
         profile = MemoryManager.get_user_memory(user_id)
-        # Assuming get_recent_conversations exists and returns list of dicts
-        # Check streaming.py usage: profile.get_recent_conversations(limit=3)
-        conversation_history = profile.get_recent_conversations(limit=10) # Get last 10 messages for context
+        return list(profile.conversation_history), profile.conversation_summary
     except Exception as e:
         logger.warning(f"⚠️ [Chat] Failed to fetch history: {e}")
-        conversation_history = []
-        
-    return user_profile, exercise_plan, diet_plan, conversation_history
+        return [], ''
 
 def _fetch_weight_history(db, user_id: str, days: int = 30) -> List[Dict[str, Any]]:
     """Fetch recent weight history."""
@@ -221,18 +263,24 @@ def _fetch_recent_trainings(db, user_id: str, days: int = 30) -> List[Dict[str,
             .order_by('date', direction=firestore.Query.DESCENDING) \
             .get()
             
+        records = [doc.to_dict() for doc in docs]
+        # Volumes for the whole window are parsed and summed in one vectorized pass
+        day_summaries = summarize_trainings(records)
+
         trainings = []
-        for doc in docs:
-            data = doc.to_dict()
+        for data in records:
             # Summarize training data to save context window
             exercises = data.get('exercises', [])
             completed_exercises = [e['name'] for e in exercises if e.get('completed')]
+            day = day_summaries.get(data.get('date')) or {}
             
             trainings.append({
                 'date': data.get('date'),
                 'completed': data.get('completionStatus') == 'completed',
                 'exercises_count': len(exercises),
                 'completed_exercises_count': len(completed_exercises),
+                'total_volume': day.get('volume', 0),
+                'volume_unit': day.get('unit') or 'kg',
                 'diet_adherence': 'Yes' if data.get('diet', {}).get('meals') else 'No' # Simple check
             })
         return trainings
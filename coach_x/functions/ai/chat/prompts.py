@@ -7,22 +7,29 @@ Prompts for the AI Coach chat feature.
 from typing import Dict, Any, List, Optional
 import json
 
+from plans.digest import get_exercise_plan_digest, get_diet_plan_digest
+
 def build_chat_system_prompt(
     user_profile: Dict[str, Any],
     exercise_plan: Optional[Dict[str, Any]],
     diet_plan: Optional[Dict[str, Any]],
     user_memory: str,
-    language: str = '中文'
+    language: str = '中文',
+    conversation_summary: str = ''
 ) -> str:
     """
     Build the system prompt for AI Coach chat.
     
+    Only changes when the profile, plans, preferences or summary change, so it
+    stays a stable cacheable prefix across the messages of a session.
+    
     Args:
         user_profile: User profile data (name, goal, stats, etc.)
         exercise_plan: Current active exercise plan
         diet_plan: Current active diet plan
         user_memory: User's preferences and history summary from MemoryManager
         language: Output language
+        conversation_summary: Rolling summary of older turns (recent turns are sent as messages)
         
     Returns:
         System prompt string
@@ -37,23 +44,18 @@ def build_chat_system_prompt(
     goal = user_profile.get('goal', '未知')
     level = user_profile.get('level', '中级')
     
-    # Format plans summary
+    # Format plans as compact digests (cached per plan version, so the prefix stays stable)
     exercise_plan_summary = "无"
     if exercise_plan:
-        exercise_plan_summary = f"""
-        - 名称: {exercise_plan.get('name', '未命名')}
-        - 目标: {exercise_plan.get('goal', '未知')}
-        - 持续时间: {exercise_plan.get('duration_weeks', 0)} 周
-        - 每周天数: {exercise_plan.get('days_per_week', 0)} 天
-        """
+        exercise_plan_summary = get_exercise_plan_digest(exercise_plan, plan_id=exercise_plan.get('id'))
         
     diet_plan_summary = "无"
     if diet_plan:
-        diet_plan_summary = f"""
-        - 名称: {diet_plan.get('name', '未命名')}
-        - 描述: {diet_plan.get('description', '无')}
-        - 每日目标热量: {diet_plan.get('target_calories', 0)} kcal
-        """
+        diet_plan_summary = get_diet_plan_digest(diet_plan, plan_id=diet_plan.get('id'))
+
+    summary_section = "无"
+    if conversation_summary:
+        summary_section = conversation_summary
 
     prompt = f"""
     You are CoachX, a professional, encouraging, and knowledgeable AI fitness coach.
@@ -83,6 +85,9 @@ def build_chat_system_prompt(
     ## User Preferences & History (Memory)
     {user_memory}
     
+    ## Earlier Conversation Summary
+    {summary_section}
+    
     ## Response Guidelines
     1.  **Language**: Always respond in {language}.
     2.  **Tone**: Professional, encouraging, concise, and friendly.
@@ -120,3 +125,32 @@ def build_chat_user_prompt(
         
     return prompt
 
+
+# Max characters of each past coach reply carried into the prompt
+HISTORY_RESPONSE_CHARS = 600
+
+
+def build_chat_history_messages(conversation_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Convert stored turns into native multi-turn messages.
+
+    Replies are truncated deterministically, so a session's history only grows
+    by appending and the previous prefix stays cacheable.
+
+    Args:
+        conversation_history: Stored turns [{'user_message': ..., 'ai_response': ...}]
+
+    Returns:
+        Messages [{'role': 'user' | 'assistant', 'content': str}]
+    """
+    messages = []
+    for turn in conversation_history or []:
+        user_message = turn.get('user_message', '')
+        response = turn.get('ai_response', '')
+        if not user_message or not response:
+            continue
+        if len(response) > HISTORY_RESPONSE_CHARS:
+            response = response[:HISTORY_RESPONSE_CHARS] + '…'
+        messages.append({'role': 'user', 'content': user_message})
+        messages.append({'role': 'assistant', 'content': response})
+    return messages
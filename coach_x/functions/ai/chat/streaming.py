@@ -9,7 +9,7 @@ import json
 
 from ..claude_client import get_claude_client
 from ..memory_manager import MemoryManager
-from .prompts import build_chat_system_prompt, build_chat_user_prompt
+from .prompts import build_chat_system_prompt, build_chat_user_prompt, build_chat_history_messages
 from utils.logger import logger
 
 def stream_chat_with_ai(
@@ -18,8 +18,9 @@ def stream_chat_with_ai(
     user_profile: Dict[str, Any],
     exercise_plan: Optional[Dict[str, Any]],
     diet_plan: Optional[Dict[str, Any]],
-    conversation_history: List[Dict[str, str]],
-    extra_context: Optional[Dict[str, Any]] = None
+    conversation_history: List[Dict[str, Any]],
+    extra_context: Optional[Dict[str, Any]] = None,
+    conversation_summary: str = ''
 ) -> Generator[Dict[str, Any], None, None]:
     """
     Stream chat response from AI Coach.
@@ -30,8 +31,10 @@ def stream_chat_with_ai(
         user_profile: User profile data
         exercise_plan: Active exercise plan
         diet_plan: Active diet plan
-        conversation_history: List of recent messages [{'role': 'user'|'assistant', 'content': '...'}]
+        conversation_history: Stored turns from the LLM profile [{'user_message': '...', 'ai_response': '...'}],
+            sent as native multi-turn messages
         extra_context: Optional extra data to inject (e.g. weight history)
+        conversation_summary: Rolling summary of older turns (part of the system prompt)
         
     Yields:
         Streaming events (text_delta, error, complete)
@@ -39,8 +42,9 @@ def stream_chat_with_ai(
     try:
         logger.info(f'🔄 [Chat] Start chat stream for user: {user_id}')
         
-        # 1. Get User Memory Context
-        user_memory_context = MemoryManager.build_memory_context(user_id)
+        # 1. Get User Memory Context (recent turns are sent as messages, keep the system prompt stable)
+        profile = MemoryManager.get_user_memory(user_id)
+        user_memory_context = profile.build_memory_context(include_recent=False)
         
         # 2. Extract language preference (default to Chinese)
         # Try to find it in profile or memory, fallback to Chinese
@@ -52,27 +56,18 @@ def stream_chat_with_ai(
             exercise_plan=exercise_plan,
             diet_plan=diet_plan,
             user_memory=user_memory_context,
-            language=language
+            language=language,
+            conversation_summary=conversation_summary
         )
         
-        # Format history into the prompt (since our client is single-turn)
-        history_str = ""
-        if conversation_history:
-            history_str = "\n\n[Recent Conversation History]:\n"
-            for msg in conversation_history:
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role == 'user':
-                    history_str += f"User: {content}\n"
-                else:
-                    history_str += f"Coach: {content}\n"
+        # Previous turns go out as native messages: system + history form a stable,
+        # cacheable prefix and each new message only appends a small suffix
+        history_messages = build_chat_history_messages(conversation_history)
         
-        # Add history to user prompt context
-        full_user_prompt = f"{history_str}\n\n[User's Current Message]:\n{user_message}"
-        
-        user_prompt_final = build_chat_user_prompt(full_user_prompt, context=extra_context)
+        user_prompt_final = build_chat_user_prompt(user_message, context=extra_context)
         
         logger.info(f'📝 System Prompt Length: {len(system_prompt)}')
+        logger.info(f'📝 History Messages: {len(history_messages)}')
         logger.info(f'📝 User Prompt Length: {len(user_prompt_final)}')
         
         # 4. Call Claude Streaming
@@ -86,7 +81,10 @@ def stream_chat_with_ai(
         for event in claude_client.call_claude_streaming(
             system_prompt=system_prompt,
             user_prompt=user_prompt_final,
-            tools=None 
+            tools=None,
+            history=history_messages,
+            endpoint='chat',
+            user_id=user_id
         ):
             event_count += 1
             event_type = event.get('type')
@@ -7,7 +7,7 @@ Claude API 客户端
 
 本模块使用 **Firebase Functions Secrets** 管理 Anthropic API Key：
 
-- **生产环境**: Secret 通过 `@https_fn.on_call(secrets=["ANTHROPIC_API_KEY"])` 
+- **生产环境**: Secret 通过 `@https_fn.on_call(secrets=["ANTHROPIC_API_KEY"])`
   自动注入为环境变量
 - **本地开发**: 使用 `.env` 文件或直接导出环境变量
 
@@ -17,201 +17,885 @@ Claude API 客户端
 
 - SECRETS_SETUP.md: Firebase Secrets 完整配置指南
 - handlers.py: 使用示例（在装饰器中声明 secrets）
+- async_claude_client.py: 异步客户端（AsyncAnthropic + 共享连接池）
 """
 
 import os
 import json
-from typing import Optional, Dict, Any
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Union
 import httpx
 from anthropic import Anthropic, APIError
 from utils.logger import logger
+from .rate_limiter import get_rate_limiter, estimate_input_tokens, RateLimitQueueTimeout
+from .token_accounting import get_input_token_budget, record_claude_usage
 
 SAVE_DEBUG_RESPONSE = False
 
-class ClaudeClient:
+# Skill 调用强制使用的模型
+SKILL_MODEL = 'claude-sonnet-4-5-20250929'
+
+
+def _get_api_key() -> str:
+    """
+    获取 API Key
+
+    - 生产环境：从 Firebase Secrets 自动注入的环境变量获取
+    - 本地开发：从 .env 文件或手动导出的环境变量获取
+    """
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not api_key:
+        raise ValueError(
+            '未配置 ANTHROPIC_API_KEY。\n'
+            '\n'
+            '生产环境设置方法：\n'
+            '  firebase functions:secrets:set ANTHROPIC_API_KEY\n'
+            '\n'
+            '本地开发设置方法：\n'
+            '  1. 创建 functions/.env 文件\n'
+            '  2. 添加: ANTHROPIC_API_KEY=your-api-key-here\n'
+            '  3. 启动: export $(cat .env | xargs) && firebase emulators:start\n'
+            '\n'
+            '详细配置指南请参考: functions/SECRETS_SETUP.md'
+        )
+    return api_key
+
+
+def _build_timeout() -> httpx.Timeout:
+    """
+    配置超时（流式响应需要较长的读取超时）
+
+    - connect: 连接超时 30 秒
+    - read: 读取超时 10 分钟（匹配 Cloud Function timeout_sec=540）
+    - write: 写入超时 30 秒
+    - pool: 连接池超时 30 秒
+    """
+    return httpx.Timeout(
+        connect=30.0,
+        read=600.0,
+        write=30.0,
+        pool=30.0
+    )
+
+
+class _ClaudeClientBase:
+    """
+    同步 / 异步客户端共用的配置、请求构建和响应解析逻辑
+
+    子类只负责实际发起请求（Anthropic 或 AsyncAnthropic）
+    """
+
+    def __init__(self):
+        """读取配置参数（可通过环境变量覆盖默认值）"""
+        self.api_key = _get_api_key()
+        self.timeout = _build_timeout()
+
+        self.model = os.environ.get('ANTHROPIC_MODEL', 'claude-sonnet-4-20250514')
+        self.max_tokens = int(os.environ.get('ANTHROPIC_MAX_TOKENS', '16384'))
+        self.temperature = float(os.environ.get('ANTHROPIC_TEMPERATURE', '0.7'))
+        # Prompt Caching：在 tools / system / 静态上下文上设置缓存断点
+        self.prompt_cache_enabled = os.environ.get('ANTHROPIC_PROMPT_CACHE', 'true').lower() != 'false'
+
+    # ==================== Prompt Caching ====================
+
+    def _build_system_param(self, system_prompt: str) -> Union[str, List[Dict[str, Any]]]:
+        """构建 system 参数，启用缓存时在 system prompt 末尾设置缓存断点"""
+        if not self.prompt_cache_enabled or not system_prompt:
+            return system_prompt
+
+        return [
+            {
+                'type': 'text',
+                'text': system_prompt,
+                'cache_control': {'type': 'ephemeral'}
+            }
+        ]
+
+    def _build_tools_param(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """构建 tools 参数，启用缓存时在最后一个工具上设置缓存断点（覆盖全部工具定义）"""
+        if not self.prompt_cache_enabled or not tools:
+            return tools
+
+        cached_tools = list(tools)
+        cached_tools[-1] = {**cached_tools[-1], 'cache_control': {'type': 'ephemeral'}}
+        return cached_tools
+
+    def _build_user_content(
+        self,
+        user_prompt: str,
+        cached_context: Optional[str] = None,
+        image_url: Optional[str] = None
+    ) -> Union[str, List[Dict[str, Any]]]:
+        """
+        构建 user 消息内容
+
+        Args:
+            user_prompt: 用户提示词（每次调用都不同的部分）
+            cached_context: 静态上下文（如动作库），放在最前面并设置缓存断点
+            image_url: 图片 URL（可选）
+        """
+        if not cached_context and not image_url:
+            return user_prompt
+
+        content = []
+        if cached_context:
+            context_block = {'type': 'text', 'text': cached_context}
+            if self.prompt_cache_enabled:
+                context_block['cache_control'] = {'type': 'ephemeral'}
+            content.append(context_block)
+
+        if image_url:
+            content.append({
+                'type': 'image',
+                'source': {
+                    'type': 'url',
+                    'url': image_url,
+                },
+            })
+
+        content.append({
+            'type': 'text',
+            'text': user_prompt
+        })
+        return content
+
+    @staticmethod
+    def _extract_usage(usage: Any, label: str) -> Dict[str, int]:
+        """
+        提取并记录 token 用量（包括缓存命中/写入）
+
+        Args:
+            usage: Anthropic 响应中的 usage 对象
+            label: 日志标签
+
+        Returns:
+            {'input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'}
+        """
+        if usage is None:
+            return {}
+
+        usage_dict = {
+            'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+            'output_tokens': getattr(usage, 'output_tokens', 0) or 0,
+            'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+            'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        }
+
+        total_input = (
+            usage_dict['input_tokens']
+            + usage_dict['cache_creation_input_tokens']
+            + usage_dict['cache_read_input_tokens']
+        )
+        hit_rate = usage_dict['cache_read_input_tokens'] / total_input * 100 if total_input else 0.0
+
+        logger.info(
+            f'📊 [{label}] Token 用量 - input: {usage_dict["input_tokens"]}, '
+            f'output: {usage_dict["output_tokens"]}, '
+            f'cache_write: {usage_dict["cache_creation_input_tokens"]}, '
+            f'cache_read: {usage_dict["cache_read_input_tokens"]} '
+            f'(缓存命中 {hit_rate:.1f}%)'
+        )
+        return usage_dict
+
+    def _build_history_messages(self, history: Optional[List[Dict[str, str]]]) -> List[Dict[str, Any]]:
+        """
+        构建多轮对话的历史消息
+
+        连续同角色的消息会合并，并保证以 user 开头、以 assistant 结尾（当前消息为 user）。
+        启用缓存时在最后一条历史消息上设置缓存断点：同一会话的下一条消息只在末尾追加，
+        此前的 system + 历史前缀可命中缓存
+
+        Args:
+            history: [{'role': 'user' | 'assistant', 'content': str}]
+        """
+        messages = []
+        for message in history or []:
+            role = message.get('role')
+            content = message.get('content')
+            if role not in ('user', 'assistant') or not content:
+                continue
+            if messages and messages[-1]['role'] == role:
+                messages[-1]['content'] += f'\n\n{content}'
+            else:
+                messages.append({'role': role, 'content': content})
+
+        while messages and messages[0]['role'] != 'user':
+            messages.pop(0)
+        while messages and messages[-1]['role'] != 'assistant':
+            messages.pop()
+
+        if messages and self.prompt_cache_enabled:
+            messages[-1] = {
+                'role': messages[-1]['role'],
+                'content': [
+                    {
+                        'type': 'text',
+                        'text': messages[-1]['content'],
+                        'cache_control': {'type': 'ephemeral'}
+                    }
+                ]
+            }
+        return messages
+
+    # ==================== 请求构建 ====================
+
+    def _build_message_params(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tools: Optional[list] = None,
+        cached_context: Optional[str] = None,
+        image_url: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """构建 messages.create / messages.stream 的参数（history 为此前的多轮对话）"""
+        api_params = {
+            'model': self.model,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'system': self._build_system_param(system_prompt),
+            'messages': self._build_history_messages(history) + [
+                {
+                    'role': 'user',
+                    'content': self._build_user_content(user_prompt, cached_context, image_url=image_url)
+                }
+            ]
+        }
+
+        # 只在有tools时添加tools参数
+        if tools:
+            api_params['tools'] = self._build_tools_param(tools)
+
+        if history:
+            self._trim_history_to_budget(api_params, history)
+
+        return api_params
+
+    def _trim_history_to_budget(self, api_params: Dict[str, Any], history: List[Dict[str, str]]):
+        """输入估算超出预算时，逐轮丢弃最早的历史对话（当前消息始终保留）"""
+        budget = get_input_token_budget()
+        if not budget:
+            return
+
+        estimated = estimate_input_tokens(api_params)
+        dropped = 0
+        while estimated > budget and dropped < len(history):
+            # 每次丢弃一轮（用户消息 + 回复）
+            dropped += 2
+            api_params['messages'] = (
+                self._build_history_messages(history[dropped:]) + api_params['messages'][-1:]
+            )
+            estimated = estimate_input_tokens(api_params)
+
+        if dropped:
+            logger.info(
+                f'✂️ [TokenBudget] 丢弃最早的 {min(dropped, len(history))} 条历史消息，'
+                f'预估输入 {estimated} tokens（预算 {budget}）'
+            )
+
+    def _build_skill_params(
+        self,
+        user_prompt: str,
+        skill_id: str,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """构建 Skill 调用（Beta API）的参数"""
+        api_params = {
+            'model': SKILL_MODEL,  # 强制使用此模型
+            'max_tokens': 8000,
+            'betas': [
+                'code-execution-2025-08-25',  # Code Execution
+                'skills-2025-10-02'  # Skills API
+            ],
+            'container': {
+                'skills': [
+                    {
+                        'type': 'custom',
+                        'skill_id': skill_id,
+                        'version': 'latest'
+                    }
+                ]
+            },
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': user_prompt
+                }
+            ],
+            'tools': [
+                {
+                    'type': 'code_execution_20250825',
+                    'name': 'code_execution'
+                }
+            ]
+        }
+
+        # 如果提供了 system_prompt，添加到参数中
+        if system_prompt:
+            api_params['system'] = self._build_system_param(system_prompt)
+
+        return api_params
+
+    def _acquire_ticket(self, api_params: Dict[str, Any], user: Optional[str] = None):
+        """
+        客户端准入控制（并发 + 令牌桶 + 公平队列），在请求发出前排队
+
+        输出 token 按 max_tokens 预扣，通过 ticket.record_usage() 记录实际用量后退还差额
+
+        Args:
+            user: 用户标识（默认取 rate_limit_user() 设置的值）
+
+        Returns:
+            RateLimitTicket，调用完成后必须 release()
+        """
+        input_tokens = estimate_input_tokens(api_params)
+        budget = get_input_token_budget()
+        if budget and input_tokens > budget:
+            logger.warning(f'⚠️ [TokenBudget] 预估输入 {input_tokens} tokens 超出预算 {budget}')
+        else:
+            logger.info(f'🧮 预估输入 {input_tokens} tokens')
+
+        return get_rate_limiter().acquire(
+            model=api_params['model'],
+            input_tokens=input_tokens,
+            output_tokens=api_params['max_tokens'],
+            user=user,
+        )
+
+    @contextmanager
+    def _admission(self, api_params: Dict[str, Any], user: Optional[str] = None):
+        """_acquire_ticket() 的上下文管理器形式，退出时自动 release"""
+        ticket = self._acquire_ticket(api_params, user)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    @staticmethod
+    def _record_usage(ticket, usage: Optional[Dict[str, int]], endpoint: str):
+        """记录实际用量：校正准入额度，并按 用户 / 接口 / 模型 记账"""
+        ticket.record_usage(usage)
+        budget = get_input_token_budget()
+        record_claude_usage(
+            user=ticket.user,
+            endpoint=endpoint,
+            model=ticket.model,
+            usage=usage,
+            estimated_input_tokens=ticket.input_tokens,
+            over_budget=bool(budget) and ticket.input_tokens > budget,
+        )
+
+    # ==================== 响应解析 ====================
+
+    def _parse_message_response(self, response: Any, response_format: str, label: str) -> Dict[str, Any]:
+        """
+        解析 messages.create 的响应
+
+        Args:
+            response: Anthropic Message 对象
+            response_format: 响应格式 ('json' 或 'text')
+            label: 日志标签（'Claude' / 'Claude Vision'）
+        """
+        usage = self._extract_usage(getattr(response, 'usage', None), label)
+
+        # 提取响应文本
+        if not response.content or len(response.content) == 0:
+            logger.error(f'❌ {label} 响应为空')
+            return {
+                'success': False,
+                'error': f'{label} 响应为空'
+            }
+
+        content = response.content[0].text
+        logger.info(f'✅ {label} API 调用成功')
+        logger.debug(f'Response (前200字): {content[:200]}...')
+
+        # 如果需要JSON格式，尝试解析
+        if response_format != 'json':
+            return {
+                'success': True,
+                'data': content,
+                'usage': usage
+            }
+
+        try:
+            # 清理可能的 markdown 代码块标记
+            content = content.strip()
+            if content.startswith('```json'):
+                content = content[7:]
+            if content.startswith('```'):
+                content = content[3:]
+            if content.endswith('```'):
+                content = content[:-3]
+            content = content.strip()
+
+            parsed_json = json.loads(content)
+            return {
+                'success': True,
+                'data': parsed_json,
+                'raw_text': content,
+                'usage': usage
+            }
+        except json.JSONDecodeError as e:
+            logger.warning(f'⚠️ JSON 解析失败: {e}')
+            return {
+                'success': False,
+                'error': f'JSON 解析失败: {str(e)}',
+                'raw_text': content,
+                'usage': usage
+            }
+
+    @staticmethod
+    def _api_error_result(e: Exception, label: str) -> Dict[str, Any]:
+        """将 APIError 转换为统一的失败结果"""
+        logger.error(f'❌ {label} API 错误: {e}')
+        # 检查是否是限流错误
+        error_message = str(e)
+        if 'rate_limit' in error_message.lower() or 'too many requests' in error_message.lower():
+            return {
+                'success': False,
+                'error': 'API 调用频率超限，请稍后再试'
+            }
+        return {
+            'success': False,
+            'error': f'AI 服务错误: {error_message}'
+        }
+
+    @staticmethod
+    def _queue_timeout_result(e: Exception) -> Dict[str, Any]:
+        """将排队超时转换为统一的失败结果（与服务端限流提示一致）"""
+        logger.warning(f'⚠️ 准入排队超时: {e}')
+        return {
+            'success': False,
+            'error': 'API 调用频率超限，请稍后再试'
+        }
+
+    @staticmethod
+    def _unknown_error_result(e: Exception) -> Dict[str, Any]:
+        """将未知异常转换为统一的失败结果"""
+        logger.error(f'❌ 未知错误: {e}', exc_info=True)
+        error_message = str(e)
+        # 检查是否是连接错误
+        if 'connect' in error_message.lower() or 'network' in error_message.lower():
+            return {
+                'success': False,
+                'error': '无法连接到 AI 服务，请检查网络'
+            }
+        return {
+            'success': False,
+            'error': f'系统错误: {error_message}'
+        }
+
+    @staticmethod
+    def _translate_stream_event(event: Any) -> Optional[Dict[str, Any]]:
+        """
+        将 Anthropic 原始流式事件转换为本模块的流式事件
+
+        Returns:
+            流式事件 dict，或 None（无需向上层发送的事件）
+        """
+        # 内容块开始
+        if event.type == 'content_block_start':
+            if hasattr(event, 'content_block'):
+                # 工具调用开始
+                if event.content_block.type == 'tool_use':
+                    tool_name = event.content_block.name
+                    logger.info(f'🔧 开始调用工具: {tool_name}')
+                    return {
+                        'type': 'tool_start',
+                        'tool_name': tool_name
+                    }
+                # 文本内容开始
+                elif event.content_block.type == 'text':
+                    logger.info(f'📝 开始文本内容')
+
+        # 内容增量
+        elif event.type == 'content_block_delta':
+            if hasattr(event, 'delta'):
+                # 工具调用增量（部分 JSON）
+                if hasattr(event.delta, 'partial_json'):
+                    return {
+                        'type': 'tool_delta',
+                        'partial_json': event.delta.partial_json
+                    }
+                # 文本增量
+                elif hasattr(event.delta, 'text'):
+                    text = event.delta.text
+                    logger.debug(f'📝 文本增量: {text[:50]}...')
+                    return {
+                        'type': 'text_delta',
+                        'text': text
+                    }
+
+        # 内容块完成（content_block_stop）：等待获取最终消息
+        return None
+
+    def _final_message_events(self, final_message: Any) -> List[Dict[str, Any]]:
+        """从最终消息中提取 usage / tool_complete / text_complete 事件"""
+        # 报告 token 用量（含缓存命中）
+        events = [{
+            'type': 'usage',
+            'usage': self._extract_usage(getattr(final_message, 'usage', None), 'Claude Streaming')
+        }]
+
+        # 提取内容
+        for content_block in final_message.content:
+            # 工具调用结果
+            if content_block.type == 'tool_use':
+                tool_name = content_block.name
+                tool_input = content_block.input
+
+                logger.info(f'✅ 工具调用完成: {tool_name}')
+                logger.info(f'Tool Input are: {tool_input}')
+
+                events.append({
+                    'type': 'tool_complete',
+                    'tool_name': tool_name,
+                    'tool_input': tool_input
+                })
+            # 文本内容（通常文本已经通过delta发送，这里只是备份）
+            elif content_block.type == 'text':
+                text = content_block.text
+                logger.info(f'✅ 文本内容完成，长度: {len(text)}')
+                events.append({
+                    'type': 'text_complete',
+                    'text': text
+                })
+
+        return events
+
+    def _parse_skill_response(self, response: Any) -> Dict[str, Any]:
+        """解析 Skill 调用（Beta API）的响应"""
+        usage = self._extract_usage(getattr(response, 'usage', None), 'Claude Skill')
+
+        logger.info('✅ Claude API with Skill 调用成功')
+
+        # 记录 response 对象的关键属性
+        logger.info(f'Response 属性:')
+        logger.info(f'  - id: {response.id}')
+        logger.info(f'  - model: {response.model}')
+        logger.info(f'  - role: {response.role}')
+        logger.info(f'  - stop_reason: {response.stop_reason}')
+
+        # 检查是否有其他可能包含数据的属性
+        if hasattr(response, 'output'):
+            logger.info(f'  - output: {type(response.output)}')
+
+        # 记录响应的所有 content blocks
+        logger.info(f'📦 响应包含 {len(response.content)} 个 content blocks')
+        for i, block in enumerate(response.content):
+            logger.info(f'   Block {i}: type={block.type}')
+
+            # 详细记录每个 block 的属性
+            if hasattr(block, 'name'):
+                logger.info(f'      name={block.name}')
+            if hasattr(block, 'id'):
+                logger.info(f'      id={block.id}')
+            if hasattr(block, 'input'):
+                logger.info(f'      input type={type(block.input)}')
+                if isinstance(block.input, dict):
+                    logger.info(f'      input keys={list(block.input.keys())}')
+
+        # 将响应写入 JSON 文件以便调试
+        if SAVE_DEBUG_RESPONSE:
+            self._save_debug_response(response)
+
+        # 首先尝试从 tool_use block 中提取 skill 执行结果
+        skill_result = None
+        for block in response.content:
+            if block.type == 'tool_use':
+                logger.info(f'🔧 找到 tool_use block: name={getattr(block, "name", "unknown")}')
+
+                # 检查是否是 code_execution
+                if hasattr(block, 'name') and block.name == 'code_execution':
+                    logger.info('   这是 code_execution tool')
+
+                    # 尝试从 input 中提取
+                    if hasattr(block, 'input'):
+                        input_data = block.input
+                        logger.info(f'   input 类型: {type(input_data)}')
+
+                        if isinstance(input_data, dict):
+                            logger.info(f'   input 包含的键: {list(input_data.keys())}')
+
+                            # 检查是否包含营养数据的关键字段
+                            if 'bmr_kcal' in input_data or 'target_calories_kcal' in input_data:
+                                skill_result = input_data
+                                logger.info('   ✅ 这看起来是营养计算结果！')
+                                break
+                            elif 'code' in input_data:
+                                logger.info('   这是代码输入，不是结果')
+                            else:
+                                logger.info(f'   包含其他数据: {list(input_data.keys())[:5]}')
+                        else:
+                            logger.info(f'   input 不是 dict: {str(input_data)[:100]}')
+                    else:
+                        logger.info('   没有 input 属性')
+
+        # 如果从 tool_use 中找到了结果，直接使用
+        if skill_result and isinstance(skill_result, dict):
+            logger.info('✅ 使用 tool_use block 中的 skill 执行结果')
+            return {
+                'success': True,
+                'data': skill_result,
+                'raw_text': '',
+                'usage': usage
+            }
+
+        # 否则，尝试从文本中提取
+        logger.info('ℹ️ 未找到 tool_use 结果，尝试从文本中提取')
+
+        # 提取响应文本
+        response_text = ''
+        for block in response.content:
+            if block.type == 'text':
+                response_text += block.text
+                logger.debug(f'📝 文本块长度: {len(block.text)} 字符')
+
+        logger.info(f'📊 总响应文本长度: {len(response_text)} 字符')
+
+        # 记录响应文本的前 2000 字符（用于调试）
+        if len(response_text) > 0:
+            preview_length = min(2000, len(response_text))
+            logger.info(f'📄 响应预览 (前 {preview_length} 字符):')
+            logger.info('=' * 70)
+            logger.info(response_text[:preview_length])
+            logger.info('=' * 70)
+        else:
+            logger.warning('⚠️ 响应文本为空！')
+
+        # 解析 JSON
+        parsed_data = self._extract_json_from_skill_response(response_text)
+
+        if parsed_data is not None:
+            logger.info('✅ JSON 解析成功')
+            logger.debug(f'解析后的数据键: {list(parsed_data.keys())}')
+            return {
+                'success': True,
+                'data': parsed_data,
+                'raw_text': response_text,
+                'usage': usage
+            }
+        else:
+            logger.error('❌ 无法从响应中提取有效的 JSON')
+            logger.error('完整响应内容:')
+            logger.error(response_text)
+            return {
+                'success': False,
+                'error': 'Could not parse JSON from response',
+                'raw_text': response_text
+            }
+
+    @staticmethod
+    def _save_debug_response(response: Any):
+        """将 Skill 响应写入 debug_responses/ 以便调试"""
+        try:
+            import datetime
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            debug_dir = os.path.join(os.path.dirname(__file__), 'debug_responses')
+            os.makedirs(debug_dir, exist_ok=True)
+            debug_file = os.path.join(debug_dir, f'response_{timestamp}.json')
+
+            # 将响应对象转换为字典
+            response_dict = {
+                'id': response.id,
+                'model': response.model,
+                'role': response.role,
+                'stop_reason': response.stop_reason,
+                'stop_sequence': getattr(response, 'stop_sequence', None),
+                'usage': {
+                    'input_tokens': response.usage.input_tokens,
+                    'output_tokens': response.usage.output_tokens,
+                } if hasattr(response, 'usage') else None,
+                'content': []
+            }
+            # 序列化每个 content block
+            for block in response.content:
+                block_dict = {
+                    'type': block.type
+                }
+                if hasattr(block, 'text'):
+                    block_dict['text'] = block.text
+                if hasattr(block, 'name'):
+                    block_dict['name'] = block.name
+                if hasattr(block, 'id'):
+                    block_dict['id'] = block.id
+                if hasattr(block, 'input'):
+                    block_dict['input'] = block.input
+                response_dict['content'].append(block_dict)
+
+            with open(debug_file, 'w', encoding='utf-8') as f:
+                json.dump(response_dict, f, indent=2, ensure_ascii=False)
+
+            logger.info(f'💾 响应已保存到: {debug_file}')
+        except Exception as e:
+            logger.warning(f'⚠️ 保存响应文件失败: {str(e)}')
+
+    def _extract_json_from_skill_response(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        从 Skill 响应中提取 JSON
+
+        支持多种格式：
+        1. 直接 JSON
+        2. ```json code block
+        3. 混合文本中的 JSON 对象
+
+        Args:
+            text: 响应文本
+
+        Returns:
+            解析后的 dict，或 None（如果解析失败）
+        """
+        import re
+
+        logger.info('🔍 开始 JSON 提取...')
+
+        # 1. 尝试直接解析整个文本
+        logger.debug('尝试方法 1: 直接解析整个文本')
+        try:
+            data = json.loads(text)
+            logger.info('✅ 方法 1 成功：直接解析')
+            return data
+        except json.JSONDecodeError as e:
+            logger.debug(f'方法 1 失败: {str(e)}')
+
+        # 2. 尝试提取 JSON code block
+        logger.debug('尝试方法 2: 提取 ```json``` code block')
+        json_block_pattern = r'```json\s*([\s\S]*?)\s*```'
+        json_blocks = re.findall(json_block_pattern, text)
+
+        if json_blocks:
+            logger.debug(f'找到 {len(json_blocks)} 个 JSON code blocks')
+            for i, block in enumerate(json_blocks):
+                try:
+                    data = json.loads(block)
+                    logger.info(f'✅ 方法 2 成功：从 code block {i} 解析')
+                    return data
+                except json.JSONDecodeError as e:
+                    logger.debug(f'Code block {i} 解析失败: {str(e)}')
+        else:
+            logger.debug('未找到 JSON code blocks')
+
+        # 3. 尝试查找第一个完整的 JSON 对象
+        logger.debug('尝试方法 3: 查找 JSON 对象')
+        json_pattern = r'\{[\s\S]*\}'
+        matches = re.findall(json_pattern, text)
+
+        if matches:
+            logger.debug(f'找到 {len(matches)} 个可能的 JSON 对象')
+            for i, match in enumerate(matches):
+                try:
+                    data = json.loads(match)
+                    logger.debug(f'JSON 对象 {i} 解析成功，检查关键字段...')
+                    logger.debug(f'对象键: {list(data.keys())}')
+
+                    # 检查是否包含期望的关键字段（营养计算相关）
+                    if 'bmr_kcal' in data or 'target_calories_kcal' in data or 'macros' in data:
+                        logger.info(f'✅ 方法 3 成功：从 JSON 对象 {i} 解析')
+                        return data
+                    else:
+                        logger.debug(f'JSON 对象 {i} 缺少期望的关键字段')
+                except json.JSONDecodeError as e:
+                    logger.debug(f'JSON 对象 {i} 解析失败: {str(e)[:100]}')
+        else:
+            logger.debug('未找到 JSON 对象模式')
+
+        logger.error('❌ 所有 JSON 提取方法均失败')
+        return None
+
+
+class ClaudeClient(_ClaudeClientBase):
     """Claude API 客户端"""
-    
+
     def __init__(self):
         """
         初始化客户端
-        
+
         API Key 获取方式：
         - 生产环境：从 Firebase Secrets 自动注入的环境变量获取
         - 本地开发：从 .env 文件或手动导出的环境变量获取
         """
-        # 获取 API Key（生产环境由 Firebase Secrets 注入）
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if not api_key:
-            raise ValueError(
-                '未配置 ANTHROPIC_API_KEY。\n'
-                '\n'
-                '生产环境设置方法：\n'
-                '  firebase functions:secrets:set ANTHROPIC_API_KEY\n'
-                '\n'
-                '本地开发设置方法：\n'
-                '  1. 创建 functions/.env 文件\n'
-                '  2. 添加: ANTHROPIC_API_KEY=your-api-key-here\n'
-                '  3. 启动: export $(cat .env | xargs) && firebase emulators:start\n'
-                '\n'
-                '详细配置指南请参考: functions/SECRETS_SETUP.md'
-            )
-
-        # 配置超时（流式响应需要较长的读取超时）
-        # connect: 连接超时 30 秒
-        # read: 读取超时 10 分钟（匹配 Cloud Function timeout_sec=540）
-        # write: 写入超时 30 秒
-        # pool: 连接池超时 30 秒
-        timeout = httpx.Timeout(
-            connect=30.0,
-            read=600.0,
-            write=30.0,
-            pool=30.0
-        )
+        super().__init__()
 
         self.client = Anthropic(
-            api_key=api_key,
-            timeout=timeout,
+            api_key=self.api_key,
+            timeout=self.timeout,
             max_retries=3,  # 自动重试 3 次（默认 2 次）
         )
-        
-        # 其他配置参数（可通过环境变量覆盖默认值）
-        self.model = os.environ.get('ANTHROPIC_MODEL', 'claude-sonnet-4-20250514')
-        self.max_tokens = int(os.environ.get('ANTHROPIC_MAX_TOKENS', '16384'))
-        self.temperature = float(os.environ.get('ANTHROPIC_TEMPERATURE', '0.7'))
-    
+
     def call_claude(
         self,
         system_prompt: str,
         user_prompt: str,
-        response_format: str = 'json'
+        response_format: str = 'json',
+        cached_context: Optional[str] = None,
+        endpoint: str = 'call_claude',
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         调用 Claude API
-        
+
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词
             response_format: 响应格式 ('json' 或 'text')
-        
+            cached_context: 可缓存的静态上下文（可选，放在用户提示词之前）
+            endpoint: 记账用的接口名称（如 'chat'、'edit_plan'）
+            user_id: 记账 / 限流用的用户ID（默认取 rate_limit_user() 设置的值）
+
         Returns:
             Dict containing the response
-        
+
         Raises:
             Exception: API 调用失败
         """
         try:
             logger.info(f'🤖 调用 Claude API - Model: {self.model}')
             logger.debug(f'User Prompt (前100字): {user_prompt[:100]}...')
-            
-            # 构建消息
-            messages = [
-                {
-                    'role': 'user',
-                    'content': user_prompt
-                }
-            ]
-            
+
+            api_params = self._build_message_params(system_prompt, user_prompt, cached_context=cached_context)
+
             # 调用 API
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=system_prompt,
-                messages=messages
-            )
-            
-            # 提取响应文本
-            if response.content and len(response.content) > 0:
-                content = response.content[0].text
-                logger.info(f'✅ Claude API 调用成功')
-                logger.debug(f'Response (前200字): {content[:200]}...')
-                
-                # 如果需要JSON格式，尝试解析
-                if response_format == 'json':
-                    try:
-                        # 清理可能的 markdown 代码块标记
-                        content = content.strip()
-                        if content.startswith('```json'):
-                            content = content[7:]
-                        if content.startswith('```'):
-                            content = content[3:]
-                        if content.endswith('```'):
-                            content = content[:-3]
-                        content = content.strip()
-                        
-                        parsed_json = json.loads(content)
-                        return {
-                            'success': True,
-                            'data': parsed_json,
-                            'raw_text': content
-                        }
-                    except json.JSONDecodeError as e:
-                        logger.warning(f'⚠️ JSON 解析失败: {e}')
-                        return {
-                            'success': False,
-                            'error': f'JSON 解析失败: {str(e)}',
-                            'raw_text': content
-                        }
-                else:
-                    return {
-                        'success': True,
-                        'data': content
-                    }
-            else:
-                logger.error('❌ Claude 响应为空')
-                return {
-                    'success': False,
-                    'error': 'Claude 响应为空'
-                }
-        
+            with self._admission(api_params, user_id) as ticket:
+                response = self.client.messages.create(**api_params)
+                result = self._parse_message_response(response, response_format, 'Claude')
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            return result
+
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
+
         except APIError as e:
-            logger.error(f'❌ Claude API 错误: {e}')
-            # 检查是否是限流错误
-            error_message = str(e)
-            if 'rate_limit' in error_message.lower() or 'too many requests' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'API 调用频率超限，请稍后再试'
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'AI 服务错误: {error_message}'
-                }
-        
+            return self._api_error_result(e, 'Claude')
+
         except Exception as e:
-            logger.error(f'❌ 未知错误: {e}', exc_info=True)
-            error_message = str(e)
-            # 检查是否是连接错误
-            if 'connect' in error_message.lower() or 'network' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': '无法连接到 AI 服务，请检查网络'
-                }
-            return {
-                'success': False,
-                'error': f'系统错误: {error_message}'
-            }
-    
+            return self._unknown_error_result(e)
+
     def call_claude_vision(
         self,
         system_prompt: str,
         user_prompt: str,
         image_url: str,
-        response_format: str = 'json'
+        response_format: str = 'json',
+        cached_context: Optional[str] = None,
+        endpoint: str = 'call_claude_vision',
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         调用 Claude Vision API 分析图片
-        
+
         Args:
             system_prompt: 系统提示词
             user_prompt: 用户提示词
             image_url: 图片 URL（Firebase Storage 公开链接）
             response_format: 响应格式 ('json' 或 'text')
-        
+            cached_context: 可缓存的静态上下文（可选，放在图片之前）
+            endpoint: 记账用的接口名称（如 'chat'、'edit_plan'）
+            user_id: 记账 / 限流用的用户ID（默认取 rate_limit_user() 设置的值）
+
         Returns:
             Dict containing the response
-        
+
         Raises:
             Exception: API 调用失败
         """
@@ -219,112 +903,36 @@ class ClaudeClient:
             logger.info(f'🤖 调用 Claude Vision API - Model: {self.model}')
             logger.info(f'图片 URL: {image_url[:100]}...')
             logger.debug(f'User Prompt (前100字): {user_prompt[:100]}...')
-            
-            # 构建消息（包含图片）
-            messages = [
-                {
-                    'role': 'user',
-                    'content': [
-                        {
-                            'type': 'image',
-                            'source': {
-                                'type': 'url',
-                                'url': image_url,
-                            },
-                        },
-                        {
-                            'type': 'text',
-                            'text': user_prompt
-                        }
-                    ]
-                }
-            ]
-            
-            # 调用 API
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                system=system_prompt,
-                messages=messages
+
+            api_params = self._build_message_params(
+                system_prompt, user_prompt, cached_context=cached_context, image_url=image_url
             )
-            
-            # 提取响应文本
-            if response.content and len(response.content) > 0:
-                content = response.content[0].text
-                logger.info(f'✅ Claude Vision API 调用成功')
-                logger.info(f'Response: {content}')
-                
-                # 如果需要JSON格式，尝试解析
-                if response_format == 'json':
-                    try:
-                        # 清理可能的 markdown 代码块标记
-                        content = content.strip()
-                        if content.startswith('```json'):
-                            content = content[7:]
-                        if content.startswith('```'):
-                            content = content[3:]
-                        if content.endswith('```'):
-                            content = content[:-3]
-                        content = content.strip()
-                        
-                        parsed_json = json.loads(content)
-                        return {
-                            'success': True,
-                            'data': parsed_json,
-                            'raw_text': content
-                        }
-                    except json.JSONDecodeError as e:
-                        logger.warning(f'⚠️ JSON 解析失败: {e}')
-                        return {
-                            'success': False,
-                            'error': f'JSON 解析失败: {str(e)}',
-                            'raw_text': content
-                        }
-                else:
-                    return {
-                        'success': True,
-                        'data': content
-                    }
-            else:
-                logger.error('❌ Claude Vision 响应为空')
-                return {
-                    'success': False,
-                    'error': 'Claude Vision 响应为空'
-                }
-        
+
+            # 调用 API（消息包含图片）
+            with self._admission(api_params, user_id) as ticket:
+                response = self.client.messages.create(**api_params)
+                result = self._parse_message_response(response, response_format, 'Claude Vision')
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            return result
+
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
+
         except APIError as e:
-            logger.error(f'❌ Claude Vision API 错误: {e}')
-            error_message = str(e)
-            if 'rate_limit' in error_message.lower() or 'too many requests' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'API 调用频率超限，请稍后再试'
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'AI 服务错误: {error_message}'
-                }
-        
+            return self._api_error_result(e, 'Claude Vision')
+
         except Exception as e:
-            logger.error(f'❌ 未知错误: {e}', exc_info=True)
-            error_message = str(e)
-            if 'connect' in error_message.lower() or 'network' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': '无法连接到 AI 服务，请检查网络'
-                }
-            return {
-                'success': False,
-                'error': f'系统错误: {error_message}'
-            }
-    
+            return self._unknown_error_result(e)
+
     def call_claude_streaming(
         self,
         system_prompt: str,
         user_prompt: str,
         tools: list = None,
+        cached_context: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        endpoint: str = 'call_claude_streaming',
+        user_id: Optional[str] = None,
     ):
         """
         使用 Tool Use + Streaming 调用 Claude
@@ -333,16 +941,21 @@ class ClaudeClient:
 
         Args:
             system_prompt: 系统提示词
-            user_prompt: 用户提示词
+            user_prompt: 用户提示词（当前这一轮）
             tools: Tool Use 工具定义列表（可选，None表示纯文本响应）
+            cached_context: 可缓存的静态上下文（可选，如动作库，放在用户提示词之前）
+            history: 此前的多轮对话 [{'role': 'user' | 'assistant', 'content': str}]（可选，超出输入预算时丢弃最早的轮次）
+            endpoint: 记账用的接口名称（如 'chat'、'edit_plan'）
+            user_id: 记账 / 限流用的用户ID（默认取 rate_limit_user() 设置的值）
 
         Yields:
             dict: 流式事件
-                - type: 'text_delta' | 'tool_start' | 'tool_delta' | 'tool_complete' | 'error'
+                - type: 'text_delta' | 'tool_start' | 'tool_delta' | 'usage' | 'tool_complete' | 'error'
                 - text: 文本增量（text_delta时）
                 - tool_name: 工具名称
                 - tool_input: 工具输入数据（完整）
                 - partial_json: 部分 JSON 字符串（可选）
+                - usage: token 用量，含缓存命中（usage时，在 tool_complete/text_complete 之前）
                 - error: 错误信息（如果有）
         """
         try:
@@ -354,95 +967,31 @@ class ClaudeClient:
             else:
                 logger.info('Tools: None (纯文本模式)')
 
-            # 构建API参数
-            api_params = {
-                'model': self.model,
-                'max_tokens': self.max_tokens,
-                'temperature': self.temperature,
-                'system': system_prompt,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': user_prompt
-                    }
-                ]
-            }
-
-            # 只在有tools时添加tools参数
-            if tools:
-                api_params['tools'] = tools
+            api_params = self._build_message_params(
+                system_prompt, user_prompt, tools=tools, cached_context=cached_context, history=history
+            )
 
-            # 使用 stream 模式调用
-            with self.client.messages.stream(**api_params) as stream:
+            # 使用 stream 模式调用（排队获得额度后才建立连接，直到流结束才归还并发额度）
+            with self._admission(api_params, user_id) as ticket, self.client.messages.stream(**api_params) as stream:
                 # 监听流式事件
                 for event in stream:
-                    # 内容块开始
-                    if event.type == 'content_block_start':
-                        if hasattr(event, 'content_block'):
-                            # 工具调用开始
-                            if event.content_block.type == 'tool_use':
-                                tool_name = event.content_block.name
-                                logger.info(f'🔧 开始调用工具: {tool_name}')
-                                yield {
-                                    'type': 'tool_start',
-                                    'tool_name': tool_name
-                                }
-                            # 文本内容开始
-                            elif event.content_block.type == 'text':
-                                logger.info(f'📝 开始文本内容')
-
-                    # 内容增量
-                    elif event.type == 'content_block_delta':
-                        if hasattr(event, 'delta'):
-                            # 工具调用增量（部分 JSON）
-                            if hasattr(event.delta, 'partial_json'):
-                                partial = event.delta.partial_json
-                                yield {
-                                    'type': 'tool_delta',
-                                    'partial_json': partial
-                                }
-                            # 文本增量
-                            elif hasattr(event.delta, 'text'):
-                                text = event.delta.text
-                                logger.debug(f'📝 文本增量: {text[:50]}...')
-                                yield {
-                                    'type': 'text_delta',
-                                    'text': text
-                                }
-
-                    # 内容块完成
-                    elif event.type == 'content_block_stop':
-                        pass  # 等待获取最终消息
+                    translated = self._translate_stream_event(event)
+                    if translated:
+                        yield translated
 
                 # 获取最终消息
                 final_message = stream.get_final_message()
+                final_events = self._final_message_events(final_message)
+                self._record_usage(ticket, final_events[0]['usage'], endpoint)
+                for final_event in final_events:
+                    yield final_event
+
+        except RateLimitQueueTimeout as e:
+            yield {
+                'type': 'error',
+                'error': self._queue_timeout_result(e)['error']
+            }
 
-                # 提取内容
-                for content_block in final_message.content:
-                    # 工具调用结果
-                    if content_block.type == 'tool_use':
-                        tool_name = content_block.name
-                        tool_input = content_block.input
-
-                        logger.info(f'✅ 工具调用完成: {tool_name}')
-                        logger.info(f'Tool Input are: {tool_input}')
-
-                        yield {
-                            'type': 'tool_complete',
-                            'tool_name': tool_name,
-                            'tool_input': tool_input
-                        }
-                    # 文本内容（如果没有通过delta发送）
-                    elif content_block.type == 'text':
-                        text = content_block.text
-                        logger.info(f'✅ 文本内容完成，长度: {len(text)}')
-                        # 通常文本已经通过delta发送，这里只是备份
-                        # 如果需要，可以发送完整文本
-                        yield {
-                            'type': 'text_complete',
-                            'text': text
-                        }
-        
         except Exception as e:
             logger.error(f'❌ Streaming 调用失败: {str(e)}', exc_info=True)
             yield {
@@ -454,7 +1003,9 @@ class ClaudeClient:
         self,
         user_prompt: str,
         skill_id: str,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        endpoint: str = 'call_claude_with_skill',
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         使用 Claude Skill 调用 API
@@ -465,6 +1016,8 @@ class ClaudeClient:
             user_prompt: 用户提示词
             skill_id: Anthropic Skill ID
             system_prompt: 系统提示词（可选）
+            endpoint: 记账用的接口名称（如 'chat'、'edit_plan'）
+            user_id: 记账 / 限流用的用户ID（默认取 rate_limit_user() 设置的值）
 
         Returns:
             Dict containing the response:
@@ -481,302 +1034,26 @@ class ClaudeClient:
         try:
             logger.info('🤖 调用 Claude API with Skill')
             logger.info(f'🔧 Skill ID: {skill_id}')
-            logger.info(f'📝 Model: claude-sonnet-4-5-20250929 (强制)')
+            logger.info(f'📝 Model: {SKILL_MODEL} (强制)')
             logger.debug(f'User Prompt (前100字): {user_prompt[:100]}...')
 
-            # 构建 API 参数
-            api_params = {
-                'model': 'claude-sonnet-4-5-20250929',  # 强制使用此模型
-                'max_tokens': 8000,
-                'betas': [
-                    'code-execution-2025-08-25',  # Code Execution
-                    'skills-2025-10-02'  # Skills API
-                ],
-                'container': {
-                    'skills': [
-                        {
-                            'type': 'custom',
-                            'skill_id': skill_id,
-                            'version': 'latest'
-                        }
-                    ]
-                },
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': user_prompt
-                    }
-                ],
-                'tools': [
-                    {
-                        'type': 'code_execution_20250825',
-                        'name': 'code_execution'
-                    }
-                ]
-            }
-
-            # 如果提供了 system_prompt，添加到参数中
-            if system_prompt:
-                api_params['system'] = system_prompt
+            api_params = self._build_skill_params(user_prompt, skill_id, system_prompt)
 
             # 调用 Beta API
-            response = self.client.beta.messages.create(**api_params)
-
-            logger.info('✅ Claude API with Skill 调用成功')
-
-            # 记录 response 对象的关键属性
-            logger.info(f'Response 属性:')
-            logger.info(f'  - id: {response.id}')
-            logger.info(f'  - model: {response.model}')
-            logger.info(f'  - role: {response.role}')
-            logger.info(f'  - stop_reason: {response.stop_reason}')
-
-            # 检查是否有其他可能包含数据的属性
-            if hasattr(response, 'output'):
-                logger.info(f'  - output: {type(response.output)}')
+            with self._admission(api_params, user_id) as ticket:
+                response = self.client.beta.messages.create(**api_params)
+                result = self._parse_skill_response(response)
+                self._record_usage(ticket, result.get('usage'), endpoint)
+            return result
 
-            # 记录响应的所有 content blocks
-            logger.info(f'📦 响应包含 {len(response.content)} 个 content blocks')
-            for i, block in enumerate(response.content):
-                logger.info(f'   Block {i}: type={block.type}')
-
-                # 详细记录每个 block 的属性
-                if hasattr(block, 'name'):
-                    logger.info(f'      name={block.name}')
-                if hasattr(block, 'id'):
-                    logger.info(f'      id={block.id}')
-                if hasattr(block, 'input'):
-                    logger.info(f'      input type={type(block.input)}')
-                    if isinstance(block.input, dict):
-                        logger.info(f'      input keys={list(block.input.keys())}')
-
-            # 将响应写入 JSON 文件以便调试
-            if SAVE_DEBUG_RESPONSE:
-                try:
-                    import datetime
-                    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                    debug_dir = os.path.join(os.path.dirname(__file__), 'debug_responses')
-                    os.makedirs(debug_dir, exist_ok=True)
-                    debug_file = os.path.join(debug_dir, f'response_{timestamp}.json')
-                    
-                    # 将响应对象转换为字典
-                    response_dict = {
-                        'id': response.id,
-                        'model': response.model,
-                        'role': response.role,
-                        'stop_reason': response.stop_reason,
-                        'stop_sequence': getattr(response, 'stop_sequence', None),
-                        'usage': {
-                            'input_tokens': response.usage.input_tokens,
-                            'output_tokens': response.usage.output_tokens,
-                        } if hasattr(response, 'usage') else None,
-                        'content': []
-                    }
-                    # 序列化每个 content block
-                    for block in response.content:
-                        block_dict = {
-                            'type': block.type
-                        }
-                        if hasattr(block, 'text'):
-                            block_dict['text'] = block.text
-                        if hasattr(block, 'name'):
-                            block_dict['name'] = block.name
-                        if hasattr(block, 'id'):
-                            block_dict['id'] = block.id
-                        if hasattr(block, 'input'):
-                            block_dict['input'] = block.input
-                        response_dict['content'].append(block_dict)
-                    
-                    with open(debug_file, 'w', encoding='utf-8') as f:
-                        json.dump(response_dict, f, indent=2, ensure_ascii=False)
-                    
-                    logger.info(f'💾 响应已保存到: {debug_file}')
-                except Exception as e:
-                    logger.warning(f'⚠️ 保存响应文件失败: {str(e)}')
-
-            # 首先尝试从 tool_use block 中提取 skill 执行结果
-            skill_result = None
-            for block in response.content:
-                if block.type == 'tool_use':
-                    logger.info(f'🔧 找到 tool_use block: name={getattr(block, "name", "unknown")}')
-
-                    # 检查是否是 code_execution
-                    if hasattr(block, 'name') and block.name == 'code_execution':
-                        logger.info('   这是 code_execution tool')
-
-                        # 尝试从 input 中提取
-                        if hasattr(block, 'input'):
-                            input_data = block.input
-                            logger.info(f'   input 类型: {type(input_data)}')
-
-                            if isinstance(input_data, dict):
-                                logger.info(f'   input 包含的键: {list(input_data.keys())}')
-
-                                # 检查是否包含营养数据的关键字段
-                                if 'bmr_kcal' in input_data or 'target_calories_kcal' in input_data:
-                                    skill_result = input_data
-                                    logger.info('   ✅ 这看起来是营养计算结果！')
-                                    break
-                                elif 'code' in input_data:
-                                    logger.info('   这是代码输入，不是结果')
-                                else:
-                                    logger.info(f'   包含其他数据: {list(input_data.keys())[:5]}')
-                            else:
-                                logger.info(f'   input 不是 dict: {str(input_data)[:100]}')
-                        else:
-                            logger.info('   没有 input 属性')
-
-            # 如果从 tool_use 中找到了结果，直接使用
-            if skill_result and isinstance(skill_result, dict):
-                logger.info('✅ 使用 tool_use block 中的 skill 执行结果')
-                return {
-                    'success': True,
-                    'data': skill_result,
-                    'raw_text': ''
-                }
-
-            # 否则，尝试从文本中提取
-            logger.info('ℹ️ 未找到 tool_use 结果，尝试从文本中提取')
-
-            # 提取响应文本
-            response_text = ''
-            for block in response.content:
-                if block.type == 'text':
-                    response_text += block.text
-                    logger.debug(f'📝 文本块长度: {len(block.text)} 字符')
-
-            logger.info(f'📊 总响应文本长度: {len(response_text)} 字符')
-
-            # 记录响应文本的前 2000 字符（用于调试）
-            if len(response_text) > 0:
-                preview_length = min(2000, len(response_text))
-                logger.info(f'📄 响应预览 (前 {preview_length} 字符):')
-                logger.info('=' * 70)
-                logger.info(response_text[:preview_length])
-                logger.info('=' * 70)
-            else:
-                logger.warning('⚠️ 响应文本为空！')
-
-            # 解析 JSON
-            parsed_data = self._extract_json_from_skill_response(response_text)
-
-            if parsed_data is not None:
-                logger.info('✅ JSON 解析成功')
-                logger.debug(f'解析后的数据键: {list(parsed_data.keys())}')
-                return {
-                    'success': True,
-                    'data': parsed_data,
-                    'raw_text': response_text
-                }
-            else:
-                logger.error('❌ 无法从响应中提取有效的 JSON')
-                logger.error('完整响应内容:')
-                logger.error(response_text)
-                return {
-                    'success': False,
-                    'error': 'Could not parse JSON from response',
-                    'raw_text': response_text
-                }
+        except RateLimitQueueTimeout as e:
+            return self._queue_timeout_result(e)
 
         except APIError as e:
-            logger.error(f'❌ Claude API 错误: {e}')
-            error_message = str(e)
-            if 'rate_limit' in error_message.lower() or 'too many requests' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'API 调用频率超限，请稍后再试'
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'AI 服务错误: {error_message}'
-                }
+            return self._api_error_result(e, 'Claude')
 
         except Exception as e:
-            logger.error(f'❌ 调用失败: {str(e)}', exc_info=True)
-            error_message = str(e)
-            if 'connect' in error_message.lower() or 'network' in error_message.lower():
-                return {
-                    'success': False,
-                    'error': '无法连接到 AI 服务，请检查网络'
-                }
-            return {
-                'success': False,
-                'error': f'系统错误: {error_message}'
-            }
-
-    def _extract_json_from_skill_response(self, text: str) -> Optional[Dict[str, Any]]:
-        """
-        从 Skill 响应中提取 JSON
-
-        支持多种格式：
-        1. 直接 JSON
-        2. ```json code block
-        3. 混合文本中的 JSON 对象
-
-        Args:
-            text: 响应文本
-
-        Returns:
-            解析后的 dict，或 None（如果解析失败）
-        """
-        import re
-        import json
-
-        logger.info('🔍 开始 JSON 提取...')
-
-        # 1. 尝试直接解析整个文本
-        logger.debug('尝试方法 1: 直接解析整个文本')
-        try:
-            data = json.loads(text)
-            logger.info('✅ 方法 1 成功：直接解析')
-            return data
-        except json.JSONDecodeError as e:
-            logger.debug(f'方法 1 失败: {str(e)}')
-
-        # 2. 尝试提取 JSON code block
-        logger.debug('尝试方法 2: 提取 ```json``` code block')
-        json_block_pattern = r'```json\s*([\s\S]*?)\s*```'
-        json_blocks = re.findall(json_block_pattern, text)
-
-        if json_blocks:
-            logger.debug(f'找到 {len(json_blocks)} 个 JSON code blocks')
-            for i, block in enumerate(json_blocks):
-                try:
-                    data = json.loads(block)
-                    logger.info(f'✅ 方法 2 成功：从 code block {i} 解析')
-                    return data
-                except json.JSONDecodeError as e:
-                    logger.debug(f'Code block {i} 解析失败: {str(e)}')
-        else:
-            logger.debug('未找到 JSON code blocks')
-
-        # 3. 尝试查找第一个完整的 JSON 对象
-        logger.debug('尝试方法 3: 查找 JSON 对象')
-        json_pattern = r'\{[\s\S]*\}'
-        matches = re.findall(json_pattern, text)
-
-        if matches:
-            logger.debug(f'找到 {len(matches)} 个可能的 JSON 对象')
-            for i, match in enumerate(matches):
-                try:
-                    data = json.loads(match)
-                    logger.debug(f'JSON 对象 {i} 解析成功，检查关键字段...')
-                    logger.debug(f'对象键: {list(data.keys())}')
-
-                    # 检查是否包含期望的关键字段（营养计算相关）
-                    if 'bmr_kcal' in data or 'target_calories_kcal' in data or 'macros' in data:
-                        logger.info(f'✅ 方法 3 成功：从 JSON 对象 {i} 解析')
-                        return data
-                    else:
-                        logger.debug(f'JSON 对象 {i} 缺少期望的关键字段')
-                except json.JSONDecodeError as e:
-                    logger.debug(f'JSON 对象 {i} 解析失败: {str(e)[:100]}')
-        else:
-            logger.debug('未找到 JSON 对象模式')
-
-        logger.error('❌ 所有 JSON 提取方法均失败')
-        return None
+            return self._unknown_error_result(e)
 
 
 # 全局单例
@@ -784,10 +1061,19 @@ _claude_client: Optional[ClaudeClient] = None
 
 
 def get_claude_client() -> ClaudeClient:
-    """获取 Claude 客户端单例"""
+    """
+    获取 Claude 客户端单例
+
+    设置 ANTHROPIC_ASYNC_CLIENT=true 时返回基于 AsyncClaudeClient 的同步桥接客户端
+    （接口与 ClaudeClient 相同，所有调用复用同一个事件循环和 HTTP 连接池）
+    """
     global _claude_client
     if _claude_client is None:
-        _claude_client = ClaudeClient()
+        if os.environ.get('ANTHROPIC_ASYNC_CLIENT', 'false').lower() == 'true':
+            from .async_claude_client import BridgedClaudeClient
+            _claude_client = BridgedClaudeClient()
+        else:
+            _claude_client = ClaudeClient()
     return _claude_client
 
 
@@ -13,7 +13,7 @@ from .skill_manager import get_or_create_nutrition_skill
 from utils.logger import logger
 
 
-def call_nutrition_calculator_skill(params: Dict[str, Any]) -> Dict[str, Any]:
+def call_nutrition_calculator_skill(params: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
     """
     调用 nutrition-calculator skill 生成饮食计划
 
@@ -31,6 +31,7 @@ def call_nutrition_calculator_skill(params: Dict[str, Any]) -> Dict[str, Any]:
             - meal_count: int (可选)
             - allergies: list (可选)
             - plan_duration_days: int (可选)
+        user_id: 记账 / 限流用的用户ID
 
     Returns:
         {
@@ -74,7 +75,9 @@ Generate a {plan_days}-day diet plan as specified in the parameters."""
         claude_client = get_claude_client()
         response = claude_client.call_claude_with_skill(
             user_prompt=user_prompt,
-            skill_id=skill_id
+            skill_id=skill_id,
+            endpoint="diet_plan_skill",
+            user_id=user_id
         )
 
         if not response.get("success"):
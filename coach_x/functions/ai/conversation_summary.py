@@ -0,0 +1,79 @@
+"""
+对话历史压缩
+
+LLM Profile 中只保留最近几轮完整对话；更早的对话折叠为一段滚动摘要
+（本地抽取式：每轮保留用户请求和回复的首句），
+Prompt 携带 "摘要 + 最近几轮"，长期使用的学员输入长度也保持有界。
+
+压缩在写入对话历史的事务中完成，不调用模型，不增加额外往返。
+"""
+import re
+from datetime import datetime
+from typing import Dict, Any, List
+
+from users.models import UserLLMProfile
+
+# 压缩后保留的完整对话轮数
+KEEP_RECENT_TURNS = 6
+
+# 完整对话超过该轮数时触发压缩（批量折叠，避免每轮都改写摘要）
+COMPACT_THRESHOLD = 10
+
+# 摘要最大长度（超出时丢弃最早的条目）
+MAX_SUMMARY_CHARS = 1500
+
+# 每轮摘要中用户请求 / 回复的最大长度
+USER_SNIPPET_CHARS = 80
+RESPONSE_SNIPPET_CHARS = 80
+
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;\n])')
+
+
+def first_sentence(text: str, limit: int) -> str:
+    """提取首句（去除多余空白，超长截断）"""
+    text = ' '.join((text or '').split())
+    sentence = _SENTENCE_END.split(text, maxsplit=1)[0].strip() if text else ''
+    if len(sentence) > limit:
+        sentence = sentence[:limit].rstrip() + '…'
+    return sentence
+
+
+def summarize_turn(entry: Dict[str, Any]) -> str:
+    """把一轮对话压缩为一行摘要"""
+    timestamp = entry.get('timestamp')
+    date_text = datetime.fromtimestamp(timestamp / 1000).strftime('%m-%d') if timestamp else '--'
+
+    line = f"[{date_text}] 用户：{first_sentence(entry.get('user_message', ''), USER_SNIPPET_CHARS)}"
+    response = first_sentence(entry.get('ai_response', ''), RESPONSE_SNIPPET_CHARS)
+    if response:
+        line += f" → 回复：{response}"
+    return line
+
+
+def fold_into_summary(summary: str, entries: List[Dict[str, Any]]) -> str:
+    """把若干轮对话追加到滚动摘要（超出长度上限时丢弃最早的条目）"""
+    lines = [line for line in (summary or '').split('\n') if line]
+    lines.extend(summarize_turn(entry) for entry in entries)
+
+    total = sum(len(line) + 1 for line in lines)
+    while lines and total > MAX_SUMMARY_CHARS:
+        total -= len(lines.pop(0)) + 1
+    return '\n'.join(lines)
+
+
+def compact_conversation_history(profile: UserLLMProfile) -> bool:
+    """
+    超过阈值时把较早的对话折叠进摘要
+
+    Returns:
+        是否发生了压缩（调用方据此决定是否写入摘要字段）
+    """
+    history = profile.conversation_history
+    if len(history) <= COMPACT_THRESHOLD:
+        return False
+
+    folded = history[:-KEEP_RECENT_TURNS]
+    profile.conversation_summary = fold_into_summary(profile.conversation_summary, folded)
+    profile.summarized_count += len(folded)
+    profile.conversation_history = history[-KEEP_RECENT_TURNS:]
+    return True
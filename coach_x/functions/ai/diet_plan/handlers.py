@@ -150,7 +150,7 @@ def generate_diet_plan_with_skill(req: https_fn.CallableRequest):
         logger.info("=" * 70)
 
         # 调用 nutrition-calculator skill
-        skill_result = call_nutrition_calculator_skill(skill_params)
+        skill_result = call_nutrition_calculator_skill(skill_params, user_id=user_id)
 
         if not skill_result.get("success"):
             error_msg = skill_result.get("error", "Skill 调用失败")
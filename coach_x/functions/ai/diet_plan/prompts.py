@@ -4,7 +4,7 @@
 为饮食计划相关的 AI 生成场景提供 Prompt 模板
 """
 
-import json
+from plans.digest import get_diet_plan_digest
 
 
 def build_edit_diet_plan_prompt(
@@ -149,9 +149,6 @@ def build_edit_diet_plan_prompt(
 - 用户的饮食偏好和过敏信息
 """
 
-    # 计算当前营养数据
-    total_macros = _calculate_plan_macros(current_plan)
-
     # 构建对话历史部分
     history_text = ""
     if conversation_history:
@@ -163,19 +160,8 @@ def build_edit_diet_plan_prompt(
 
     user_prompt = f"""{history_text}
 
-当前饮食计划：
-名称：{current_plan.get('name')}
-描述：{current_plan.get('description')}
-天数：{len(current_plan.get('days', []))}
-
-当前营养数据（平均每天）：
-- 蛋白质：{total_macros['protein']:.1f}g
-- 碳水化合物：{total_macros['carbs']:.1f}g
-- 脂肪：{total_macros['fat']:.1f}g
-- 总热量：{total_macros['calories']:.0f} kcal
-
-计划详情：
-{json.dumps(current_plan, ensure_ascii=False, indent=2)}
+当前饮食计划（行首编号 [dX.mY.fZ] 对应 day_index=X, meal_index=Y, food_item_index=Z；营养数据 P/C/F 单位为 g）：
+{get_diet_plan_digest(current_plan)}
 
 ---
 
@@ -188,31 +174,3 @@ def build_edit_diet_plan_prompt(
 
     return system_prompt, user_prompt
 
-
-def _calculate_plan_macros(plan: dict) -> dict:
-    """
-    计算整个饮食计划的平均营养数据
-
-    Args:
-        plan: 饮食计划数据
-
-    Returns:
-        dict: 包含 protein, carbs, fat, calories 的字典（平均值）
-    """
-    days = plan.get('days', [])
-    if not days:
-        return {'protein': 0, 'carbs': 0, 'fat': 0, 'calories': 0}
-
-    total = {'protein': 0, 'carbs': 0, 'fat': 0, 'calories': 0}
-
-    for day in days:
-        for meal in day.get('meals', []):
-            for item in meal.get('items', []):
-                total['protein'] += item.get('protein', 0)
-                total['carbs'] += item.get('carbs', 0)
-                total['fat'] += item.get('fat', 0)
-                total['calories'] += item.get('calories', 0)
-
-    # 返回平均值
-    day_count = len(days)
-    return {k: v / day_count for k, v in total.items()}
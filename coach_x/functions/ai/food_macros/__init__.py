@@ -6,8 +6,10 @@ Food Macros Module
 
 from .handlers import (
     get_food_macros,
+    get_food_macros_batch,
 )
 
 __all__ = [
     'get_food_macros',
+    'get_food_macros_batch',
 ]
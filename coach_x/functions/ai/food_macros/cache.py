@@ -0,0 +1,311 @@
+"""
+食物营养缓存
+
+每 100 克食物的营养成分不会变化，按「规范化食物名 + 语言」缓存查询结果：
+
+- 第一层：进程内 LRU + TTL（热实例内毫秒级命中）
+- 第二层：Firestore foodMacrosCache 集合（所有实例、所有用户共享）
+
+查询失败（模型无法给出有效数据）会做负缓存，避免重复调用 Claude
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Tuple, List, Iterable
+
+from firebase_admin import firestore
+from utils.logger import logger
+from .names import normalize_food_name
+
+COLLECTION = 'foodMacrosCache'
+
+# 进程内缓存配置
+MEMORY_MAX_ENTRIES = 2000
+MEMORY_TTL_SECONDS = 24 * 3600
+MEMORY_NEGATIVE_TTL_SECONDS = 10 * 60
+
+# Firestore 缓存有效期
+FIRESTORE_TTL_DAYS = 180
+FIRESTORE_NEGATIVE_TTL_DAYS = 1
+
+STATUS_OK = 'ok'
+STATUS_NOT_FOUND = 'not_found'
+
+# 查询结果标记
+MISS = object()
+
+
+def cache_key(food_name: str, language: str) -> str:
+    """按规范化名称 + 语言生成内容寻址的文档 ID"""
+    raw = f'{language.strip().lower()}:{normalize_food_name(food_name)}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class _LRUCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FoodMacrosCache:
+    """
+    两级食物营养缓存
+
+    get() 返回值：
+        - MISS: 未命中，需要调用 Claude
+        - None: 负缓存命中（之前查询失败）
+        - dict: {'protein', 'carbs', 'fat', 'calories'}
+    """
+
+    def __init__(self, max_entries: int = MEMORY_MAX_ENTRIES):
+        self._memory = _LRUCache(max_entries)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'firestore_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+        }
+
+    def get(self, food_name: str, language: str) -> Any:
+        """按名称 + 语言查询缓存（先内存，再 Firestore）"""
+        key = cache_key(food_name, language)
+
+        value = self._memory.get(key)
+        if value is not MISS:
+            self._record('negative_hits' if value is None else 'memory_hits')
+            return value
+
+        value = self._get_from_firestore(key)
+        if value is not MISS:
+            self._record('negative_hits' if value is None else 'firestore_hits')
+            self._memory.set(
+                key, value, MEMORY_NEGATIVE_TTL_SECONDS if value is None else MEMORY_TTL_SECONDS
+            )
+            return value
+
+        self._record('misses')
+        return MISS
+
+    def set(self, food_name: str, language: str, macros: Dict[str, float]):
+        """写入成功查询的结果"""
+        key = cache_key(food_name, language)
+        self._memory.set(key, macros, MEMORY_TTL_SECONDS)
+        self._write_to_firestore(key, food_name, language, STATUS_OK, macros, FIRESTORE_TTL_DAYS)
+
+    def set_negative(self, food_name: str, language: str, persist: bool = True):
+        """
+        写入负缓存
+
+        Args:
+            persist: 是否写入 Firestore（API 限流、网络错误等临时失败只缓存在内存中）
+        """
+        key = cache_key(food_name, language)
+        self._memory.set(key, None, MEMORY_NEGATIVE_TTL_SECONDS)
+        if persist:
+            self._write_to_firestore(
+                key, food_name, language, STATUS_NOT_FOUND, None, FIRESTORE_NEGATIVE_TTL_DAYS
+            )
+
+    def get_many(self, food_names: List[str], language: str) -> Dict[str, Any]:
+        """
+        批量查询缓存：内存未命中的食物合并为一次 Firestore get_all
+
+        Returns:
+            食物名称 -> 查询结果（取值同 get()）
+        """
+        results: Dict[str, Any] = {}
+        misses: Dict[str, List[str]] = {}
+        for name in food_names:
+            key = cache_key(name, language)
+            value = self._memory.get(key)
+            if value is not MISS:
+                self._record('negative_hits' if value is None else 'memory_hits')
+                results[name] = value
+            else:
+                misses.setdefault(key, []).append(name)
+
+        stored = self._get_many_from_firestore(list(misses)) if misses else {}
+        for key, names in misses.items():
+            value = stored.get(key, MISS)
+            if value is MISS:
+                self._record('misses')
+            else:
+                self._record('negative_hits' if value is None else 'firestore_hits')
+                self._memory.set(
+                    key, value, MEMORY_NEGATIVE_TTL_SECONDS if value is None else MEMORY_TTL_SECONDS
+                )
+            for name in names:
+                results[name] = value
+
+        return results
+
+    def set_many(
+        self,
+        results: Dict[str, Optional[Dict[str, float]]],
+        language: str,
+        memory_only: Iterable[str] = (),
+    ):
+        """
+        批量写入查询结果（Firestore 合并为一次 WriteBatch 提交）
+
+        Args:
+            results: 食物名称 -> 营养数据（None 表示写入负缓存）
+            memory_only: 只缓存在内存中的负缓存食物（临时失败）
+        """
+        memory_only = set(memory_only)
+        docs = {}
+        for name, macros in results.items():
+            key = cache_key(name, language)
+            if macros is None:
+                self._memory.set(key, None, MEMORY_NEGATIVE_TTL_SECONDS)
+                if name not in memory_only:
+                    docs[key] = _doc_data(
+                        name, language, STATUS_NOT_FOUND, None, FIRESTORE_NEGATIVE_TTL_DAYS
+                    )
+            else:
+                self._memory.set(key, macros, MEMORY_TTL_SECONDS)
+                docs[key] = _doc_data(name, language, STATUS_OK, macros, FIRESTORE_TTL_DAYS)
+
+        if not docs:
+            return
+
+        try:
+            db = firestore.client()
+            batch = db.batch()
+            for key, data in docs.items():
+                batch.set(db.collection(COLLECTION).document(key), data)
+            batch.commit()
+        except Exception as e:
+            logger.warning(f'⚠️ [FoodMacrosCache] 批量写入 Firestore 缓存失败: {str(e)}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = sum(stats.values())
+        hits = stats['memory_hits'] + stats['firestore_hits'] + stats['negative_hits']
+        stats['hit_rate'] = round(hits / total, 4) if total else 0.0
+        return stats
+
+    def clear_memory(self):
+        """清空进程内缓存"""
+        self._memory.clear()
+
+    # ==================== 内部实现 ====================
+
+    def _record(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+            total = sum(self._stats.values())
+            stats = dict(self._stats)
+
+        if total % 50 == 0:
+            logger.info(f'📊 [FoodMacrosCache] 累计 {total} 次查询: {stats}')
+
+    def _get_from_firestore(self, key: str) -> Any:
+        try:
+            return _parse_doc(firestore.client().collection(COLLECTION).document(key).get())
+        except Exception as e:
+            logger.warning(f'⚠️ [FoodMacrosCache] 读取 Firestore 缓存失败: {str(e)}')
+            return MISS
+
+    def _get_many_from_firestore(self, keys: List[str]) -> Dict[str, Any]:
+        try:
+            db = firestore.client()
+            refs = [db.collection(COLLECTION).document(key) for key in keys]
+            return {doc.id: _parse_doc(doc) for doc in db.get_all(refs)}
+        except Exception as e:
+            logger.warning(f'⚠️ [FoodMacrosCache] 批量读取 Firestore 缓存失败: {str(e)}')
+            return {}
+
+    def _write_to_firestore(
+        self,
+        key: str,
+        food_name: str,
+        language: str,
+        status: str,
+        macros: Optional[Dict[str, float]],
+        ttl_days: int,
+    ):
+        try:
+            firestore.client().collection(COLLECTION).document(key).set(
+                _doc_data(food_name, language, status, macros, ttl_days)
+            )
+        except Exception as e:
+            logger.warning(f'⚠️ [FoodMacrosCache] 写入 Firestore 缓存失败: {str(e)}')
+
+
+def _parse_doc(doc) -> Any:
+    """解析 Firestore 缓存文档（不存在或已过期返回 MISS）"""
+    if not doc.exists:
+        return MISS
+
+    data = doc.to_dict() or {}
+    expires_at = data.get('expiresAt')
+    if expires_at and expires_at < datetime.now(timezone.utc):
+        return MISS
+
+    if data.get('status') == STATUS_NOT_FOUND:
+        return None
+    return data.get('macros') or MISS
+
+
+def _doc_data(
+    food_name: str,
+    language: str,
+    status: str,
+    macros: Optional[Dict[str, float]],
+    ttl_days: int,
+) -> Dict[str, Any]:
+    """构建 Firestore 缓存文档"""
+    return {
+        'foodName': food_name,
+        'normalizedName': normalize_food_name(food_name),
+        'language': language,
+        'status': status,
+        'macros': macros,
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+        'expiresAt': datetime.now(timezone.utc) + timedelta(days=ttl_days),
+    }
+
+
+# 全局单例（热实例内复用）
+_food_macros_cache: Optional[FoodMacrosCache] = None
+
+
+def get_food_macros_cache() -> FoodMacrosCache:
+    """获取食物营养缓存单例"""
+    global _food_macros_cache
+    if _food_macros_cache is None:
+        _food_macros_cache = FoodMacrosCache()
+    return _food_macros_cache
@@ -5,19 +5,56 @@
 """
 
 from firebase_functions import https_fn
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple, List
 
 from ..claude_client import get_claude_client
+from .cache import get_food_macros_cache, MISS
+from .names import normalize_food_name
+from .nutrition_table import lookup_local_macros
+from utils.concurrency import run_concurrently
 from utils.logger import logger
 
+EMPTY_MACROS = {"protein": 0.0, "carbs": 0.0, "fat": 0.0, "calories": 0.0}
+
+# 批量查询单次最多食物数
+MAX_BATCH_SIZE = 50
+
+# 批量结果未按名称匹配的食物，逐个重新查询的并发数
+MAX_REQUERY_WORKERS = 4
+
+SYSTEM_PROMPT = """你是一位专业的营养学专家，精通各种食物的营养成分。
+你的任务是提供准确的食物营养信息。
+
+要求：
+1. 提供每100克食物的营养成分
+2. 数值应该是准确的平均值
+3. 如果食物名称不明确，请选择最常见的类型
+4. 返回纯 JSON 格式，不要包含任何其他文字
+5. JSON 格式必须严格遵循：{"protein": float, "carbs": float, "fat": float, "calories": float}"""
+
+BATCH_SYSTEM_PROMPT = """你是一位专业的营养学专家，精通各种食物的营养成分。
+你的任务是一次性提供多种食物的准确营养信息。
+
+要求：
+1. 提供每100克食物的营养成分
+2. 数值应该是准确的平均值
+3. 如果食物名称不明确，请选择最常见的类型
+4. 每种食物都必须返回，name 与输入列表中的写法完全一致
+5. 返回纯 JSON 格式，不要包含任何其他文字
+6. JSON 格式必须严格遵循：{"foods": [{"name": str, "protein": float, "carbs": float, "fat": float, "calories": float}]}"""
+
 
 @https_fn.on_call(secrets=["ANTHROPIC_API_KEY"])
 def get_food_macros(req: https_fn.CallableRequest):
     """
     AI 获取食物营养信息
 
+    查询顺序：本地营养表 → 缓存（进程内 + Firestore foodMacrosCache）→ Claude，
+    常见食物无需调用 Claude
+
     请求参数:
         - food_name: str, 食物名称
+        - language: str, 语言（可选，默认 '中文'）
 
     返回:
         {
@@ -38,28 +75,263 @@ def get_food_macros(req: https_fn.CallableRequest):
 
         user_id = req.auth.uid
         food_name = req.data.get("food_name", "").strip()
+        language = req.data.get("language", "中文")
 
         if not food_name:
             raise https_fn.HttpsError("invalid-argument", "food_name 不能为空")
 
         logger.info(f"🥗 AI获取食物营养信息 - 用户: {user_id}, 食物: {food_name}")
 
-        # 获取 Claude 客户端
-        client = get_claude_client()
+        # 本地营养表
+        local_macros = lookup_local_macros(food_name)
+        if local_macros:
+            return {
+                "status": "success",
+                "data": local_macros,
+                "message": f"成功获取 {food_name} 的营养信息",
+            }
 
-        # 构建 system prompt
-        system_prompt = """你是一位专业的营养学专家，精通各种食物的营养成分。
-你的任务是提供准确的食物营养信息。
+        # 查询缓存
+        cache = get_food_macros_cache()
+        cached = cache.get(food_name, language)
+        if cached is not MISS:
+            if cached is None:
+                logger.info(f"💾 负缓存命中 - {food_name}")
+                return _manual_input_response(food_name)
 
-要求：
-1. 提供每100克食物的营养成分
-2. 数值应该是准确的平均值
-3. 如果食物名称不明确，请选择最常见的类型
-4. 返回纯 JSON 格式，不要包含任何其他文字
-5. JSON 格式必须严格遵循：{"protein": float, "carbs": float, "fat": float, "calories": float}"""
+            logger.info(f"💾 缓存命中 - {food_name}: {cached}")
+            return {
+                "status": "success",
+                "data": cached,
+                "message": f"成功获取 {food_name} 的营养信息",
+            }
+
+        result, transient_error = _fetch_macros_from_claude(food_name, user_id)
+
+        if result is None:
+            # 模型无法给出有效数据时持久化负缓存；API 临时错误只在内存中短暂缓存
+            cache.set_negative(food_name, language, persist=not transient_error)
+            return _manual_input_response(food_name)
+
+        cache.set(food_name, language, result)
+        logger.info(f"✅ 成功获取营养信息 - {food_name}: {result}")
+
+        return {
+            "status": "success",
+            "data": result,
+            "message": f"成功获取 {food_name} 的营养信息",
+        }
+
+    except https_fn.HttpsError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 获取食物营养信息失败: {str(e)}", exc_info=True)
+        # 返回默认值而不是抛出错误，提升用户体验
+        return {
+            "status": "error",
+            "data": dict(EMPTY_MACROS),
+            "message": f"获取失败: {str(e)}，请手动输入营养信息",
+        }
+
+
+@https_fn.on_call(secrets=["ANTHROPIC_API_KEY"])
+def get_food_macros_batch(req: https_fn.CallableRequest):
+    """
+    批量获取食物营养信息
+
+    本地营养表和缓存中已有的食物直接返回，其余食物合并为一次 Claude 调用
+
+    请求参数:
+        - food_names: list[str], 食物名称列表（最多 50 个）
+        - language: str, 语言（可选，默认 '中文'）
+
+    返回:
+        {
+            'status': 'success' | 'error',
+            'data': {
+                '<食物名称>': {'protein', 'carbs', 'fat', 'calories'}  // 克或千卡 /100g
+            },
+            'unresolved': list[str],  // 无法获取的食物（data 中为 0，需手动输入）
+            'message': str
+        }
+    """
+    try:
+        # 验证用户登录
+        if not req.auth:
+            raise https_fn.HttpsError("unauthenticated", "用户未登录")
+
+        user_id = req.auth.uid
+        language = req.data.get("language", "中文")
+        food_names = req.data.get("food_names") or []
+
+        if not isinstance(food_names, list):
+            raise https_fn.HttpsError("invalid-argument", "food_names 必须是列表")
+
+        # 去空、去重（按规范化名称），保持原始顺序
+        unique_names = []
+        seen = set()
+        for name in food_names:
+            name = str(name).strip()
+            normalized = normalize_food_name(name)
+            if name and normalized not in seen:
+                seen.add(normalized)
+                unique_names.append(name)
+
+        if not unique_names:
+            raise https_fn.HttpsError("invalid-argument", "food_names 不能为空")
+        if len(unique_names) > MAX_BATCH_SIZE:
+            raise https_fn.HttpsError(
+                "invalid-argument", f"food_names 最多 {MAX_BATCH_SIZE} 个"
+            )
+
+        logger.info(f"🥗 AI批量获取食物营养信息 - 用户: {user_id}, 数量: {len(unique_names)}")
 
-        # 构建 user prompt
-        user_prompt = f"""请提供 "{food_name}" 每100克的营养成分。
+        # 1. 查询本地营养表和缓存
+        cache = get_food_macros_cache()
+        results: Dict[str, Optional[Dict[str, float]]] = {}
+        not_local = []
+        for name in unique_names:
+            local_macros = lookup_local_macros(name)
+            if local_macros:
+                results[name] = local_macros
+            else:
+                not_local.append(name)
+
+        pending = []
+        cached = cache.get_many(not_local, language)
+        for name in not_local:
+            if cached[name] is MISS:
+                pending.append(name)
+            else:
+                results[name] = cached[name]
+
+        logger.info(f"💾 本地/缓存命中 {len(results)}/{len(unique_names)}，需查询 {len(pending)} 个")
+
+        # 2. 未命中的食物合并为一次调用
+        if pending:
+            fetched, transient_error = _fetch_macros_batch_from_claude(pending, user_id)
+            outcomes = {name: (macros, False) for name, macros in fetched.items()}
+
+            # 批量结果中没有按名称匹配上的食物逐个重新查询（不按位置猜测，避免串用其他食物的数据）；
+            # 工作线程不继承 rate_limit_user() 上下文，显式传入 user_id
+            unmatched = [name for name in pending if name not in fetched]
+            if unmatched and not transient_error:
+                logger.info(f"🔁 批量结果缺少 {len(unmatched)} 个食物，逐个重新查询")
+                outcomes.update(run_concurrently(
+                    {name: (lambda name=name: _fetch_macros_from_claude(name, user_id)) for name in unmatched},
+                    max_workers=MAX_REQUERY_WORKERS,
+                    thread_name_prefix="food-macros",
+                ))
+
+            memory_only = []
+            for name in pending:
+                macros, name_transient = outcomes.get(name, (None, transient_error))
+                if macros is None and name_transient:
+                    memory_only.append(name)
+                results[name] = macros
+            cache.set_many({name: results[name] for name in pending}, language, memory_only=memory_only)
+
+        # 3. 按请求中的原始名称返回
+        data = {}
+        unresolved = []
+        for name in food_names:
+            name = str(name).strip()
+            if not name or name in data:
+                continue
+            macros = _lookup_by_normalized_name(results, name)
+            if macros is None:
+                unresolved.append(name)
+            data[name] = dict(macros) if macros else dict(EMPTY_MACROS)
+
+        logger.info(f"✅ 批量获取完成 - 成功 {len(data) - len(unresolved)}, 失败 {len(unresolved)}")
+
+        return {
+            "status": "success",
+            "data": data,
+            "unresolved": unresolved,
+            "message": (
+                f"成功获取 {len(data)} 种食物的营养信息"
+                if not unresolved
+                else f"无法自动获取 {', '.join(unresolved)} 的营养信息，请手动输入"
+            ),
+        }
+
+    except https_fn.HttpsError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ 批量获取食物营养信息失败: {str(e)}", exc_info=True)
+        return {
+            "status": "error",
+            "data": {},
+            "unresolved": [],
+            "message": f"获取失败: {str(e)}，请手动输入营养信息",
+        }
+
+
+def _lookup_by_normalized_name(
+    results: Dict[str, Optional[Dict[str, float]]], name: str
+) -> Optional[Dict[str, float]]:
+    """按规范化名称查找结果（请求中的重复名称写法不同也能匹配）"""
+    if name in results:
+        return results[name]
+    normalized = normalize_food_name(name)
+    for result_name, macros in results.items():
+        if normalize_food_name(result_name) == normalized:
+            return macros
+    return None
+
+
+def _manual_input_response(food_name: str) -> Dict[str, Any]:
+    """无法获取营养信息时的默认返回，提示用户手动输入"""
+    return {
+        "status": "success",
+        "data": dict(EMPTY_MACROS),
+        "message": f"无法自动获取 {food_name} 的营养信息，请手动输入",
+    }
+
+
+def _validate_macros(macros_data: Any) -> Dict[str, float]:
+    """
+    验证并转换营养数据
+
+    Raises:
+        ValueError / KeyError / TypeError: 数据格式不正确
+    """
+    required_keys = ["protein", "carbs", "fat", "calories"]
+    for key in required_keys:
+        if key not in macros_data:
+            raise ValueError(f"缺少必需字段: {key}")
+
+    # 转换为 float 并验证
+    return {
+        "protein": float(macros_data["protein"]),
+        "carbs": float(macros_data["carbs"]),
+        "fat": float(macros_data["fat"]),
+        "calories": float(macros_data["calories"]),
+    }
+
+
+def _fetch_macros_from_claude(
+    food_name: str, user_id: Optional[str] = None
+) -> Tuple[Optional[Dict[str, float]], bool]:
+    """
+    调用 Claude 获取单个食物的营养信息
+
+    Args:
+        food_name: 食物名称
+        user_id: 记账 / 限流用的用户ID
+
+    Returns:
+        (营养数据, 是否为临时错误)
+        - 成功: (macros, False)
+        - 模型返回无效数据: (None, False)
+        - API 调用失败: (None, True)
+    """
+    # 获取 Claude 客户端
+    client = get_claude_client()
+
+    # 构建 user prompt
+    user_prompt = f"""请提供 "{food_name}" 每100克的营养成分。
 
 要求：
 - protein: 蛋白质含量（克）
@@ -72,65 +344,102 @@ def get_food_macros(req: https_fn.CallableRequest):
 示例格式：
 {{"protein": 31.0, "carbs": 0.0, "fat": 3.6, "calories": 165.0}}"""
 
-        # 调用 Claude API
-        response = client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
-        )
+    # 调用 Claude API
+    response = client.call_claude(
+        system_prompt=SYSTEM_PROMPT,
+        user_prompt=user_prompt,
+        response_format="json",
+        endpoint="food_macros",
+        user_id=user_id,
+    )
 
-        # 检查响应是否成功
-        if not response.get("success", False):
-            error_msg = response.get("error", "未知错误")
-            logger.error(f"❌ Claude API 调用失败: {error_msg}")
-            # 返回默认值
-            return {
-                "status": "success",
-                "data": {"protein": 0.0, "carbs": 0.0, "fat": 0.0, "calories": 0.0},
-                "message": f"无法自动获取 {food_name} 的营养信息，请手动输入",
-            }
+    # 检查响应是否成功
+    if not response.get("success", False):
+        error_msg = response.get("error", "未知错误")
+        logger.error(f"❌ Claude API 调用失败: {error_msg}")
+        # JSON 解析失败说明模型返回了无效数据，其余为 API 临时错误
+        return None, "raw_text" not in response
 
-        # 获取解析后的数据
-        macros_data = response.get("data", {})
-        logger.debug(f"Claude 响应: {macros_data}")
+    # 获取解析后的数据
+    macros_data = response.get("data", {})
+    logger.debug(f"Claude 响应: {macros_data}")
 
-        # 验证数据格式
-        try:
-            required_keys = ["protein", "carbs", "fat", "calories"]
-            for key in required_keys:
-                if key not in macros_data:
-                    raise ValueError(f"缺少必需字段: {key}")
-
-            # 转换为 float 并验证
-            result = {
-                "protein": float(macros_data["protein"]),
-                "carbs": float(macros_data["carbs"]),
-                "fat": float(macros_data["fat"]),
-                "calories": float(macros_data["calories"]),
-            }
+    # 验证数据格式
+    try:
+        return _validate_macros(macros_data), False
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"❌ 数据验证失败: {str(e)}, 原始数据: {macros_data}")
+        return None, False
 
-            logger.info(f"✅ 成功获取营养信息 - {food_name}: {result}")
 
-            return {
-                "status": "success",
-                "data": result,
-                "message": f"成功获取 {food_name} 的营养信息",
-            }
+def _fetch_macros_batch_from_claude(
+    food_names: List[str],
+    user_id: Optional[str] = None,
+) -> Tuple[Dict[str, Dict[str, float]], bool]:
+    """
+    一次 Claude 调用获取多个食物的营养信息
+
+    Args:
+        food_names: 食物名称列表
+        user_id: 记账 / 限流用的用户ID
+
+    Returns:
+        (食物名称 -> 营养数据, 是否为临时错误)
+        只接受名称与请求匹配的条目；模型漏掉、改写名称或返回无效数据的食物不会出现在结果中
+    """
+    client = get_claude_client()
+
+    food_list = "\n".join(f"{i + 1}. {name}" for i, name in enumerate(food_names))
+    user_prompt = f"""请提供以下 {len(food_names)} 种食物每100克的营养成分：
+
+{food_list}
+
+要求：
+- name: 食物名称（与上面列表中的写法完全一致）
+- protein: 蛋白质含量（克）
+- carbs: 碳水化合物含量（克）
+- fat: 脂肪含量（克）
+- calories: 卡路里（千卡）
 
+请按列表顺序返回 JSON 格式的数据，不要包含任何解释或说明。
+
+示例格式：
+{{"foods": [{{"name": "鸡胸肉", "protein": 31.0, "carbs": 0.0, "fat": 3.6, "calories": 165.0}}]}}"""
+
+    response = client.call_claude(
+        system_prompt=BATCH_SYSTEM_PROMPT,
+        user_prompt=user_prompt,
+        response_format="json",
+        endpoint="food_macros_batch",
+        user_id=user_id,
+    )
+
+    if not response.get("success", False):
+        error_msg = response.get("error", "未知错误")
+        logger.error(f"❌ Claude API 批量调用失败: {error_msg}")
+        return {}, "raw_text" not in response
+
+    data = response.get("data", {})
+    foods = data.get("foods", []) if isinstance(data, dict) else data
+    if not isinstance(foods, list):
+        logger.error(f"❌ 批量响应格式错误: {data}")
+        return {}, False
+
+    # 只按名称匹配（按位置匹配会在模型跳过或调换条目时把其他食物的数据写入共享缓存）
+    by_name = {normalize_food_name(name): name for name in food_names}
+    results = {}
+    for item in foods:
+        if not isinstance(item, dict):
+            continue
+        name = by_name.get(normalize_food_name(str(item.get("name", ""))))
+        if name is None:
+            logger.warning(f"⚠️ 批量结果中的食物名称无法匹配请求，已忽略: {item.get('name')}")
+            continue
+        if name in results:
+            continue
+        try:
+            results[name] = _validate_macros(item)
         except (ValueError, KeyError, TypeError) as e:
-            logger.error(f"❌ 数据验证失败: {str(e)}, 原始数据: {macros_data}")
-            # 返回默认值，避免完全失败
-            return {
-                "status": "success",
-                "data": {"protein": 0.0, "carbs": 0.0, "fat": 0.0, "calories": 0.0},
-                "message": f"无法自动获取 {food_name} 的营养信息，请手动输入",
-            }
+            logger.warning(f"⚠️ {name} 数据验证失败: {str(e)}, 原始数据: {item}")
 
-    except https_fn.HttpsError:
-        raise
-    except Exception as e:
-        logger.error(f"❌ 获取食物营养信息失败: {str(e)}", exc_info=True)
-        # 返回默认值而不是抛出错误，提升用户体验
-        return {
-            "status": "error",
-            "data": {"protein": 0.0, "carbs": 0.0, "fat": 0.0, "calories": 0.0},
-            "message": f"获取失败: {str(e)}，请手动输入营养信息",
-        }
+    return results, False
@@ -0,0 +1,26 @@
+"""
+食物名称规范化
+
+缓存键和本地营养表索引共用同一套规范化规则
+"""
+
+import re
+import unicodedata
+
+_PUNCTUATION_PATTERN = re.compile(r'[\s"\'“”‘’`·,，.。:：;；!！?？()（）\[\]【】]+')
+
+
+def normalize_food_name(food_name: str) -> str:
+    """
+    规范化食物名称
+
+    全角转半角、转小写、去掉空白和标点，
+    使 " 鸡胸肉 "、"鸡胸肉。"、"Chicken  Breast" 与 "chicken breast" 命中同一条缓存
+    """
+    normalized = unicodedata.normalize('NFKC', food_name or '').strip().lower()
+    return _PUNCTUATION_PATTERN.sub(' ', normalized).strip()
+
+
+def compact_food_name(food_name: str) -> str:
+    """规范化并去掉所有空格（用于拼音和英文名匹配，如 "ji xiong rou" 与 "jixiongrou"）"""
+    return normalize_food_name(food_name).replace(' ', '')
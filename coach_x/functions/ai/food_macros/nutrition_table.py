@@ -0,0 +1,168 @@
+"""
+本地营养成分表
+
+随代码打包的常见食物营养表（data/nutrition_table.csv），支持：
+
+- 中文名、英文名、别名、拼音精确匹配
+- 基于字符二元组倒排索引的模糊匹配（错别字、拼写差异）
+
+匹配置信度足够高时直接返回，不调用 Claude
+"""
+
+import csv
+import os
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Optional, Dict, Any, List, Set
+
+from utils.logger import logger
+from .names import compact_food_name
+
+TABLE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'nutrition_table.csv')
+
+# 模糊匹配最低置信度（低于此值交给 Claude）
+MIN_MATCH_CONFIDENCE = 0.9
+# 少于该长度的名称只做精确匹配（如 "梨"、"虾"，模糊匹配容易误判）
+MIN_FUZZY_LENGTH = 3
+
+MACRO_FIELDS = ('protein', 'carbs', 'fat', 'calories')
+
+
+def _bigrams(text: str) -> Set[str]:
+    """字符二元组（单字符名称返回自身）"""
+    if len(text) < 2:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class NutritionTable:
+    """
+    本地营养表及名称索引
+
+    lookup() 返回：
+        {'name': 表中名称, 'macros': {...}, 'confidence': float}，未匹配时返回 None
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self._foods: List[Dict[str, Any]] = []
+        # 紧凑名称（规范化 + 去空格）-> 食物下标
+        self._exact: Dict[str, int] = {}
+        # 二元组 -> 紧凑名称集合
+        self._bigram_index: Dict[str, Set[str]] = defaultdict(set)
+
+        for row in rows:
+            self._add(row)
+
+    @classmethod
+    def from_csv(cls, path: str = TABLE_PATH) -> 'NutritionTable':
+        """从 CSV 加载（忽略 # 开头的注释行）"""
+        with open(path, encoding='utf-8') as f:
+            lines = [line for line in f if line.strip() and not line.startswith('#')]
+        return cls(list(csv.DictReader(lines)))
+
+    def __len__(self) -> int:
+        return len(self._foods)
+
+    def lookup(self, food_name: str) -> Optional[Dict[str, Any]]:
+        """按名称查找，精确匹配优先，其次模糊匹配"""
+        key = compact_food_name(food_name)
+        if not key:
+            return None
+
+        index = self._exact.get(key)
+        if index is None and key.endswith('s'):
+            # 英文复数
+            index = self._exact.get(key[:-1])
+        if index is not None:
+            return self._result(index, 1.0)
+
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+
+        best_key, best_score = None, 0.0
+        for candidate in self._candidates(key):
+            score = SequenceMatcher(None, key, candidate).ratio()
+            if score > best_score:
+                best_key, best_score = candidate, score
+
+        if best_key is None or best_score < MIN_MATCH_CONFIDENCE:
+            return None
+        return self._result(self._exact[best_key], best_score)
+
+    # ==================== 内部实现 ====================
+
+    def _add(self, row: Dict[str, Any]):
+        try:
+            macros = {field: float(row[field]) for field in MACRO_FIELDS}
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f'⚠️ [NutritionTable] 跳过无效行: {row}')
+            return
+
+        index = len(self._foods)
+        self._foods.append({
+            'name': row.get('name_zh') or row.get('name_en'),
+            'macros': macros,
+        })
+
+        names = [row.get('name_zh'), row.get('name_en'), row.get('pinyin')]
+        names.extend((row.get('aliases') or '').split('|'))
+        for name in names:
+            key = compact_food_name(name or '')
+            if not key or key in self._exact:
+                continue
+            self._exact[key] = index
+            for bigram in _bigrams(key):
+                self._bigram_index[bigram].add(key)
+
+    def _candidates(self, key: str) -> Set[str]:
+        """与查询共享至少一个二元组的索引名称"""
+        candidates = set()
+        for bigram in _bigrams(key):
+            candidates |= self._bigram_index.get(bigram, set())
+        return candidates
+
+    def _result(self, index: int, confidence: float) -> Dict[str, Any]:
+        food = self._foods[index]
+        return {
+            'name': food['name'],
+            'macros': dict(food['macros']),
+            'confidence': round(confidence, 3),
+        }
+
+
+# 全局单例（首次使用时加载）
+_nutrition_table: Optional[NutritionTable] = None
+_nutrition_table_lock = threading.Lock()
+
+
+def get_nutrition_table() -> NutritionTable:
+    """获取本地营养表单例"""
+    global _nutrition_table
+    with _nutrition_table_lock:
+        if _nutrition_table is None:
+            _nutrition_table = NutritionTable.from_csv()
+            logger.info(f'📚 [NutritionTable] 已加载 {len(_nutrition_table)} 种食物')
+        return _nutrition_table
+
+
+def lookup_local_macros(food_name: str) -> Optional[Dict[str, float]]:
+    """
+    从本地营养表查找营养数据
+
+    Returns:
+        营养数据 dict，未匹配或置信度不足时返回 None
+    """
+    try:
+        match = get_nutrition_table().lookup(food_name)
+    except Exception as e:
+        logger.warning(f'⚠️ [NutritionTable] 查询失败: {str(e)}')
+        return None
+
+    if match is None:
+        return None
+
+    logger.info(
+        f'📚 [NutritionTable] {food_name} -> {match["name"]} (置信度 {match["confidence"]})'
+    )
+    return match['macros']
@@ -103,6 +103,8 @@ def _analyze_food_image(
             user_prompt=user_prompt,
             image_url=image_url,
             response_format="json",
+            endpoint="food_nutrition",
+            user_id=user_id,
         )
 
         if not response.get("success"):
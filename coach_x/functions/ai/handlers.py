@@ -38,6 +38,7 @@ from .text_import.handlers import (
 # 食物营养模块
 from .food_macros.handlers import (
     get_food_macros,
+    get_food_macros_batch,
 )
 
 from .food_nutrition.handlers import (
@@ -69,6 +70,7 @@ __all__ = [
 
     # Food Macros
     'get_food_macros',
+    'get_food_macros_batch',
     'analyze_food_nutrition',
 
     # Chat
@@ -91,6 +91,8 @@ def _import_from_image(
             user_prompt=user_prompt,
             image_url=image_url,
             response_format="json",
+            endpoint="image_import",
+            user_id=user_id,
         )
 
         if not response.get("success"):
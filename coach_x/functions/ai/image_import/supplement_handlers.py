@@ -90,6 +90,8 @@ def _import_supplement_from_image(
             user_prompt=user_prompt,
             image_url=image_url,
             response_format="json",
+            endpoint="supplement_image_import",
+            user_id=user_id,
         )
 
         if not response.get("success"):
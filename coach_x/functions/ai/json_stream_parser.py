@@ -0,0 +1,138 @@
+"""
+增量 JSON 解析器
+
+用于解析 Claude Tool Use 流式返回的 partial_json 片段（tool_delta 事件），
+在目标数组中的每个对象闭合时立即返回该对象，无需等待完整 JSON
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from utils.logger import logger
+
+
+class JsonArrayStreamParser:
+    """
+    顶层对象中指定数组字段的增量解析器
+
+    示例：
+        parser = JsonArrayStreamParser('exercises')
+        for event in claude_client.call_claude_streaming(...):
+            if event['type'] == 'tool_delta':
+                for exercise in parser.feed(event['partial_json']):
+                    ...  # exercises[i] 的 '}' 一到达就返回
+
+    只追踪顶层对象的直接字段（如 tool_input.exercises），
+    嵌套在其他字段中的同名数组会被忽略
+    """
+
+    def __init__(self, array_key: str):
+        """
+        Args:
+            array_key: 要提取元素的顶层数组字段名（如 'exercises', 'changes'）
+        """
+        self.array_key = array_key
+
+        self._buffer: List[str] = []  # 已接收的所有字符
+        self._stack: List[str] = []  # 当前打开的容器（'{' 或 '['）
+        self._in_string = False
+        self._escape = False
+
+        self._string_start: Optional[int] = None  # 顶层字符串起始位置
+        self._last_string: Optional[str] = None  # 顶层最近一个完整字符串
+        self._current_key: Optional[str] = None  # 顶层当前字段名
+
+        self._in_target_array = False
+        self._element_start: Optional[int] = None  # 当前元素起始位置
+        self._emitted = 0
+
+    @property
+    def emitted_count(self) -> int:
+        """已返回的元素数量"""
+        return self._emitted
+
+    def feed(self, fragment: str) -> List[Dict[str, Any]]:
+        """
+        输入一段 partial_json，返回本次新闭合的数组元素
+
+        Args:
+            fragment: tool_delta 事件中的 partial_json
+
+        Returns:
+            新完成的元素列表（可能为空）
+        """
+        completed = []
+        if not fragment:
+            return completed
+
+        offset = len(self._buffer)
+        self._buffer.extend(fragment)
+
+        for i, ch in enumerate(fragment, start=offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        raw = ''.join(self._buffer[self._string_start:i + 1])
+                        self._last_string = self._decode_string(raw)
+                        self._string_start = None
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._stack == ['{']:
+                    self._string_start = i
+
+            elif ch == ':':
+                if self._stack == ['{']:
+                    self._current_key = self._last_string
+
+            elif ch == ',':
+                if self._stack == ['{']:
+                    self._current_key = None
+
+            elif ch in '{[':
+                if ch == '[' and self._stack == ['{'] and self._current_key == self.array_key:
+                    self._in_target_array = True
+                elif ch == '{' and self._in_target_array and self._stack == ['{', '[']:
+                    self._element_start = i
+                self._stack.append(ch)
+
+            elif ch in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+
+                if ch == '}' and self._in_target_array and self._stack == ['{', '['] \
+                        and self._element_start is not None:
+                    element = self._parse_element(self._element_start, i)
+                    self._element_start = None
+                    if element is not None:
+                        completed.append(element)
+                        self._emitted += 1
+
+                elif ch == ']' and self._in_target_array and self._stack == ['{']:
+                    self._in_target_array = False
+
+        return completed
+
+    def _parse_element(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        """解析 buffer[start:end+1] 为 JSON 对象"""
+        raw = ''.join(self._buffer[start:end + 1])
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            logger.warning(f'⚠️ 增量解析 {self.array_key} 元素失败: {e}')
+            return None
+
+    @staticmethod
+    def _decode_string(raw: str) -> Optional[str]:
+        """解码 JSON 字符串字面量"""
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
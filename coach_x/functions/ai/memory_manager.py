@@ -2,15 +2,60 @@
 AI Memory 管理器
 
 管理用户的 LLM Profile，包括对话历史和训练偏好
+
+读取经过实例级短 TTL 缓存（一次对话中的多次读取只访问一次 Firestore）；
+写入在事务中只合并变更的字段，不再整文档覆盖，并发对话也不会互相丢失记录。
 """
 
-from typing import Dict, Any, Optional
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
 from firebase_admin import firestore
 from datetime import datetime
 
 from users.models import UserLLMProfile
+from .conversation_summary import compact_conversation_history
 from utils.logger import logger
 
+# Profile 缓存有效期（秒）
+PROFILE_CACHE_TTL_SECONDS = 60
+
+# 缓存的用户数上限（LRU 淘汰）
+MAX_CACHED_PROFILES = 1024
+
+_profile_cache: 'OrderedDict[str, tuple]' = OrderedDict()
+_profile_cache_lock = threading.Lock()
+
+
+def _profile_ref(user_id: str):
+    db = firestore.client()
+    return db.collection('users').document(user_id).collection('ai_memory').document('profile')
+
+
+def _get_cached_profile(user_id: str) -> Optional[UserLLMProfile]:
+    with _profile_cache_lock:
+        cached = _profile_cache.get(user_id)
+        if not cached:
+            return None
+        expires_at, data = cached
+        if expires_at < time.monotonic():
+            del _profile_cache[user_id]
+            return None
+        _profile_cache.move_to_end(user_id)
+    # 每次返回独立对象，调用方修改不会污染缓存
+    return UserLLMProfile.from_dict(copy.deepcopy(data))
+
+
+def _cache_profile(profile: UserLLMProfile):
+    data = copy.deepcopy(profile.to_dict())
+    with _profile_cache_lock:
+        _profile_cache[profile.user_id] = (time.monotonic() + PROFILE_CACHE_TTL_SECONDS, data)
+        _profile_cache.move_to_end(profile.user_id)
+        while len(_profile_cache) > MAX_CACHED_PROFILES:
+            _profile_cache.popitem(last=False)
+
 
 class MemoryManager:
     """用户 AI Memory 管理器"""
@@ -24,23 +69,25 @@ class MemoryManager:
             user_id: 用户ID
         
         Returns:
-            UserLLMProfile 对象，如果不存在则创建新的
+            UserLLMProfile 对象，如果不存在则返回默认 profile（首次写入时创建文档）
         """
+        cached = _get_cached_profile(user_id)
+        if cached:
+            return cached
+
         try:
-            db = firestore.client()
-            doc_ref = db.collection('users').document(user_id).collection('ai_memory').document('profile')
-            doc = doc_ref.get()
+            doc = _profile_ref(user_id).get()
             
             if doc.exists:
-                data = doc.to_dict()
                 logger.info(f'📖 加载用户 LLM Profile - User: {user_id}')
-                return UserLLMProfile.from_dict(data)
+                profile = UserLLMProfile.from_dict(doc.to_dict())
+                profile.user_id = profile.user_id or user_id
             else:
-                # 不存在则创建默认 profile
-                logger.info(f'🆕 创建新的 LLM Profile - User: {user_id}')
+                logger.info(f'🆕 使用默认 LLM Profile - User: {user_id}')
                 profile = UserLLMProfile(user_id=user_id)
-                MemoryManager.save_user_memory(profile)
-                return profile
+
+            _cache_profile(profile)
+            return profile
         
         except Exception as e:
             logger.error(f'❌ 获取用户 LLM Profile 失败: {str(e)}', exc_info=True)
@@ -59,10 +106,8 @@ class MemoryManager:
             是否成功
         """
         try:
-            db = firestore.client()
-            doc_ref = db.collection('users').document(profile.user_id).collection('ai_memory').document('profile')
-            
-            doc_ref.set(profile.to_dict())
+            _profile_ref(profile.user_id).set(profile.to_dict())
+            _cache_profile(profile)
             logger.info(f'💾 保存用户 LLM Profile - User: {profile.user_id}')
             return True
         
@@ -90,18 +135,28 @@ class MemoryManager:
             是否成功
         """
         try:
-            profile = MemoryManager.get_user_memory(user_id)
-            profile.add_conversation(user_message, ai_response, context)
-            
             # 尝试从对话中提取偏好
             extracted_prefs = MemoryManager._extract_preferences_from_conversation(
                 user_message, ai_response
             )
             if extracted_prefs:
-                profile.update_preferences(extracted_prefs)
                 logger.info(f'🔍 从对话中提取到偏好: {extracted_prefs}')
-            
-            return MemoryManager.save_user_memory(profile)
+
+            def apply(profile: UserLLMProfile) -> Dict[str, Any]:
+                # 先把较早的对话折叠进滚动摘要，再追加本轮
+                compacted = compact_conversation_history(profile)
+                profile.add_conversation(user_message, ai_response, context)
+                fields = {'conversation_history': profile.conversation_history}
+                if compacted:
+                    fields['conversation_summary'] = profile.conversation_summary
+                    fields['summarized_count'] = profile.summarized_count
+                if extracted_prefs:
+                    profile.update_preferences(extracted_prefs)
+                    fields['training_preferences'] = profile.training_preferences
+                return fields
+
+            MemoryManager._update_profile(user_id, apply)
+            return True
         
         except Exception as e:
             logger.error(f'❌ 更新对话历史失败: {str(e)}', exc_info=True)
@@ -123,9 +178,12 @@ class MemoryManager:
             是否成功
         """
         try:
-            profile = MemoryManager.get_user_memory(user_id)
-            profile.update_preferences(preferences)
-            return MemoryManager.save_user_memory(profile)
+            def apply(profile: UserLLMProfile) -> Dict[str, Any]:
+                profile.update_preferences(preferences)
+                return {'training_preferences': profile.training_preferences}
+
+            MemoryManager._update_profile(user_id, apply)
+            return True
         
         except Exception as e:
             logger.error(f'❌ 更新用户偏好失败: {str(e)}', exc_info=True)
@@ -150,6 +208,44 @@ class MemoryManager:
             logger.error(f'❌ 构建 memory context 失败: {str(e)}', exc_info=True)
             return "无特殊偏好记录"
     
+    @staticmethod
+    def _update_profile(
+        user_id: str,
+        apply: Callable[[UserLLMProfile], Dict[str, Any]]
+    ) -> UserLLMProfile:
+        """
+        在事务中读取最新 profile、应用修改，并只合并写入变更的字段
+
+        Args:
+            user_id: 用户ID
+            apply: 修改 profile 并返回需要写入的字段
+
+        Returns:
+            修改后的 profile（同时刷新缓存）
+        """
+        db = firestore.client()
+        doc_ref = _profile_ref(user_id)
+
+        @firestore.transactional
+        def update_in_transaction(transaction) -> UserLLMProfile:
+            snapshot = doc_ref.get(transaction=transaction)
+            if snapshot.exists:
+                profile = UserLLMProfile.from_dict(snapshot.to_dict())
+                profile.user_id = profile.user_id or user_id
+            else:
+                profile = UserLLMProfile(user_id=user_id)
+
+            fields = apply(profile)
+            fields['user_id'] = profile.user_id
+            fields['updated_at'] = profile.updated_at
+            transaction.set(doc_ref, fields, merge=True)
+            return profile
+
+        profile = update_in_transaction(db.transaction())
+        _cache_profile(profile)
+        logger.info(f'💾 更新用户 LLM Profile - User: {user_id}')
+        return profile
+
     @staticmethod
     def _extract_preferences_from_conversation(
         user_message: str,
@@ -201,10 +297,15 @@ class MemoryManager:
             是否成功
         """
         try:
-            profile = MemoryManager.get_user_memory(user_id)
-            profile.conversation_history = []
-            profile.updated_at = int(datetime.now().timestamp() * 1000)
-            return MemoryManager.save_user_memory(profile)
+            def apply(profile: UserLLMProfile) -> Dict[str, Any]:
+                profile.conversation_history = []
+                profile.conversation_summary = ''
+                profile.summarized_count = 0
+                profile.updated_at = int(datetime.now().timestamp() * 1000)
+                return {'conversation_history': [], 'conversation_summary': '', 'summarized_count': 0}
+
+            MemoryManager._update_profile(user_id, apply)
+            return True
         
         except Exception as e:
             logger.error(f'❌ 清空对话历史失败: {str(e)}', exc_info=True)
@@ -0,0 +1,352 @@
+"""
+Claude 调用准入控制
+
+在请求发出之前进行客户端限流，避免突发流量触发 429 后再重试：
+
+- 每个模型的最大并发数（in-flight 上限）
+- 令牌桶（每个模型独立）：每分钟请求数、输入 token 数、输出 token 数
+  （输入按 prompt 长度估算；输出按该模型近期实际输出量预扣，不超过 max_tokens，
+  record_usage() 时按实际用量多退少补）
+- 公平队列（每个模型独立）：按用户轮转放行，避免某个教练的 7 天并行生成独占额度；
+  某个模型并发已满时不会阻塞其他模型的请求
+
+用户标识通过 rate_limit_user() 上下文设置，未设置时归入同一个默认队列
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
+from utils.logger import logger
+
+# 默认限额（可通过环境变量覆盖，设为 0 表示不限制）
+DEFAULT_MAX_IN_FLIGHT = 16
+DEFAULT_REQUESTS_PER_MINUTE = 1000
+DEFAULT_INPUT_TOKENS_PER_MINUTE = 450000
+DEFAULT_OUTPUT_TOKENS_PER_MINUTE = 90000
+DEFAULT_MAX_QUEUE_WAIT_SECONDS = 30.0
+
+# 输出 token 预扣：没有历史数据时的初始值，之后按实际输出量的指数移动平均更新
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 2048
+OUTPUT_ESTIMATE_SMOOTHING = 0.2
+
+# 粗略估算：CJK 字符（含全角标点）约 1 token/字，其余文本（英文、JSON 结构）约 4 字符/token
+CHARS_PER_TOKEN = 4
+
+_CJK_CHARS = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+DEFAULT_USER = 'anonymous'
+
+_current_user: contextvars.ContextVar[str] = contextvars.ContextVar(
+    'rate_limit_user', default=DEFAULT_USER
+)
+
+
+class RateLimitQueueTimeout(Exception):
+    """排队超时（超过 max_queue_wait 仍未获得额度）"""
+    pass
+
+
+@contextmanager
+def rate_limit_user(user_id: Optional[str]) -> Iterator[None]:
+    """
+    设置当前调用方的用户标识（用于公平队列）
+
+    示例：
+        with rate_limit_user(user_id):
+            claude_client.call_claude(...)
+    """
+    token = _current_user.set(user_id or DEFAULT_USER)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def current_rate_limit_user() -> str:
+    """获取当前上下文中的用户标识"""
+    return _current_user.get()
+
+
+def estimate_input_tokens(api_params: Dict[str, Any]) -> int:
+    """
+    根据请求参数估算输入 token 数
+
+    Args:
+        api_params: messages.create / messages.stream 的参数
+
+    Returns:
+        估算的输入 token 数
+    """
+    payload = {
+        'system': api_params.get('system'),
+        'messages': api_params.get('messages'),
+        'tools': api_params.get('tools'),
+    }
+    text = json.dumps(payload, ensure_ascii=False, default=str)
+    return max(1, estimate_tokens(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """估算一段文本的 token 数（CJK 字符按 1 token/字，其余按 CHARS_PER_TOKEN 字符/token）"""
+    text = text or ''
+    other = len(_CJK_CHARS.sub('', text))
+    return (len(text) - other) + other // CHARS_PER_TOKEN
+
+
+class TokenBucket:
+    """按分钟额度匀速补充的令牌桶（非线程安全，由 ClaudeRateLimiter 加锁）"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """距离可以扣除 amount 个令牌还需等待的秒数（0 表示立即可用）"""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        # 单次请求超过桶容量时，等桶满即可放行
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """退还（amount 为负数时追加扣除）"""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimitTicket:
+    """一次已放行的调用，完成后通过 release() 归还并发额度"""
+
+    def __init__(self, limiter: 'ClaudeRateLimiter', model: str, user: str,
+                 input_tokens: int, output_tokens: int):
+        self.limiter = limiter
+        self.model = model
+        self.user = user
+        self.input_tokens = input_tokens
+        # 预扣的输出 token（放行时由 limiter 按预估值确定）
+        self.output_tokens = output_tokens
+        self.usage: Optional[Dict[str, int]] = None
+        self._released = False
+
+    def record_usage(self, usage: Optional[Dict[str, int]]):
+        """记录实际 token 用量，并立即按实际用量校正令牌桶（多退少补）"""
+        if usage and self.usage is None:
+            self.usage = usage
+            self.limiter._settle(self)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter._release(self)
+
+
+class _ModelState:
+    """单个模型的并发计数、令牌桶和公平队列"""
+
+    def __init__(self, requests_per_minute: int, input_tokens_per_minute: int,
+                 output_tokens_per_minute: int):
+        self.in_flight = 0
+        self.requests = TokenBucket(requests_per_minute)
+        self.input_tokens = TokenBucket(input_tokens_per_minute)
+        self.output_tokens = TokenBucket(output_tokens_per_minute)
+        self.expected_output_tokens = float(DEFAULT_EXPECTED_OUTPUT_TOKENS)
+        # 用户 -> 等待中的请求；字典顺序即轮转顺序
+        self.queues: 'OrderedDict[str, deque]' = OrderedDict()
+
+
+class ClaudeRateLimiter:
+    """
+    进程内 Claude 调用准入控制器
+
+    acquire() 阻塞直到：轮到该用户（在该模型的队列中）、模型并发未满、该模型三个令牌桶均有额度；
+    超过 max_queue_wait 秒则抛出 RateLimitQueueTimeout
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+        input_tokens_per_minute: int = DEFAULT_INPUT_TOKENS_PER_MINUTE,
+        output_tokens_per_minute: int = DEFAULT_OUTPUT_TOKENS_PER_MINUTE,
+        max_queue_wait: float = DEFAULT_MAX_QUEUE_WAIT_SECONDS,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_wait = max_queue_wait
+        self._limits = (requests_per_minute, input_tokens_per_minute, output_tokens_per_minute)
+
+        self._cond = threading.Condition()
+        self._models: Dict[str, _ModelState] = {}
+
+    def acquire(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        user: Optional[str] = None,
+    ) -> RateLimitTicket:
+        """
+        排队等待额度
+
+        Args:
+            model: 模型名称（并发上限、令牌桶和队列均按模型计算）
+            input_tokens: 估算的输入 token 数
+            output_tokens: 输出 token 上限（通常为 max_tokens），
+                实际预扣 min(上限, 该模型近期平均输出量)
+            user: 用户标识（默认取 rate_limit_user() 设置的值）
+
+        Returns:
+            RateLimitTicket，调用完成后必须 release()
+
+        Raises:
+            RateLimitQueueTimeout: 排队超时
+        """
+        ticket = RateLimitTicket(self, model, user or current_rate_limit_user(),
+                                 input_tokens, output_tokens)
+        started_at = time.monotonic()
+        deadline = started_at + self.max_queue_wait
+
+        with self._cond:
+            state = self._state(model)
+            ticket.output_tokens = max(1, min(output_tokens, int(state.expected_output_tokens)))
+            state.queues.setdefault(ticket.user, deque()).append(ticket)
+            try:
+                while True:
+                    wait = self._admission_wait(state, ticket) if self._is_next(state, ticket) else None
+                    if wait == 0:
+                        self._admit(state, ticket)
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitQueueTimeout(
+                            f'排队 {self.max_queue_wait:.0f}s 仍未获得额度 (model={model}, user={ticket.user})'
+                        )
+                    self._cond.wait(min(wait, remaining) if wait else remaining)
+            except BaseException:
+                self._dequeue(state, ticket)
+                self._cond.notify_all()
+                raise
+
+        waited = time.monotonic() - started_at
+        if waited > 1.0:
+            logger.info(f'⏳ [RateLimit] 用户 {ticket.user} 排队 {waited:.1f}s 后放行 (model={model})')
+        return ticket
+
+    # ==================== 内部实现（除 _settle / _release 外，调用方需持有 self._cond） ====================
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState(*self._limits)
+        return state
+
+    @staticmethod
+    def _is_next(state: _ModelState, ticket: RateLimitTicket) -> bool:
+        """是否轮到该请求：该模型队首用户的第一个请求"""
+        first_user = next(iter(state.queues))
+        return first_user == ticket.user and state.queues[first_user][0] is ticket
+
+    def _admission_wait(self, state: _ModelState, ticket: RateLimitTicket) -> Optional[float]:
+        """
+        返回需要等待的秒数：0 表示可立即放行，
+        None 表示需等待其他请求 release（并发已满）
+        """
+        if self.max_in_flight > 0 and state.in_flight >= self.max_in_flight:
+            return None
+        return max(
+            state.requests.wait_time(1),
+            state.input_tokens.wait_time(ticket.input_tokens),
+            state.output_tokens.wait_time(ticket.output_tokens),
+        )
+
+    def _admit(self, state: _ModelState, ticket: RateLimitTicket):
+        self._dequeue(state, ticket)
+        state.requests.consume(1)
+        state.input_tokens.consume(ticket.input_tokens)
+        state.output_tokens.consume(ticket.output_tokens)
+        state.in_flight += 1
+        self._cond.notify_all()
+
+    @staticmethod
+    def _dequeue(state: _ModelState, ticket: RateLimitTicket):
+        """移出队列；该用户还有等待请求时轮转到队尾"""
+        queue = state.queues.get(ticket.user)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if queue:
+            state.queues.move_to_end(ticket.user)
+        else:
+            del state.queues[ticket.user]
+
+    def _settle(self, ticket: RateLimitTicket):
+        """按实际用量校正预扣额度（缓存读取不计入输入额度），并更新输出量预估"""
+        usage = ticket.usage
+        actual_input = usage.get('input_tokens', 0) + usage.get('cache_creation_input_tokens', 0)
+        actual_output = usage.get('output_tokens', 0)
+
+        with self._cond:
+            state = self._state(ticket.model)
+            state.input_tokens.refund(ticket.input_tokens - actual_input)
+            state.output_tokens.refund(ticket.output_tokens - actual_output)
+            state.expected_output_tokens += OUTPUT_ESTIMATE_SMOOTHING * (
+                actual_output - state.expected_output_tokens
+            )
+            self._cond.notify_all()
+
+    def _release(self, ticket: RateLimitTicket):
+        with self._cond:
+            self._state(ticket.model).in_flight -= 1
+            self._cond.notify_all()
+
+
+# 全局单例
+_rate_limiter: Optional[ClaudeRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> ClaudeRateLimiter:
+    """获取进程级准入控制器单例（限额读取自环境变量）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = ClaudeRateLimiter(
+                max_in_flight=int(os.environ.get('ANTHROPIC_MAX_IN_FLIGHT', DEFAULT_MAX_IN_FLIGHT)),
+                requests_per_minute=int(os.environ.get('ANTHROPIC_RPM', DEFAULT_REQUESTS_PER_MINUTE)),
+                input_tokens_per_minute=int(
+                    os.environ.get('ANTHROPIC_INPUT_TPM', DEFAULT_INPUT_TOKENS_PER_MINUTE)
+                ),
+                output_tokens_per_minute=int(
+                    os.environ.get('ANTHROPIC_OUTPUT_TPM', DEFAULT_OUTPUT_TOKENS_PER_MINUTE)
+                ),
+                max_queue_wait=float(
+                    os.environ.get('ANTHROPIC_MAX_QUEUE_WAIT', DEFAULT_MAX_QUEUE_WAIT_SECONDS)
+                ),
+            )
+        return _rate_limiter
@@ -5,19 +5,36 @@ AI 流式生成模块
 每次生成一天，通过 Tool Use 保证数据格式
 """
 
-from typing import Dict, Any, Generator, Optional, List
+from typing import Dict, Any, Generator, Optional, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+import copy
+import contextvars
 import json
+import threading
 import time
 
 from .claude_client import get_claude_client
 
 # 单天生成最大重试次数
 MAX_DAY_RETRIES = 2
+# 并行生成模式下同时进行的最大天数（受 Claude API 并发限制约束）
+MAX_PARALLEL_DAY_WORKERS = 4
 from .tools import get_single_day_tool, get_plan_edit_tool, get_diet_plan_edit_tool
-from .training_plan.prompts import build_single_day_prompt, get_system_prompt, build_edit_conversation_prompt
+from .training_plan.prompts import (
+    build_single_day_prompt,
+    build_split_plan,
+    build_exercise_library_context,
+    get_system_prompt,
+    build_edit_conversation_prompt,
+)
 from .diet_plan.prompts import build_edit_diet_plan_prompt
+from .json_stream_parser import JsonArrayStreamParser
 from .memory_manager import MemoryManager
+from exercise_library.template_index import TemplateIndex
+from exercise_library.template_cache import get_coach_templates
 from utils.logger import logger
+from utils.param_parser import parse_bool_param
 
 
 
@@ -43,6 +60,7 @@ def stream_generate_training_plan(params: Dict[str, Any]) -> Generator[Dict[str,
             - equipment: 可用设备列表
             - notes: 补充说明（可选）
             - exercise_templates: 动作库模板列表（可选）
+            - parallel: 是否并行生成各训练日（可选，默认 False）
     
     Yields:
         dict: 流式事件
@@ -67,210 +85,118 @@ def stream_generate_training_plan(params: Dict[str, Any]) -> Generator[Dict[str,
         # 获取单天工具定义
         tool = get_single_day_tool()
         logger.info(f'✅ [Stream] Tool 定义获取成功: {tool.get("function", {}).get("name")}')
+
+        # 并行模式：先规划分化，再同时生成所有天
+        if parse_bool_param(params.get('parallel'), False):
+            yield from _stream_generate_days_parallel(params, claude_client, tool)
+            return
         
+        # 动作库作为可缓存上下文单独发送（逐天生成时每天复用同一缓存前缀）
+        library_context = build_exercise_library_context(params.get('exercise_templates')) or None
+
         # 用于存储已生成的训练日（供后续天数参考）
         previous_days = []
         
         # 逐天生成
         for day_num in range(1, days_count + 1):
-            # 单天重试逻辑
-            retry_count = 0
-            day_success = False
-            last_error = None
-            tool_input = None
+            logger.info(f'📝 [Stream Day {day_num}] ===== 开始生成第 {day_num}/{days_count} 天 =====')
 
-            while retry_count <= MAX_DAY_RETRIES and not day_success:
-                try:
-                    if retry_count > 0:
-                        # 重试时发送通知
-                        logger.warning(f'🔄 [Stream Day {day_num}] 重试 {retry_count}/{MAX_DAY_RETRIES}')
+            # 发送思考事件
+            yield {
+                'type': 'thinking',
+                'day': day_num,
+                'content': f'正在规划第 {day_num} 天训练...'
+            }
+
+            # 构建当天的 Prompt
+            system_prompt = get_system_prompt(language)
+            user_prompt = build_single_day_prompt(
+                day=day_num,
+                params=params,
+                previous_days=previous_days,
+                exercise_templates=params.get('exercise_templates'),
+                exercise_library_in_context=library_context is not None
+            )
+
+            logger.info(f'📝 [Stream Day {day_num}] System Prompt 长度: {len(system_prompt)} 字符')
+            logger.info(f'📝 [Stream Day {day_num}] User Prompt 长度: {len(user_prompt)} 字符')
+            logger.debug(f'📝 [Stream Day {day_num}] User Prompt 前200字符: {user_prompt[:200]}...')
+
+            # 发送开始事件
+            yield {
+                'type': 'day_start',
+                'day': day_num
+            }
+
+            # 调用流式 API（带重试），动作 JSON 一闭合就立即推送
+            streamed_exercises = []
+            tool_input = None
+            try:
+                for day_event in _generate_day_with_retries(
+                    claude_client, system_prompt, user_prompt, tool, day_num,
+                    cached_context=library_context
+                ):
+                    if day_event['type'] == 'retry':
+                        # 重试时通知客户端，并重新开始当天（上次推送的动作作废）
                         yield {
                             'type': 'thinking',
                             'day': day_num,
                             'content': f'正在重试第 {day_num} 天训练生成...'
                         }
-                        # 指数退避延迟
-                        delay = 2 ** retry_count
-                        logger.info(f'⏱️ [Stream Day {day_num}] 等待 {delay} 秒后重试')
-                        time.sleep(delay)
-
-                    logger.info(f'📝 [Stream Day {day_num}] ===== 开始生成第 {day_num}/{days_count} 天 =====')
-
-                    # 发送思考事件
-                    yield {
-                        'type': 'thinking',
-                        'day': day_num,
-                        'content': f'正在规划第 {day_num} 天训练...'
-                    }
-
-                    # 构建当天的 Prompt
-                    system_prompt = get_system_prompt(language)
-                    user_prompt = build_single_day_prompt(
-                        day=day_num,
-                        params=params,
-                        previous_days=previous_days,
-                        exercise_templates=params.get('exercise_templates')
-                    )
-
-                    logger.info(f'📝 [Stream Day {day_num}] System Prompt 长度: {len(system_prompt)} 字符')
-                    logger.info(f'📝 [Stream Day {day_num}] User Prompt 长度: {len(user_prompt)} 字符')
-                    logger.debug(f'📝 [Stream Day {day_num}] User Prompt 前200字符: {user_prompt[:200]}...')
-
-                    # 发送开始事件
-                    yield {
-                        'type': 'day_start',
-                        'day': day_num
-                    }
-
-                    # 调用流式 API
-                    logger.info(f'🔄 [Stream Day {day_num}] 开始调用 Claude Streaming API')
-                    tool_input = None
-                    event_count = 0
-
-                    for event in claude_client.call_claude_streaming(
-                        system_prompt=system_prompt,
-                        user_prompt=user_prompt,
-                        tools=[tool]
-                    ):
-                        event_count += 1
-                        event_type = event.get('type')
-                        logger.debug(f'📨 [Stream Day {day_num}] Event #{event_count}: type={event_type}')
-
-                        if event_type == 'tool_start':
-                            tool_name = event.get('tool_name', 'unknown')
-                            logger.info(f'🔧 [Stream Day {day_num}] Tool 调用开始: {tool_name}')
-
-                        elif event_type == 'tool_delta':
-                            # 可选：传递部分 JSON（目前不需要）
-                            logger.debug(f'📨 [Stream Day {day_num}] Tool delta 事件')
-                            pass
-
-                        elif event_type == 'tool_complete':
-                            tool_input = event.get('tool_input')
-                            logger.info(f'✅ [Stream Day {day_num}] Tool 调用完成')
-                            logger.info(f'📦 [Stream Day {day_num}] Tool Input 类型: {type(tool_input)}')
-
-                            # 详细记录 tool_input 的内容
-                            if isinstance(tool_input, dict):
-                                logger.info(f'📦 [Stream Day {day_num}] Tool Input Keys: {list(tool_input.keys())}')
-                                logger.debug(f'📦 [Stream Day {day_num}] Tool Input 完整内容: {json.dumps(tool_input, ensure_ascii=False, indent=2)}')
-                            else:
-                                logger.error(f'❌ [Stream Day {day_num}] Tool Input 不是字典类型！实际类型: {type(tool_input)}, 值: {tool_input}')
-                                raise TypeError(f'Tool Input 应该是字典类型，但得到了 {type(tool_input)}')
-
-                            break
-
-                        elif event_type == 'error':
-                            error_msg = event.get('error', '未知错误')
-                            logger.error(f'❌ [Stream Day {day_num}] Claude API 返回错误: {error_msg}')
-                            raise Exception(error_msg)
-
-                    logger.info(f'📊 [Stream Day {day_num}] 共收到 {event_count} 个事件')
-
-                    # 验证 tool_input
-                    if not tool_input:
-                        raise Exception('未获取到 tool_input')
-
-                    # 成功标记
-                    day_success = True
-
-                except Exception as e:
-                    last_error = e
-                    retry_count += 1
-                    logger.error(f'❌ [Stream Day {day_num}] 生成失败 (尝试 {retry_count}/{MAX_DAY_RETRIES + 1}): {str(e)}')
-
-                    if retry_count > MAX_DAY_RETRIES:
-                        # 重试耗尽
-                        logger.error(f'❌ [Stream Day {day_num}] 重试次数耗尽，放弃生成')
                         yield {
-                            'type': 'error',
-                            'day': day_num,
-                            'error': f'第 {day_num} 天生成失败（已重试 {MAX_DAY_RETRIES} 次）: {str(last_error)}'
+                            'type': 'day_start',
+                            'day': day_num
                         }
-                        return
-
-            # 如果没有成功且没有抛出异常（不应该发生）
-            if not day_success or not tool_input:
+                        streamed_exercises = []
+                    elif day_event['type'] == 'exercise':
+                        exercise = day_event['data']
+                        streamed_exercises.append(exercise)
+                        yield from _exercise_events(day_num, len(streamed_exercises), exercise)
+                    elif day_event['type'] == 'tool_complete':
+                        tool_input = day_event['tool_input']
+            except Exception as e:
+                logger.error(f'❌ [Stream Day {day_num}] 重试次数耗尽，放弃生成')
                 yield {
                     'type': 'error',
                     'day': day_num,
-                    'error': f'第 {day_num} 天生成失败: 未获取到数据'
+                    'error': f'第 {day_num} 天生成失败（已重试 {MAX_DAY_RETRIES} 次）: {str(e)}'
                 }
                 return
 
-            # 验证必要字段
-            day_name = tool_input.get('name')  # Tool 返回的是 'name' 不是 'day_name'
-            exercises = tool_input.get('exercises')
-
-            logger.info(f'🔍 [Stream Day {day_num}] name: {day_name}')
-            logger.info(f'🔍 [Stream Day {day_num}] exercises 数量: {len(exercises) if exercises else 0}')
-
-            if not day_name:
-                logger.error(f'❌ [Stream Day {day_num}] 缺少 name 字段')
+            if not tool_input:
                 yield {
                     'type': 'error',
                     'day': day_num,
-                    'error': f'第 {day_num} 天数据不完整: 缺少训练名称'
+                    'error': f'第 {day_num} 天生成失败: 未获取到数据'
                 }
                 return
 
-            if not exercises or not isinstance(exercises, list):
-                logger.error(f'❌ [Stream Day {day_num}] exercises 字段无效: {type(exercises)}')
+            # 验证必要字段并构建训练日数据
+            day_data, error_msg = _build_day_data(day_num, tool_input, params)
+            if error_msg:
                 yield {
                     'type': 'error',
                     'day': day_num,
-                    'error': f'第 {day_num} 天数据不完整: 动作列表无效'
+                    'error': error_msg
                 }
                 return
 
-            # 逐个 yield 动作事件（动作级别流式生成）
-            logger.info(f'📝 [Stream Day {day_num}] 开始逐个发送 {len(exercises)} 个动作')
-
-            for idx, exercise in enumerate(exercises):
-                exercise_name = exercise.get('name', '未知动作')
-
-                # 发送动作开始事件
+            # 已增量推送的动作与最终结果不一致时，重新开始当天并完整推送
+            streamed_count = len(streamed_exercises)
+            if streamed_exercises != day_data['exercises'][:streamed_count]:
+                logger.warning(f'⚠️ [Stream Day {day_num}] 增量动作与最终结果不一致，重新推送')
                 yield {
-                    'type': 'exercise_start',
-                    'day': day_num,
-                    'exercise_index': idx + 1,
-                    'exercise_name': exercise_name,
-                    'total_exercises': len(exercises)
+                    'type': 'day_start',
+                    'day': day_num
                 }
-                logger.debug(f'🏋️ [Stream Day {day_num}] 动作 {idx + 1}/{len(exercises)}: {exercise_name}')
+                streamed_count = 0
 
-                # 发送动作完成事件
-                yield {
-                    'type': 'exercise_complete',
-                    'day': day_num,
-                    'exercise_index': idx + 1,
-                    'data': exercise  # 单个动作数据
-                }
-                logger.debug(f'✅ [Stream Day {day_num}] 动作 {idx + 1} 完成: {exercise_name}')
-
-            logger.info(f'✅ [Stream Day {day_num}] 所有 {len(exercises)} 个动作已发送')
-
-            # 构建训练日数据
-            day_data = {
-                'day': day_num,
-                'name': day_name,  # 使用 Tool 返回的 name
-                'duration': tool_input.get('duration_minutes', params.get('duration_minutes', 60)),
-                'exercises': exercises,
-                'notes': [tool_input.get('note', '')] if tool_input.get('note') else []  # note 转为 notes 数组
-            }
-
-            logger.info(f'✅ [Stream Day {day_num}] 训练日数据构建完成: {day_name}, {len(exercises)} 个动作')
+            # 发送剩余动作事件，并发送训练日完成事件
+            yield from _yield_day_events(day_num, day_data, start_index=streamed_count)
 
-            # 保存到已完成列表
+            # 保存到已完成列表（供后续天数参考）
             previous_days.append(day_data)
 
-            # 发送训练日完成事件
-            yield {
-                'type': 'day_complete',
-                'day': day_num,
-                'data': day_data
-            }
-
             logger.info(f'🎉 [Stream Day {day_num}] ===== 第 {day_num} 天生成完成 =====')
         
         # 全部完成
@@ -288,6 +214,383 @@ def stream_generate_training_plan(params: Dict[str, Any]) -> Generator[Dict[str,
         }
 
 
+def _stream_generate_days_parallel(
+    params: Dict[str, Any],
+    claude_client,
+    tool: Dict[str, Any]
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    并行生成所有训练日
+
+    先规划整周分化（每天的训练重点），再通过有界线程池同时生成各天，
+    哪天先完成就先推送哪天的 day_start / exercise_* / day_complete 事件
+
+    Args:
+        params: 训练计划参数
+        claude_client: Claude 客户端
+        tool: 单天工具定义
+
+    Yields:
+        dict: 与逐天生成相同的流式事件，均带 day 字段
+    """
+    days_count = params.get('days_per_week', 3)
+    language = params.get('language', '中文')
+
+    # 1. 规划分化
+    split_plan = build_split_plan(params)
+    logger.info(f'🗺️ [Stream Parallel] 分化规划: {json.dumps(split_plan, ensure_ascii=False)}')
+
+    for item in split_plan:
+        yield {
+            'type': 'thinking',
+            'day': item['day'],
+            'content': f'正在规划第 {item["day"]} 天训练（{item["focus"]}）...'
+        }
+
+    # 2. 并行生成
+    max_workers = max(1, min(MAX_PARALLEL_DAY_WORKERS, days_count))
+    logger.info(f'🔀 [Stream Parallel] 并行生成 {days_count} 天，worker 数: {max_workers}')
+
+    system_prompt = get_system_prompt(language)
+    library_context = build_exercise_library_context(params.get('exercise_templates')) or None
+    completed_days = []
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='plan-day')
+    # 出错或客户端断开时通知进行中的天停止（关闭流式请求，不再继续计费）
+    cancel_event = threading.Event()
+
+    try:
+        futures = {}
+        for item in split_plan:
+            day_num = item['day']
+            user_prompt = build_single_day_prompt(
+                day=day_num,
+                params=params,
+                exercise_templates=params.get('exercise_templates'),
+                split_plan=split_plan,
+                exercise_library_in_context=library_context is not None
+            )
+            # 复制上下文，worker 线程沿用调用方的限流用户标识
+            future = executor.submit(
+                contextvars.copy_context().run,
+                _collect_day_tool_input,
+                claude_client, system_prompt, user_prompt, tool, day_num, library_context, cancel_event
+            )
+            futures[future] = day_num
+
+        # 3. 按完成顺序推送
+        for future in as_completed(futures):
+            day_num = futures[future]
+
+            try:
+                tool_input = future.result()
+            except Exception as e:
+                logger.error(f'❌ [Stream Parallel Day {day_num}] 重试次数耗尽，放弃生成')
+                yield {
+                    'type': 'error',
+                    'day': day_num,
+                    'error': f'第 {day_num} 天生成失败（已重试 {MAX_DAY_RETRIES} 次）: {str(e)}'
+                }
+                return
+
+            day_data, error_msg = _build_day_data(day_num, tool_input, params)
+            if error_msg:
+                yield {
+                    'type': 'error',
+                    'day': day_num,
+                    'error': error_msg
+                }
+                return
+
+            yield {
+                'type': 'day_start',
+                'day': day_num
+            }
+            yield from _yield_day_events(day_num, day_data)
+
+            completed_days.append(day_data)
+            logger.info(f'🎉 [Stream Parallel Day {day_num}] 完成 ({len(completed_days)}/{days_count})')
+
+    finally:
+        # 出错或客户端断开时取消尚未开始的天，并中止进行中的天
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(f'🎉 [Stream Parallel] 训练计划生成完成，共 {len(completed_days)} 天')
+    yield {
+        'type': 'complete',
+        'message': f'训练计划生成完成，共 {len(completed_days)} 天'
+    }
+
+
+def _generate_day_with_retries(
+    claude_client,
+    system_prompt: str,
+    user_prompt: str,
+    tool: Dict[str, Any],
+    day_num: int,
+    cached_context: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    生成单天训练（带指数退避重试），逐天和并行模式共用
+
+    cancel_event 被设置后立即停止（关闭进行中的流式请求，不再重试）
+
+    Yields:
+        dict:
+            - {'type': 'retry', 'attempt': n}: 即将重试，此前增量返回的动作作废
+            - {'type': 'exercise', 'data': {...}}: 增量解析出的单个动作
+            - {'type': 'tool_complete', 'tool_input': {...}}: 完整的 tool_input（最后一个事件）
+
+    Raises:
+        Exception: 重试耗尽后抛出最后一次错误
+    """
+    last_error = None
+
+    for retry_count in range(MAX_DAY_RETRIES + 1):
+        if retry_count > 0:
+            delay = 2 ** retry_count
+            logger.warning(f'🔄 [Stream Day {day_num}] 重试 {retry_count}/{MAX_DAY_RETRIES}，等待 {delay} 秒')
+            yield {
+                'type': 'retry',
+                'attempt': retry_count
+            }
+            if cancel_event is None:
+                time.sleep(delay)
+            elif cancel_event.wait(delay):
+                return
+
+        try:
+            with closing(_stream_day_tool_input(
+                claude_client, system_prompt, user_prompt, tool, day_num,
+                cached_context=cached_context, cancel_event=cancel_event
+            )) as day_events:
+                yield from day_events
+            return
+        except Exception as e:
+            last_error = e
+            logger.error(f'❌ [Stream Day {day_num}] 生成失败 (尝试 {retry_count + 1}/{MAX_DAY_RETRIES + 1}): {str(e)}')
+
+    raise last_error
+
+
+def _collect_day_tool_input(
+    claude_client,
+    system_prompt: str,
+    user_prompt: str,
+    tool: Dict[str, Any],
+    day_num: int,
+    cached_context: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    并行模式下在线程池中生成单天，整天完成后才推送（客户端同一时间只展示一个进行中的训练日）
+
+    Returns:
+        tool_input 字典；已取消时返回 None
+    """
+    for day_event in _generate_day_with_retries(
+        claude_client, system_prompt, user_prompt, tool, day_num,
+        cached_context=cached_context, cancel_event=cancel_event
+    ):
+        if day_event['type'] == 'tool_complete':
+            return day_event['tool_input']
+    return None
+
+
+def _stream_day_tool_input(
+    claude_client,
+    system_prompt: str,
+    user_prompt: str,
+    tool: Dict[str, Any],
+    day_num: int,
+    cached_context: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    调用 Claude Streaming API 生成单天训练
+
+    通过 tool_delta 增量解析 exercises 数组，每个动作对象闭合时立即返回
+    cached_context（动作库）作为可缓存前缀单独发送
+    cancel_event 被设置后关闭流式请求并直接结束（不返回 tool_complete）
+
+    Yields:
+        dict:
+            - {'type': 'exercise', 'data': {...}}: 增量解析出的单个动作
+            - {'type': 'tool_complete', 'tool_input': {...}}: 完整的 tool_input（最后一个事件）
+
+    Raises:
+        Exception: API 返回错误或未获取到 tool_input
+    """
+    logger.info(f'🔄 [Stream Day {day_num}] 开始调用 Claude Streaming API')
+    tool_input = None
+    event_count = 0
+    exercise_parser = JsonArrayStreamParser('exercises')
+
+    events = claude_client.call_claude_streaming(
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        tools=[tool],
+        cached_context=cached_context,
+        endpoint='generate_plan_day'
+    )
+    with closing(events):
+        for event in events:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f'🛑 [Stream Day {day_num}] 已取消，关闭流式请求')
+                return
+
+            event_count += 1
+            event_type = event.get('type')
+            logger.debug(f'📨 [Stream Day {day_num}] Event #{event_count}: type={event_type}')
+
+            if event_type == 'tool_start':
+                tool_name = event.get('tool_name', 'unknown')
+                logger.info(f'🔧 [Stream Day {day_num}] Tool 调用开始: {tool_name}')
+
+            elif event_type == 'tool_delta':
+                for exercise in exercise_parser.feed(event.get('partial_json', '')):
+                    logger.debug(f'🏋️ [Stream Day {day_num}] 增量解析到动作 #{exercise_parser.emitted_count}')
+                    yield {
+                        'type': 'exercise',
+                        'data': exercise
+                    }
+
+            elif event_type == 'tool_complete':
+                tool_input = event.get('tool_input')
+                logger.info(f'✅ [Stream Day {day_num}] Tool 调用完成')
+                logger.info(f'📦 [Stream Day {day_num}] Tool Input 类型: {type(tool_input)}')
+
+                # 详细记录 tool_input 的内容
+                if isinstance(tool_input, dict):
+                    logger.info(f'📦 [Stream Day {day_num}] Tool Input Keys: {list(tool_input.keys())}')
+                    logger.debug(f'📦 [Stream Day {day_num}] Tool Input 完整内容: {json.dumps(tool_input, ensure_ascii=False, indent=2)}')
+                else:
+                    logger.error(f'❌ [Stream Day {day_num}] Tool Input 不是字典类型！实际类型: {type(tool_input)}, 值: {tool_input}')
+                    raise TypeError(f'Tool Input 应该是字典类型，但得到了 {type(tool_input)}')
+
+                break
+
+            elif event_type == 'error':
+                error_msg = event.get('error', '未知错误')
+                logger.error(f'❌ [Stream Day {day_num}] Claude API 返回错误: {error_msg}')
+                raise Exception(error_msg)
+
+    logger.info(f'📊 [Stream Day {day_num}] 共收到 {event_count} 个事件，增量解析 {exercise_parser.emitted_count} 个动作')
+
+    # 验证 tool_input
+    if not tool_input:
+        raise Exception('未获取到 tool_input')
+
+    yield {
+        'type': 'tool_complete',
+        'tool_input': tool_input
+    }
+
+
+def _build_day_data(
+    day_num: int,
+    tool_input: Dict[str, Any],
+    params: Dict[str, Any]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    验证 tool_input 并构建训练日数据
+
+    Returns:
+        (day_data, error_msg) 元组，验证失败时 day_data 为 None
+    """
+    day_name = tool_input.get('name')  # Tool 返回的是 'name' 不是 'day_name'
+    exercises = tool_input.get('exercises')
+
+    logger.info(f'🔍 [Stream Day {day_num}] name: {day_name}')
+    logger.info(f'🔍 [Stream Day {day_num}] exercises 数量: {len(exercises) if exercises else 0}')
+
+    if not day_name:
+        logger.error(f'❌ [Stream Day {day_num}] 缺少 name 字段')
+        return None, f'第 {day_num} 天数据不完整: 缺少训练名称'
+
+    if not exercises or not isinstance(exercises, list):
+        logger.error(f'❌ [Stream Day {day_num}] exercises 字段无效: {type(exercises)}')
+        return None, f'第 {day_num} 天数据不完整: 动作列表无效'
+
+    day_data = {
+        'day': day_num,
+        'name': day_name,  # 使用 Tool 返回的 name
+        'duration': tool_input.get('duration_minutes', params.get('duration_minutes', 60)),
+        'exercises': exercises,
+        'notes': [tool_input.get('note', '')] if tool_input.get('note') else []  # note 转为 notes 数组
+    }
+
+    logger.info(f'✅ [Stream Day {day_num}] 训练日数据构建完成: {day_name}, {len(exercises)} 个动作')
+    return day_data, None
+
+
+def _yield_day_events(
+    day_num: int,
+    day_data: Dict[str, Any],
+    start_index: int = 0
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    逐个 yield 动作事件（动作级别流式生成），最后 yield 训练日完成事件
+
+    Args:
+        day_num: 天数
+        day_data: 训练日数据
+        start_index: 从第几个动作开始发送（之前的动作已增量推送）
+    """
+    exercises = day_data['exercises']
+    logger.info(f'📝 [Stream Day {day_num}] 发送第 {start_index + 1}-{len(exercises)} 个动作')
+
+    for idx in range(start_index, len(exercises)):
+        yield from _exercise_events(day_num, idx + 1, exercises[idx], len(exercises))
+
+    logger.info(f'✅ [Stream Day {day_num}] 所有 {len(exercises)} 个动作已发送')
+
+    # 发送训练日完成事件
+    yield {
+        'type': 'day_complete',
+        'day': day_num,
+        'data': day_data
+    }
+
+
+def _exercise_events(
+    day_num: int,
+    exercise_index: int,
+    exercise: Dict[str, Any],
+    total_exercises: Optional[int] = None
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    yield 单个动作的 exercise_start / exercise_complete 事件
+
+    Args:
+        day_num: 天数
+        exercise_index: 动作序号（从1开始）
+        exercise: 动作数据
+        total_exercises: 动作总数（增量推送时尚未知，为 None）
+    """
+    exercise_name = exercise.get('name', '未知动作')
+
+    # 发送动作开始事件
+    yield {
+        'type': 'exercise_start',
+        'day': day_num,
+        'exercise_index': exercise_index,
+        'exercise_name': exercise_name,
+        'total_exercises': total_exercises
+    }
+    logger.debug(f'🏋️ [Stream Day {day_num}] 动作 {exercise_index}: {exercise_name}')
+
+    # 发送动作完成事件
+    yield {
+        'type': 'exercise_complete',
+        'day': day_num,
+        'exercise_index': exercise_index,
+        'data': exercise  # 单个动作数据
+    }
+    logger.debug(f'✅ [Stream Day {day_num}] 动作 {exercise_index} 完成: {exercise_name}')
+
+
 def stream_edit_plan_conversation(
     user_id: str,
     user_message: str,
@@ -305,9 +608,10 @@ def stream_edit_plan_conversation(
     
     Yields:
         dict: 流式事件
-            - type: 'thinking' | 'analysis' | 'suggestion' | 'complete' | 'error'
+            - type: 'thinking' | 'analysis' | 'change' | 'suggestion' | 'complete' | 'error'
             - content: 内容（thinking 和 analysis 时）
-            - data: 数据（suggestion ）
+            - index: change 序号（change 时）
+            - data: 数据（change 时为单个修改，suggestion 时为完整修改列表）
             - error: 错误信息（error 时）
     """
     try:
@@ -317,7 +621,8 @@ def stream_edit_plan_conversation(
 
         # 1. 获取用户 memory
         logger.info('📖 加载用户 Memory')
-        user_memory_context = MemoryManager.build_memory_context(user_id)
+        profile = MemoryManager.get_user_memory(user_id)
+        user_memory_context = profile.build_memory_context()
 
         # 2. 加载教练的动作库
         try:
@@ -328,7 +633,9 @@ def stream_edit_plan_conversation(
             logger.warning(f'⚠️ 加载动作库失败: {e}')
             exercise_templates = []
             coach_id = None
-        profile = MemoryManager.get_user_memory(user_id)
+        # 请求内构建一次动作模板索引（新预分配的模板不会混入本次 Prompt 的动作库）
+        template_index = TemplateIndex(coach_id, list(exercise_templates))
+
         conversation_history = profile.get_recent_conversations(limit=3)
         language = profile.language_preference
         
@@ -343,13 +650,16 @@ def stream_edit_plan_conversation(
         
         # 2. 构建 Prompt
         logger.info('📝 构建编辑对话 Prompt')
+        # 动作库作为可缓存上下文单独发送（同一会话的后续消息可命中缓存）
+        library_context = build_exercise_library_context(exercise_templates, for_edit=True) or None
         system_prompt, user_prompt = build_edit_conversation_prompt(
             user_message=user_message,
             current_plan=current_plan,
             user_memory=user_memory_context,
             conversation_history=conversation_history,
             exercise_templates=exercise_templates,
-            language=language
+            language=language,
+            exercise_library_in_context=library_context is not None
         )
         
         logger.info(f'System Prompt 长度: {len(system_prompt)} 字符')
@@ -367,11 +677,16 @@ def stream_edit_plan_conversation(
         tool_input = None
         text_content = ""
         event_count = 0
+        change_parser = JsonArrayStreamParser('changes')
+        streamed_changes = []  # [(原始 change, 处理后的 change, 验证错误)]
 
         for event in claude_client.call_claude_streaming(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
-            tools=tools
+            tools=tools,
+            cached_context=library_context,
+            endpoint='edit_plan',
+            user_id=user_id
         ):
             event_count += 1
             event_type = event.get('type')
@@ -400,10 +715,22 @@ def stream_edit_plan_conversation(
                     'content': '正在生成修改建议...'
                 }
             
-            # Tool 增量数据（部分 JSON）
+            # Tool 增量数据（部分 JSON）：changes[i] 一闭合就立即推送
             elif event_type == 'tool_delta':
-                # 我们不逐字符发送，等待完整 JSON
-                pass
+                for change in change_parser.feed(event.get('partial_json', '')):
+                    idx = len(streamed_changes)
+                    # 模板注入会修改 after 字段，保留原始副本用于与最终结果比对
+                    raw_change = copy.deepcopy(change)
+                    change_with_id, errors = _prepare_plan_change(
+                        idx, change, coach_id, template_index
+                    )
+                    streamed_changes.append((raw_change, change_with_id, errors))
+                    logger.info(f'📨 [Edit] 增量解析到 Change #{idx}: {change_with_id.get("type")}')
+                    yield {
+                        'type': 'change',
+                        'index': idx,
+                        'data': change_with_id
+                    }
             
             # 文本内容完成（备份机制）
             elif event_type == 'text_complete':
@@ -464,56 +791,19 @@ def stream_edit_plan_conversation(
                     'content': analysis
                 }
 
-                # 为每个 change 添加唯一 ID 并验证必需字段
+                # 为每个 change 添加唯一 ID 并验证必需字段（已增量处理过的直接复用）
                 changes_with_id = []
                 validation_errors = []
 
                 for idx, change in enumerate(changes):
-                    change_with_id = change.copy()
-
-                    # 确保有 id 字段
-                    if 'id' not in change_with_id:
-                        change_with_id['id'] = f'change_{idx}'
-
-                    # 验证必需字段
-                    required_fields = ['type', 'description', 'reason', 'day_index']
-                    missing_fields = [field for field in required_fields if field not in change_with_id]
-
-                    if missing_fields:
-                        error_msg = f'⚠️ Change #{idx} 缺少必需字段: {", ".join(missing_fields)}'
-                        logger.warning(error_msg)
-                        validation_errors.append(error_msg)
-
-                    # 确保 day_index 存在（兼容旧版本）
-                    if 'day_index' not in change_with_id and 'dayIndex' not in change_with_id:
-                        logger.warning(f'⚠️ Change #{idx} 缺少 day_index，设置为 0')
-                        change_with_id['day_index'] = 0
-
-                    # 验证 after 字段（关键字段）
-                    if 'after' not in change_with_id or not change_with_id['after']:
-                        logger.warning(f'⚠️ Change #{idx} 缺少 after 字段，前端可能无法应用此修改')
-                        validation_errors.append(f'Change #{idx} 缺少 after 字段')
-
-                    # 注入 exerciseTemplateId（如果是add_exercise或modify_exercise类型）
-                    if coach_id and exercise_templates:
-                        change_type = change_with_id.get('type', '')
-
-                        if change_type in ['add_exercise', 'modify_exercise']:
-                            exercise_name = _extract_exercise_name_from_change(change_with_id)
-
-                            if exercise_name:
-                                try:
-                                    template_id = _match_or_create_template(
-                                        coach_id,
-                                        exercise_name,
-                                        exercise_templates
-                                    )
-                                    _inject_exercise_template_id(change_with_id, template_id)
-
-                                    logger.info(f'✅ 注入模板ID: {exercise_name} -> {template_id}')
-                                except Exception as e:
-                                    logger.error(f'❌ 注入模板ID失败: {exercise_name}', exc_info=True)
-
+                    if idx < len(streamed_changes) and streamed_changes[idx][0] == change:
+                        _, change_with_id, errors = streamed_changes[idx]
+                    else:
+                        change_with_id, errors = _prepare_plan_change(
+                            idx, change, coach_id, template_index
+                        )
+
+                    validation_errors.extend(errors)
                     changes_with_id.append(change_with_id)
 
                 # 汇总验证结果
@@ -524,6 +814,9 @@ def stream_edit_plan_conversation(
                 else:
                     logger.info('✅ 所有 changes 验证通过')
 
+                # 批量创建本次修改中新出现的动作模板（建议下发前完成写入）
+                _flush_template_index(template_index)
+
                 # 发送修改建议
                 yield {
                     'type': 'suggestion',
@@ -533,6 +826,9 @@ def stream_edit_plan_conversation(
                 }
 
 
+        # 已增量下发但未等到 tool_complete 的修改，同样需要落库其预分配模板
+        _flush_template_index(template_index)
+
         # 检查是否为纯文本响应（没有tool调用）
         logger.info(f'🔍 检查纯文本响应 - tool_input: {tool_input is not None}, text_content长度: {len(text_content)}')
         if not tool_input and text_content:
@@ -587,9 +883,10 @@ def stream_edit_diet_plan_conversation(
 
     Yields:
         dict: 流式事件
-            - type: 'thinking' | 'analysis' | 'suggestion' | 'complete' | 'error'
+            - type: 'thinking' | 'analysis' | 'change' | 'suggestion' | 'complete' | 'error'
             - content: 内容（thinking 和 analysis 时）
-            - data: 数据（suggestion 时）
+            - index: change 序号（change 时）
+            - data: 数据（change 时为单个修改，suggestion 时为完整修改列表）
             - error: 错误信息（error 时）
     """
     try:
@@ -598,8 +895,8 @@ def stream_edit_diet_plan_conversation(
 
         # 1. 获取用户 memory
         logger.info('📖 加载用户 Memory')
-        user_memory_context = MemoryManager.build_memory_context(user_id)
         profile = MemoryManager.get_user_memory(user_id)
+        user_memory_context = profile.build_memory_context()
         conversation_history = profile.get_recent_conversations(limit=3)
         language = profile.language_preference
 
@@ -634,11 +931,15 @@ def stream_edit_diet_plan_conversation(
         tool_input = None
         text_content = ""
         event_count = 0
+        change_parser = JsonArrayStreamParser('changes')
+        streamed_changes = []  # [(原始 change, 处理后的 change, 验证错误)]
 
         for event in claude_client.call_claude_streaming(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
-            tools=tools
+            tools=tools,
+            endpoint='edit_diet_plan',
+            user_id=user_id
         ):
             event_count += 1
             event_type = event.get('type')
@@ -666,10 +967,18 @@ def stream_edit_diet_plan_conversation(
                     'content': '正在生成修改建议...'
                 }
 
-            # Tool 增量数据（部分 JSON）
+            # Tool 增量数据（部分 JSON）：changes[i] 一闭合就立即推送
             elif event_type == 'tool_delta':
-                # 我们不逐字符发送，等待完整 JSON
-                pass
+                for change in change_parser.feed(event.get('partial_json', '')):
+                    idx = len(streamed_changes)
+                    change_with_id, errors = _prepare_diet_plan_change(idx, change)
+                    streamed_changes.append((change, change_with_id, errors))
+                    logger.info(f'📨 [Edit Diet] 增量解析到 Change #{idx}: {change_with_id.get("type")}')
+                    yield {
+                        'type': 'change',
+                        'index': idx,
+                        'data': change_with_id
+                    }
 
             # 文本内容完成（备份机制）
             elif event_type == 'text_complete':
@@ -731,36 +1040,17 @@ def stream_edit_diet_plan_conversation(
                     'content': analysis
                 }
 
-                # 为每个 change 添加唯一 ID 并验证必需字段
+                # 为每个 change 添加唯一 ID 并验证必需字段（已增量处理过的直接复用）
                 changes_with_id = []
                 validation_errors = []
 
                 for idx, change in enumerate(changes):
-                    change_with_id = change.copy()
-
-                    # 确保有 id 字段
-                    if 'id' not in change_with_id:
-                        change_with_id['id'] = f'change_{idx}'
-
-                    # 验证必需字段
-                    required_fields = ['type', 'target', 'description', 'reason', 'day_index', 'id']
-                    missing_fields = [field for field in required_fields if field not in change_with_id]
-
-                    if missing_fields:
-                        error_msg = f'⚠️ Change #{idx} 缺少必需字段: {", ".join(missing_fields)}'
-                        logger.warning(error_msg)
-                        validation_errors.append(error_msg)
-
-                    # 确保 day_index 存在（兼容旧版本）
-                    if 'day_index' not in change_with_id and 'dayIndex' not in change_with_id:
-                        logger.warning(f'⚠️ Change #{idx} 缺少 day_index，设置为 0')
-                        change_with_id['day_index'] = 0
-
-                    # 验证 after 字段（关键字段）
-                    if 'after' not in change_with_id or not change_with_id['after']:
-                        logger.warning(f'⚠️ Change #{idx} 缺少 after 字段，前端可能无法应用此修改')
-                        validation_errors.append(f'Change #{idx} 缺少 after 字段')
+                    if idx < len(streamed_changes) and streamed_changes[idx][0] == change:
+                        _, change_with_id, errors = streamed_changes[idx]
+                    else:
+                        change_with_id, errors = _prepare_diet_plan_change(idx, change)
 
+                    validation_errors.extend(errors)
                     changes_with_id.append(change_with_id)
 
                 # 汇总验证结果
@@ -899,7 +1189,9 @@ def stream_generate_supplement_plan_conversation(
         for event in claude_client.call_claude_streaming(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
-            tools=tools
+            tools=tools,
+            endpoint='supplement_plan',
+            user_id=user_id
         ):
             event_count += 1
             event_type = event.get('type')
@@ -1031,58 +1323,117 @@ def _get_coach_id_from_plan(plan_id: str) -> str:
 
 
 def _fetch_coach_exercise_templates(coach_id: str) -> list:
-    """获取教练的动作库"""
-    from firebase_admin import firestore
-    db = firestore.client()
+    """获取教练的动作库（动作库版本未变化时复用实例缓存）"""
+    return get_coach_templates(coach_id)
 
-    templates_ref = db.collection('exerciseTemplates').where('ownerId', '==', coach_id)
-    templates_docs = templates_ref.stream()
 
-    templates = []
-    for doc in templates_docs:
-        data = doc.to_dict()
-        templates.append({
-            'id': doc.id,
-            'name': data.get('name', ''),
-            'tags': data.get('tags', [])
-        })
+def _flush_template_index(template_index: TemplateIndex):
+    """批量创建预分配的动作模板（失败只记录日志，不中断对话）"""
+    try:
+        created = template_index.flush()
+        if created:
+            logger.info(f'✅ 批量创建新模板: {len(created)} 个')
+    except Exception:
+        logger.error('❌ 批量创建动作模板失败', exc_info=True)
+
+
+def _prepare_plan_change(
+    idx: int,
+    change: Dict[str, Any],
+    coach_id: Optional[str],
+    template_index: Optional[TemplateIndex]
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    为训练计划 change 添加 ID、验证必需字段并注入 exerciseTemplateId
 
-    return templates
+    Args:
+        idx: change 序号
+        change: AI 返回的原始 change
+        coach_id: 教练ID（为空时跳过模板注入）
+        template_index: 教练动作模板索引（未匹配的动作预分配模板 ID，由调用方 flush）
 
+    Returns:
+        (change_with_id, validation_errors) 元组
+    """
+    change_with_id = change.copy()
+    validation_errors = []
 
-def _match_or_create_template(coach_id: str, exercise_name: str, existing_templates: list) -> str:
-    """匹配动作库或快捷创建新模板"""
-    from firebase_admin import firestore
+    # 确保有 id 字段
+    if 'id' not in change_with_id:
+        change_with_id['id'] = f'change_{idx}'
 
-    # 1. 精确匹配
-    for template in existing_templates:
-        if template['name'] == exercise_name:
-            logger.info(f'✅ 匹配到动作模板: {exercise_name} -> {template["id"]}')
-            return template['id']
+    # 验证必需字段
+    required_fields = ['type', 'description', 'reason', 'day_index']
+    missing_fields = [field for field in required_fields if field not in change_with_id]
 
-    # 2. 模糊匹配（忽略大小写、前后空格）
-    normalized_name = exercise_name.strip().lower()
-    for template in existing_templates:
-        if template['name'].strip().lower() == normalized_name:
-            logger.info(f'✅ 模糊匹配到动作模板: {exercise_name} -> {template["id"]}')
-            return template['id']
+    if missing_fields:
+        error_msg = f'⚠️ Change #{idx} 缺少必需字段: {", ".join(missing_fields)}'
+        logger.warning(error_msg)
+        validation_errors.append(error_msg)
 
-    # 3. 快捷创建新模板
-    logger.info(f'⚠️ 动作「{exercise_name}」不在库中，创建新模板')
+    # 确保 day_index 存在（兼容旧版本）
+    if 'day_index' not in change_with_id and 'dayIndex' not in change_with_id:
+        logger.warning(f'⚠️ Change #{idx} 缺少 day_index，设置为 0')
+        change_with_id['day_index'] = 0
 
-    db = firestore.client()
-    new_template_ref = db.collection('exerciseTemplates').document()
-
-    new_template_ref.set({
-        'name': exercise_name,
-        'tags': [],  # 默认空标签
-        'ownerId': coach_id,
-        'createdAt': firestore.SERVER_TIMESTAMP,
-        'updatedAt': firestore.SERVER_TIMESTAMP,
-    })
-
-    logger.info(f'✅ 创建新模板: {exercise_name} -> {new_template_ref.id}')
-    return new_template_ref.id
+    # 验证 after 字段（关键字段）
+    if 'after' not in change_with_id or not change_with_id['after']:
+        logger.warning(f'⚠️ Change #{idx} 缺少 after 字段，前端可能无法应用此修改')
+        validation_errors.append(f'Change #{idx} 缺少 after 字段')
+
+    # 注入 exerciseTemplateId（如果是add_exercise或modify_exercise类型）
+    if coach_id and template_index:
+        change_type = change_with_id.get('type', '')
+
+        if change_type in ['add_exercise', 'modify_exercise']:
+            exercise_name = _extract_exercise_name_from_change(change_with_id)
+
+            if exercise_name:
+                try:
+                    template_id = template_index.resolve(exercise_name)
+                    _inject_exercise_template_id(change_with_id, template_id)
+
+                    logger.info(f'✅ 注入模板ID: {exercise_name} -> {template_id}')
+                except Exception as e:
+                    logger.error(f'❌ 注入模板ID失败: {exercise_name}', exc_info=True)
+
+    return change_with_id, validation_errors
+
+
+def _prepare_diet_plan_change(idx: int, change: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    为饮食计划 change 添加 ID 并验证必需字段
+
+    Returns:
+        (change_with_id, validation_errors) 元组
+    """
+    change_with_id = change.copy()
+    validation_errors = []
+
+    # 确保有 id 字段
+    if 'id' not in change_with_id:
+        change_with_id['id'] = f'change_{idx}'
+
+    # 验证必需字段
+    required_fields = ['type', 'target', 'description', 'reason', 'day_index', 'id']
+    missing_fields = [field for field in required_fields if field not in change_with_id]
+
+    if missing_fields:
+        error_msg = f'⚠️ Change #{idx} 缺少必需字段: {", ".join(missing_fields)}'
+        logger.warning(error_msg)
+        validation_errors.append(error_msg)
+
+    # 确保 day_index 存在（兼容旧版本）
+    if 'day_index' not in change_with_id and 'dayIndex' not in change_with_id:
+        logger.warning(f'⚠️ Change #{idx} 缺少 day_index，设置为 0')
+        change_with_id['day_index'] = 0
+
+    # 验证 after 字段（关键字段）
+    if 'after' not in change_with_id or not change_with_id['after']:
+        logger.warning(f'⚠️ Change #{idx} 缺少 after 字段，前端可能无法应用此修改')
+        validation_errors.append(f'Change #{idx} 缺少 after 字段')
+
+    return change_with_id, validation_errors
 
 
 def _extract_exercise_name_from_change(change: dict) -> str:
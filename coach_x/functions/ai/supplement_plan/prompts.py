@@ -6,6 +6,9 @@
 
 from typing import Dict, Any, Optional, List, Tuple
 
+from plans.models import DietPlan
+from plans.digest import calculate_average_macros
+
 
 def get_system_prompt(language: str = '中文') -> str:
     """
@@ -236,37 +239,12 @@ def _summarize_diet_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         饮食计划摘要字典
     """
-    days = plan.get('days', [])
-
-    # 估算平均营养摄入（基于第一天）
-    if days:
-        first_day = days[0]
-        meals = first_day.get('meals', [])
-
-        # 简单估算（实际需要累加所有food items的macros）
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        total_calories = 0
-
-        for meal in meals:
-            items = meal.get('items', [])
-            for item in items:
-                macros = item.get('macros', {})
-                total_protein += macros.get('protein', 0)
-                total_carbs += macros.get('carbs', 0)
-                total_fat += macros.get('fat', 0)
-                total_calories += macros.get('calories', 0)
-
-        avg_protein = int(total_protein)
-        avg_carbs = int(total_carbs)
-        avg_fat = int(total_fat)
-        avg_calories = int(total_calories)
-    else:
-        avg_protein = 0
-        avg_carbs = 0
-        avg_fat = 0
-        avg_calories = 0
+    # 日均营养摄入（所有饮食日平均）
+    average = calculate_average_macros(DietPlan.from_dict(plan))
+    avg_protein = int(average.protein)
+    avg_carbs = int(average.carbs)
+    avg_fat = int(average.fat)
+    avg_calories = int(average.calories)
 
     # 判断营养目标
     if avg_calories > 2800:
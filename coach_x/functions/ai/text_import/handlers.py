@@ -96,6 +96,8 @@ def _import_from_text(
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             response_format="json",
+            endpoint="text_import",
+            user_id=user_id,
         )
 
         if not response.get("success"):
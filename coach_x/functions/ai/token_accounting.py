@@ -0,0 +1,198 @@
+"""
+Claude 调用 token 记账与输入预算
+
+预检（请求发出前）：
+- 复用 rate_limiter.estimate_input_tokens 在本地估算输入 token
+- 超出输入预算时逐级裁剪：客户端丢弃最早的历史轮次，
+  Prompt 构建方通过 fit_to_budget() 减少动作库条目等可伸缩内容
+- 裁剪后仍超出预算时照常发送，但记录告警和 over_budget 计数
+
+记账（请求完成后）：
+- 记录实际 input / output / cache_creation / cache_read token，按 用户 / 接口 / 模型 汇总
+- 实例内保存累计值（get_token_ledger().snapshot()）
+- 同时按天累加到 Firestore aiUsage/{userId}_{YYYYMMDD}（后台线程写入，不阻塞响应）：
+
+    {
+        'userId': str,
+        'date': 'YYYY-MM-DD',
+        'calls': int,
+        'input_tokens': int, 'output_tokens': int,
+        'cache_creation_input_tokens': int, 'cache_read_input_tokens': int,
+        'endpoints': {endpoint: {同上计数}},
+        'models': {model: {同上计数}},
+        'updatedAt': SERVER_TIMESTAMP
+    }
+"""
+
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, Dict, Callable, Sequence, Tuple
+
+from utils.logger import logger
+from .rate_limiter import estimate_tokens
+
+# 单次调用的输入 token 预算（可通过环境变量覆盖，设为 0 表示不限制）
+DEFAULT_MAX_INPUT_TOKENS = 60000
+
+USAGE_COLLECTION = 'aiUsage'
+
+# 记账的用量字段（与 _extract_usage 返回的键一致）
+USAGE_FIELDS = (
+    'input_tokens',
+    'output_tokens',
+    'cache_creation_input_tokens',
+    'cache_read_input_tokens',
+)
+
+_persist_executor: Optional[ThreadPoolExecutor] = None
+_persist_executor_lock = threading.Lock()
+
+
+def get_input_token_budget() -> int:
+    """单次调用的输入 token 预算（0 表示不限制）"""
+    return int(os.environ.get('ANTHROPIC_MAX_INPUT_TOKENS', DEFAULT_MAX_INPUT_TOKENS))
+
+
+def estimate_text_tokens(*texts: Optional[str]) -> int:
+    """估算若干段文本的 token 数（与 estimate_input_tokens 使用相同的估算方式）"""
+    return sum(estimate_tokens(text) for text in texts)
+
+
+def fit_to_budget(
+    render: Callable[[int], str],
+    levels: Sequence[int],
+    fixed_tokens: int = 0,
+    budget: Optional[int] = None,
+) -> str:
+    """
+    按裁剪级别依次渲染可伸缩内容，返回第一个不超出预算的结果
+
+    Args:
+        render: 按级别渲染内容（如 top_k -> 动作库文本）
+        levels: 裁剪级别，从宽松到严格（如 (40, 20, 10)）
+        fixed_tokens: Prompt 其余部分的估算 token 数
+        budget: 输入预算（默认取 get_input_token_budget()）
+
+    Returns:
+        渲染结果；所有级别都超出预算时返回最严格级别的结果
+    """
+    budget = get_input_token_budget() if budget is None else budget
+    text = ''
+    for level in levels:
+        text = render(level)
+        if not budget or fixed_tokens + estimate_text_tokens(text) <= budget:
+            if level != levels[0]:
+                logger.info(f'✂️ [TokenBudget] 可伸缩内容裁剪到级别 {level}（预算 {budget}）')
+            return text
+
+    logger.warning(f'⚠️ [TokenBudget] 裁剪到最严格级别 {levels[-1]} 仍超出预算 {budget}')
+    return text
+
+
+class TokenLedger:
+    """实例内 token 用量汇总（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (user, endpoint, model) -> 计数
+        self._totals: Dict[Tuple[str, str, str], Dict[str, int]] = defaultdict(
+            lambda: dict.fromkeys(('calls', 'over_budget', 'estimated_input_tokens') + USAGE_FIELDS, 0)
+        )
+
+    def record(
+        self,
+        user: str,
+        endpoint: str,
+        model: str,
+        usage: Optional[Dict[str, int]],
+        estimated_input_tokens: int = 0,
+        over_budget: bool = False,
+    ):
+        """累加一次调用的用量"""
+        with self._lock:
+            totals = self._totals[(user, endpoint, model)]
+            totals['calls'] += 1
+            totals['over_budget'] += int(over_budget)
+            totals['estimated_input_tokens'] += estimated_input_tokens
+            for field in USAGE_FIELDS:
+                totals[field] += (usage or {}).get(field, 0) or 0
+
+    def snapshot(self, group_by: str = 'endpoint') -> Dict[str, Dict[str, int]]:
+        """
+        按维度汇总
+
+        Args:
+            group_by: 'user' | 'endpoint' | 'model'
+        """
+        position = {'user': 0, 'endpoint': 1, 'model': 2}[group_by]
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for key, totals in self._totals.items():
+                group = result.setdefault(key[position], dict.fromkeys(totals, 0))
+                for field, value in totals.items():
+                    group[field] += value
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+# 全局单例
+_token_ledger = TokenLedger()
+
+
+def get_token_ledger() -> TokenLedger:
+    """获取实例内 token 用量汇总单例"""
+    return _token_ledger
+
+
+def record_claude_usage(
+    user: str,
+    endpoint: str,
+    model: str,
+    usage: Optional[Dict[str, int]],
+    estimated_input_tokens: int = 0,
+    over_budget: bool = False,
+):
+    """记录一次 Claude 调用的实际用量（实例内汇总 + 后台写入 Firestore 日汇总）"""
+    if not usage:
+        return
+
+    _token_ledger.record(user, endpoint, model, usage, estimated_input_tokens, over_budget)
+
+    if os.environ.get('ANTHROPIC_USAGE_PERSIST', 'true').lower() == 'true':
+        _get_persist_executor().submit(_persist_usage, user, endpoint, model, dict(usage))
+
+
+def _get_persist_executor() -> ThreadPoolExecutor:
+    global _persist_executor
+    with _persist_executor_lock:
+        if _persist_executor is None:
+            _persist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-usage')
+        return _persist_executor
+
+
+def _persist_usage(user: str, endpoint: str, model: str, usage: Dict[str, int]):
+    """按天累加用量（失败只记录告警，不影响调用方）"""
+    try:
+        from firebase_admin import firestore
+
+        today = datetime.now(timezone.utc)
+        counts = {'calls': firestore.Increment(1)}
+        counts.update({field: firestore.Increment(usage.get(field, 0) or 0) for field in USAGE_FIELDS})
+
+        db = firestore.client()
+        db.collection(USAGE_COLLECTION).document(f'{user}_{today:%Y%m%d}').set({
+            'userId': user,
+            'date': f'{today:%Y-%m-%d}',
+            **counts,
+            'endpoints': {endpoint: counts},
+            'models': {model: counts},
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+    except Exception as e:
+        logger.warning(f'⚠️ [TokenUsage] 写入用量失败 - 用户: {user}, 接口: {endpoint}: {e}')
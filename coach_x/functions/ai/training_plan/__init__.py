@@ -19,9 +19,16 @@ from .prompts import (
     build_optimize_prompt,
     build_structured_plan_prompt,
     build_single_day_prompt,
+    build_split_plan,
+    build_exercise_library_context,
     build_edit_conversation_prompt,
 )
 
+from .exercise_retrieval import (
+    ExerciseLibraryIndex,
+    select_exercise_templates,
+)
+
 from .utils import (
     validate_plan_structure,
     fix_plan_structure,
@@ -41,7 +48,12 @@ __all__ = [
     'build_optimize_prompt',
     'build_structured_plan_prompt',
     'build_single_day_prompt',
+    'build_split_plan',
+    'build_exercise_library_context',
     'build_edit_conversation_prompt',
+    # Exercise Retrieval
+    'ExerciseLibraryIndex',
+    'select_exercise_templates',
     # Utils
     'validate_plan_structure',
     'fix_plan_structure',
@@ -0,0 +1,168 @@
+"""
+动作库检索
+
+教练的动作库较大时，不再把全部模板内联进每一天的 Prompt，
+而是按当天训练重点 / 用户请求检索出 Top-K 相关模板：
+
+1. 肌群倒排索引：根据模板名称和标签中的关键词（如"卧推"、"chest"）归入肌群，
+   查询命中同一肌群的模板获得较高分
+2. 词法打分：中文按单字 + 相邻双字、英文按单词切分，按 IDF 加权累加命中词
+
+全部在本地计算，不依赖外部服务；动作库不超过 Top-K 时原样返回，Prompt 与之前一致。
+"""
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Any, List, Iterable, Optional, Set
+
+# 每次内联进 Prompt 的模板数上限
+DEFAULT_TOP_K = 40
+
+# 超出输入预算时依次尝试的模板数（见 token_accounting.fit_to_budget）
+LIBRARY_TOP_K_LEVELS = (DEFAULT_TOP_K, 20, 10)
+
+# 命中同一肌群的得分（高于任意单个词法命中）
+GROUP_MATCH_SCORE = 10.0
+
+# 肌群关键词（与 MuscleGroup 枚举的 JSON 值对应，小写匹配）
+# 英文关键词按单词边界匹配（允许复数 s），避免 'lat' 命中 lateral、'arm' 命中 warm-up；中文按子串匹配
+MUSCLE_GROUP_KEYWORDS: Dict[str, List[str]] = {
+    'chest': ['胸', 'chest', 'pec', 'pectoral', '卧推', 'bench', '飞鸟', 'fly', 'flye', '夹胸', '俯卧撑',
+              'push-up', 'pushup'],
+    'back': ['背', 'back', 'lat', '划船', 'row', 'rowing', '引体', 'pull-up', 'pullup', 'chin-up', '下拉',
+             'pulldown', '硬拉', 'deadlift'],
+    'leg': ['腿', 'leg', '深蹲', 'squat', '弓步', 'lunge', '股四头', 'quad', 'quadricep', '腘绳', 'hamstring'],
+    'shoulder': ['肩', 'shoulder', 'delt', 'deltoid', '推举', 'overhead', '侧平举', 'lateral raise',
+                 '前平举', 'front raise', '面拉', 'face pull'],
+    'arm': ['手臂', '小臂', 'arm', '二头', 'bicep', '三头', 'tricep', '弯举', 'curl', '臂屈伸', 'dip', '下压',
+            'pushdown'],
+    'glute': ['臀', 'glute', 'hip thrust', 'bridge'],
+    'calf': ['小腿', 'calf', 'calves', '提踵'],
+    'abs': ['腹', 'abs', 'abdominal', '卷腹', 'crunch'],
+    'core': ['核心', 'core', '平板支撑', 'plank'],
+    'fullBody': ['全身', 'full body', 'fullbody'],
+}
+
+
+def _compile_keywords(keywords: List[str]) -> 're.Pattern':
+    """编译肌群关键词：英文按单词边界（允许复数 s），中文按子串"""
+    parts = [
+        rf'(?<![a-z0-9]){re.escape(keyword)}s?(?![a-z0-9])' if keyword.isascii() else re.escape(keyword)
+        for keyword in keywords
+    ]
+    return re.compile('|'.join(parts))
+
+
+_MUSCLE_GROUP_PATTERNS = {
+    group: _compile_keywords([group.lower()] + keywords)
+    for group, keywords in MUSCLE_GROUP_KEYWORDS.items()
+}
+
+_CJK_PATTERN = re.compile(r'[一-鿿]+')
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> Set[str]:
+    """切分词法单元：中文单字 + 相邻双字，英文/数字按单词"""
+    text = (text or '').lower()
+    tokens = set(_WORD_PATTERN.findall(text))
+    for run in _CJK_PATTERN.findall(text):
+        tokens.update(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def detect_muscle_groups(text: str) -> Set[str]:
+    """识别文本涉及的肌群"""
+    text = (text or '').lower()
+    return {group for group, pattern in _MUSCLE_GROUP_PATTERNS.items() if pattern.search(text)}
+
+
+class ExerciseLibraryIndex:
+    """
+    动作库检索索引
+
+    示例：
+        index = ExerciseLibraryIndex(templates)
+        selected = index.search('胸部和肱三头肌', top_k=40)
+    """
+
+    def __init__(self, templates: List[Dict[str, Any]]):
+        self.templates = templates or []
+        self._group_index: Dict[str, List[int]] = defaultdict(list)
+        self._token_index: Dict[str, List[int]] = defaultdict(list)
+
+        for i, template in enumerate(self.templates):
+            text = ' '.join([template.get('name', '')] + list(template.get('tags') or []))
+            for group in detect_muscle_groups(text):
+                self._group_index[group].append(i)
+            for token in tokenize(text):
+                self._token_index[token].append(i)
+
+        total = len(self.templates)
+        self._idf = {
+            token: math.log(1 + total / len(postings))
+            for token, postings in self._token_index.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        muscle_groups: Optional[Iterable[str]] = None,
+        include_ids: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        检索与查询最相关的模板
+
+        Args:
+            query: 查询文本（当天训练重点、用户消息等）
+            top_k: 返回数量上限
+            muscle_groups: 额外的目标肌群（查询文本未识别出肌群时使用）
+            include_ids: 必须保留的模板 ID（如当前计划已引用的模板），不占用 top_k
+
+        Returns:
+            模板列表（按相关度降序，同分保持动作库原顺序）
+        """
+        if len(self.templates) <= top_k:
+            return list(self.templates)
+
+        groups = detect_muscle_groups(query)
+        if not groups - {'fullBody'} and muscle_groups:
+            groups |= set(muscle_groups)
+
+        scores = defaultdict(float)
+        for group in groups:
+            for i in self._group_index.get(group, []):
+                scores[i] += GROUP_MATCH_SCORE
+        for token in tokenize(query):
+            for i in self._token_index.get(token, []):
+                scores[i] += self._idf[token]
+
+        include_ids = set(include_ids or [])
+        pinned = [i for i, t in enumerate(self.templates) if t.get('id') in include_ids]
+        pinned_set = set(pinned)
+
+        ranked = sorted(
+            (i for i in range(len(self.templates)) if i not in pinned_set),
+            key=lambda i: (-scores.get(i, 0.0), i),
+        )
+        return [self.templates[i] for i in pinned + ranked[:top_k]]
+
+
+def select_exercise_templates(
+    templates: List[Dict[str, Any]],
+    query: str,
+    top_k: int = DEFAULT_TOP_K,
+    muscle_groups: Optional[Iterable[str]] = None,
+    include_ids: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """检索 Top-K 相关模板（动作库不超过 top_k 时原样返回）"""
+    if not templates or len(templates) <= top_k:
+        return list(templates or [])
+    return ExerciseLibraryIndex(templates).search(
+        query, top_k=top_k, muscle_groups=muscle_groups, include_ids=include_ids
+    )
@@ -5,11 +5,13 @@
 """
 
 from firebase_functions import https_fn, options
+from firebase_admin import auth
 from typing import Dict, Any, Optional
 import json
 from flask import Response
 
 from ..claude_client import get_claude_client
+from ..rate_limiter import rate_limit_user
 from .prompts import (
     build_full_plan_prompt,
     build_next_day_prompt,
@@ -23,6 +25,9 @@ from ..models import AIGenerationResponse
 from utils.logger import logger
 from utils.param_parser import parse_int_param, parse_float_param
 
+# 无法校验调用方身份时，流式生成请求共用的排队 / 记账标识
+STREAM_PLAN_FALLBACK_USER = "stream_training_plan"
+
 
 @https_fn.on_call(secrets=["ANTHROPIC_API_KEY"])
 def generate_ai_training_plan(req: https_fn.CallableRequest):
@@ -71,21 +76,22 @@ def generate_ai_training_plan(req: https_fn.CallableRequest):
         if params:
             logger.debug(f"Params: {params}")
 
-        # 根据类型分发到不同的处理函数
-        if generation_type == "full_plan":
-            result = _generate_full_plan(prompt, user_id, params)
-        elif generation_type == "next_day":
-            result = _suggest_next_day(prompt, context, user_id)
-        elif generation_type == "exercises":
-            result = _suggest_exercises(prompt, context, user_id)
-        elif generation_type == "sets":
-            result = _suggest_sets(prompt, context, user_id)
-        elif generation_type == "optimize":
-            result = _optimize_plan(context, user_id)
-        else:
-            raise https_fn.HttpsError(
-                "invalid-argument", f"不支持的生成类型: {generation_type}"
-            )
+        # 根据类型分发到不同的处理函数（按用户公平排队）
+        with rate_limit_user(user_id):
+            if generation_type == "full_plan":
+                result = _generate_full_plan(prompt, user_id, params)
+            elif generation_type == "next_day":
+                result = _suggest_next_day(prompt, context, user_id)
+            elif generation_type == "exercises":
+                result = _suggest_exercises(prompt, context, user_id)
+            elif generation_type == "sets":
+                result = _suggest_sets(prompt, context, user_id)
+            elif generation_type == "optimize":
+                result = _optimize_plan(context, user_id)
+            else:
+                raise https_fn.HttpsError(
+                    "invalid-argument", f"不支持的生成类型: {generation_type}"
+                )
 
         return result
 
@@ -128,7 +134,10 @@ def _generate_full_plan(
         # 调用 Claude API
         claude_client = get_claude_client()
         response = claude_client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format="json",
+            endpoint="generate_plan",
         )
 
         if not response.get("success"):
@@ -184,7 +193,10 @@ def _suggest_next_day(
         # 调用 Claude API
         claude_client = get_claude_client()
         response = claude_client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format="json",
+            endpoint="suggest_next_day",
         )
 
         if not response.get("success"):
@@ -234,7 +246,10 @@ def _suggest_exercises(
         # 调用 Claude API
         claude_client = get_claude_client()
         response = claude_client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format="json",
+            endpoint="suggest_exercises",
         )
 
         if not response.get("success"):
@@ -283,7 +298,10 @@ def _suggest_sets(prompt: str, context: Dict[str, Any], user_id: str) -> Dict[st
         # 调用 Claude API
         claude_client = get_claude_client()
         response = claude_client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format="json",
+            endpoint="suggest_sets",
         )
 
         if not response.get("success"):
@@ -332,7 +350,10 @@ def _optimize_plan(context: Dict[str, Any], user_id: str) -> Dict[str, Any]:
         # 调用 Claude API
         claude_client = get_claude_client()
         response = claude_client.call_claude(
-            system_prompt=system_prompt, user_prompt=user_prompt, response_format="json"
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format="json",
+            endpoint="optimize_plan",
         )
 
         if not response.get("success"):
@@ -419,20 +440,21 @@ def edit_plan_conversation(req: https_fn.Request) -> Response:
         def generate():
             """SSE 生成器"""
             try:
-                # 调用流式编辑
-                for event in stream_edit_plan_conversation(
-                    user_id=user_id,
-                    user_message=user_message,
-                    current_plan=current_plan,
-                    plan_id=plan_id,
-                ):
-                    # 格式化为 SSE 格式
-                    event_data = json.dumps(event, ensure_ascii=False)
-                    yield f"data: {event_data}\n\n"
-
-                    # 如果是错误或完成，结束流
-                    if event.get("type") in ["error", "complete"]:
-                        break
+                # 调用流式编辑（按用户公平排队）
+                with rate_limit_user(user_id):
+                    for event in stream_edit_plan_conversation(
+                        user_id=user_id,
+                        user_message=user_message,
+                        current_plan=current_plan,
+                        plan_id=plan_id,
+                    ):
+                        # 格式化为 SSE 格式
+                        event_data = json.dumps(event, ensure_ascii=False)
+                        yield f"data: {event_data}\n\n"
+
+                        # 如果是错误或完成，结束流
+                        if event.get("type") in ["error", "complete"]:
+                            break
 
             except Exception as e:
                 logger.error(f"❌ 流式编辑异常: {str(e)}", exc_info=True)
@@ -473,6 +495,9 @@ def stream_training_plan(req: https_fn.Request) -> Response:
     通过 Server-Sent Events 实时推送生成进度
     每生成一天就立即返回，用户可以看到实时进度
 
+    请求头:
+        - Authorization: Bearer <Firebase ID Token>（可选，用于按用户排队和记账）
+
     请求参数（JSON Body）:
         - goal: str, 训练目标
         - level: str, 训练水平
@@ -487,6 +512,7 @@ def stream_training_plan(req: https_fn.Request) -> Response:
         - training_styles: list
         - equipment: list
         - notes: str (可选)
+        - parallel: bool (可选)，先规划分化再并行生成各天，按完成顺序推送
 
     返回:
         SSE 流式响应，事件格式：
@@ -514,21 +540,25 @@ def stream_training_plan(req: https_fn.Request) -> Response:
             f'参数: goal={params.get("goal")}, days={params.get("days_per_week")}'
         )
 
+        # 排队和用量记账只使用校验过的 uid（请求体中的 user_id 未经认证，不可信）
+        user_id = _get_verified_user_id(req) or STREAM_PLAN_FALLBACK_USER
+
         # 导入流式生成模块
         from ..streaming import stream_generate_training_plan
 
         def generate():
             """SSE 生成器"""
             try:
-                # 调用流式生成
-                for event in stream_generate_training_plan(params):
-                    # 格式化为 SSE 格式
-                    event_data = json.dumps(event, ensure_ascii=False)
-                    yield f"data: {event_data}\n\n"
+                # 调用流式生成（按用户公平排队）
+                with rate_limit_user(user_id):
+                    for event in stream_generate_training_plan(params):
+                        # 格式化为 SSE 格式
+                        event_data = json.dumps(event, ensure_ascii=False)
+                        yield f"data: {event_data}\n\n"
 
-                    # 如果是错误或完成，结束流
-                    if event.get("type") in ["error", "complete"]:
-                        break
+                        # 如果是错误或完成，结束流
+                        if event.get("type") in ["error", "complete"]:
+                            break
 
             except Exception as e:
                 logger.error(f"❌ 流式生成异常: {str(e)}", exc_info=True)
@@ -555,3 +585,21 @@ def stream_training_plan(req: https_fn.Request) -> Response:
             {"type": "error", "error": f"服务器错误: {str(e)}"}, ensure_ascii=False
         )
         return Response(f"data: {error_event}\n\n", mimetype="text/event-stream")
+
+
+def _get_verified_user_id(req: https_fn.Request) -> Optional[str]:
+    """
+    从 Authorization: Bearer <Firebase ID Token> 中校验调用方
+
+    Returns:
+        校验通过的 uid；未携带或校验失败时返回 None
+    """
+    header = req.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+
+    try:
+        return auth.verify_id_token(header[len("Bearer "):])["uid"]
+    except Exception as e:
+        logger.warning(f"⚠️ ID Token 校验失败: {str(e)}")
+        return None
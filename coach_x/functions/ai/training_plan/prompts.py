@@ -4,7 +4,10 @@
 为训练计划生成场景提供精心设计的 Prompt 模板
 """
 
-import json
+from plans.digest import get_exercise_plan_digest
+
+from ..token_accounting import fit_to_budget, estimate_text_tokens
+from .exercise_retrieval import select_exercise_templates, DEFAULT_TOP_K, LIBRARY_TOP_K_LEVELS
 
 # ==================== 训练风格推断 ====================
 
@@ -414,10 +417,8 @@ def build_sets_prompt(exercise_name: str, user_level: str = "中级", language:
 
 def build_optimize_prompt(current_plan: dict, language: str = '中文') -> tuple:
     """构建优化计划的 Prompt"""
-    plan_str = json.dumps(current_plan, ensure_ascii=False, indent=2)
-
     system = get_system_prompt(language)
-    user = OPTIMIZE_TEMPLATE.format(current_plan=plan_str)
+    user = OPTIMIZE_TEMPLATE.format(current_plan=get_exercise_plan_digest(current_plan))
     return system, user
 
 
@@ -493,7 +494,9 @@ def build_single_day_prompt(
     day: int,
     params: dict,
     previous_days: list = None,
-    exercise_templates: list = None
+    exercise_templates: list = None,
+    split_plan: list = None,
+    exercise_library_in_context: bool = False
 ) -> str:
     """
     构建单天训练计划的 Prompt
@@ -503,6 +506,9 @@ def build_single_day_prompt(
         params: 训练参数字典
         previous_days: 已完成的训练日列表（可选）
         exercise_templates: 动作库模板列表（可选）
+        split_plan: 整周分化安排（可选，并行生成时代替 previous_days）
+        exercise_library_in_context: 动作库是否已通过 build_exercise_library_context
+            单独作为可缓存上下文发送（为 True 时 Prompt 中不再内联动作库）
 
     Returns:
         完整的单天生成 Prompt
@@ -525,11 +531,26 @@ def build_single_day_prompt(
     total_days = params.get('days_per_week', 3)
     day_focus = _generate_day_focus(day, total_days, params)
 
-    # 已完成训练日总结
-    previous_days_summary = _summarize_previous_days(previous_days) if previous_days else "无（这是第一天）"
+    # 已完成训练日总结（并行生成时各天互不可见，改为提供整周分化安排）
+    if split_plan:
+        previous_days_summary = _summarize_split_plan(split_plan, day)
+    else:
+        previous_days_summary = _summarize_previous_days(previous_days) if previous_days else "无（这是第一天）"
 
-    # 动作库列表（如果提供）
-    exercise_library_section, exercise_selection_rule = _format_exercise_library(exercise_templates)
+    # 动作库列表（如果提供；动作库较大时只内联与今日重点相关的 Top-K 模板）
+    if exercise_library_in_context:
+        exercise_library_section, exercise_selection_rule = _format_exercise_library(exercise_templates)
+        exercise_library_section = ""
+    else:
+        query = ' '.join([day_focus, notes, "、".join(params.get('equipment', []) or [])])
+        selected_templates = select_exercise_templates(
+            exercise_templates,
+            query,
+            muscle_groups=params.get('muscle_groups'),
+        )
+        exercise_library_section, exercise_selection_rule = _format_exercise_library(
+            selected_templates, total_count=len(exercise_templates or [])
+        )
 
     return SINGLE_DAY_PROMPT_TEMPLATE.format(
         day=day,
@@ -602,6 +623,50 @@ def _generate_day_focus(day: int, total_days: int, params: dict) -> str:
         return f"重点训练：{focus_map.get(day_mod, '综合训练')}"
 
 
+def build_split_plan(params: dict) -> list:
+    """
+    预先规划整周的训练分化
+
+    并行生成各训练日前调用，确定每天的训练重点，
+    使各天在互相不可见的情况下仍能保持分化合理、避免重复
+
+    Args:
+        params: 训练参数字典
+
+    Returns:
+        分化安排列表，每项包含 day 和 focus（当天重点肌群）
+    """
+    total_days = params.get('days_per_week', 3)
+
+    return [
+        {'day': day, 'focus': _generate_day_focus(day, total_days, params)}
+        for day in range(1, total_days + 1)
+    ]
+
+
+def _summarize_split_plan(split_plan: list, current_day: int) -> str:
+    """
+    总结整周分化安排（并行生成时使用）
+
+    Args:
+        split_plan: build_split_plan 返回的分化安排
+        current_day: 当前生成的天数
+
+    Returns:
+        其他训练日的重点说明文本
+    """
+    summary_lines = [
+        f"- 第{item['day']}天：{item['focus']}"
+        for item in split_plan
+        if item['day'] != current_day
+    ]
+
+    if not summary_lines:
+        return "无（这是唯一的训练日）"
+
+    return "其他训练日正在同时设计，本周安排如下（请避免与其重复）：\n" + '\n'.join(summary_lines)
+
+
 def _summarize_previous_days(previous_days: list) -> str:
     """
     总结已完成的训练日
@@ -632,12 +697,38 @@ def _summarize_previous_days(previous_days: list) -> str:
     return '\n'.join(summary_lines)
 
 
-def _format_exercise_library(exercise_templates: list) -> tuple:
+def build_exercise_library_context(exercise_templates: list, for_edit: bool = False) -> str:
+    """
+    构建动作库上下文（作为可缓存的静态前缀单独发送）
+
+    同一教练的动作库在逐天生成和连续编辑对话中保持不变，
+    单独发送可命中 Prompt Cache，避免每次重复计费。
+    动作库超过 DEFAULT_TOP_K 时返回空字符串，改由各 Prompt 按需检索 Top-K 模板内联
+
+    Args:
+        exercise_templates: 动作模板列表
+        for_edit: 是否用于编辑对话
+
+    Returns:
+        动作库文本，无动作库或动作库过大时返回空字符串
+    """
+    if not exercise_templates or len(exercise_templates) > DEFAULT_TOP_K:
+        return ""
+
+    if for_edit:
+        return _format_exercise_library_for_edit(exercise_templates)
+
+    library_section, _ = _format_exercise_library(exercise_templates)
+    return library_section.strip()
+
+
+def _format_exercise_library(exercise_templates: list, total_count: int = None) -> tuple:
     """
     格式化动作库列表
 
     Args:
         exercise_templates: 动作模板列表，每个模板包含 id, name 和 tags
+        total_count: 动作库总数（exercise_templates 为检索结果时传入）
 
     Returns:
         (exercise_library_section, exercise_selection_rule) 元组
@@ -657,8 +748,13 @@ def _format_exercise_library(exercise_templates: list) -> tuple:
 
     exercise_list_text = '\n'.join(exercise_lines)
 
+    if total_count and total_count > len(exercise_templates):
+        library_title = f"可用动作库（从 {total_count} 个动作中筛选出与今日训练相关的 {len(exercise_templates)} 个）"
+    else:
+        library_title = f"可用动作库（共 {len(exercise_templates)} 个动作）"
+
     library_section = f"""
-**可用动作库（共 {len(exercise_templates)} 个动作）：**
+**{library_title}：**
 {exercise_list_text}
 """
 
@@ -701,7 +797,8 @@ def build_edit_conversation_prompt(
     user_memory: str,
     conversation_history: list,
     exercise_templates: list = None,
-    language: str = '中文'
+    language: str = '中文',
+    exercise_library_in_context: bool = False
 ) -> tuple[str, str]:
     """
     构建编辑对话的 Prompt
@@ -713,6 +810,7 @@ def build_edit_conversation_prompt(
         conversation_history: 最近的对话历史
         exercise_templates: 动作库模板列表（可选）
         language: 输出语言
+        exercise_library_in_context: 动作库是否已单独作为可缓存上下文发送
 
     Returns:
         (system_prompt, user_prompt) 元组
@@ -833,25 +931,31 @@ def build_edit_conversation_prompt(
             ai_msg = conv.get('ai_response', '')[:100]  # AI响应截断
             history_text += f"- 用户：{user_msg}\n- AI：{ai_msg}...\n\n"
 
-    # 2. 构建当前计划摘要
-    plan_name = current_plan.get('name', '未命名计划')
+    # 2. 构建当前计划摘要（行首编号与 day_index / exercise_index 对应）
     plan_days = current_plan.get('days', [])
-    plan_summary = f"**当前计划：{plan_name}**\n共 {len(plan_days)} 个训练日\n\n"
-
-    for day in plan_days:
-        day_num = day.get('day', '?')
-        day_name = day.get('name', '未命名')
-        exercises = day.get('exercises', [])
-        exercise_list = ', '.join([ex.get('name', '未知') for ex in exercises[:5]])
-        if len(exercises) > 5:
-            exercise_list += f" 等{len(exercises)}个动作"
-
-        plan_summary += f"第{day_num}天：{day_name}\n  动作：{exercise_list}\n\n"
+    plan_summary = (
+        "**当前计划**（行首编号 [dX.eY] 对应 day_index=X, exercise_index=Y；组数据格式为 次数@重量 ×组数）\n"
+        f"{get_exercise_plan_digest(current_plan)}\n"
+    )
 
-    # 3. 动作库列表（如果提供）
+    # 3. 动作库列表（如果提供；动作库较大时按用户消息检索，并保留当前计划已引用的模板）
     exercise_library_text = ""
-    if exercise_templates:
-        exercise_library_text = f"\n\n{_format_exercise_library_for_edit(exercise_templates)}\n"
+    if exercise_templates and not exercise_library_in_context:
+        query = ' '.join([user_message] + [day.get('name', '') for day in plan_days])
+        plan_template_ids = [
+            ex.get('exerciseTemplateId')
+            for day in plan_days
+            for ex in day.get('exercises', [])
+            if ex.get('exerciseTemplateId')
+        ]
+        # 超出输入预算时逐级减少内联的模板数
+        exercise_library_text = fit_to_budget(
+            lambda top_k: "\n\n{}\n".format(_format_exercise_library_for_edit(
+                select_exercise_templates(exercise_templates, query, top_k=top_k, include_ids=plan_template_ids)
+            )),
+            levels=LIBRARY_TOP_K_LEVELS,
+            fixed_tokens=estimate_text_tokens(system_prompt, history_text, plan_summary, user_message),
+        )
 
     # 4. 统一的 User Prompt
     user_prompt = f"""{history_text}
@@ -6,6 +6,10 @@ from firebase_admin import firestore
 from firebase_functions import https_fn
 from typing import Dict, Any, List
 from utils.logger import logger
+from .template_cache import stage_template_version_bump, VERSION_BUMPED_FIELD
+
+# 单个 WriteBatch 的写入上限（Firestore 限制 500）
+MAX_BATCH_WRITES = 450
 
 
 @https_fn.on_call()
@@ -45,35 +49,9 @@ def create_exercise_templates_batch(req: https_fn.CallableRequest) -> Dict[str,
 
         # 初始化 Firestore
         db = firestore.client()
-        template_id_map = {}
 
         # 批量创建模板
-        batch = db.batch()
-
-        for exercise_name in exercise_names:
-            # 创建新模板文档
-            template_ref = db.collection('exerciseTemplates').document()
-
-            template_data = {
-                'name': exercise_name,
-                'tags': [],  # 默认空标签
-                'ownerId': coach_id,  # ✅ 修正：使用 ownerId 而不是 coachId
-                'videoUrls': [],  # ✅ 新增：视频 URL 列表
-                'thumbnailUrls': [],  # ✅ 新增：缩略图 URL 列表
-                'imageUrls': [],  # ✅ 新增：图片 URL 列表
-                'textGuidance': None,  # ✅ 新增：文字说明（可选）
-                'createdAt': firestore.SERVER_TIMESTAMP,
-                'updatedAt': firestore.SERVER_TIMESTAMP,
-            }
-
-            batch.set(template_ref, template_data)
-            template_id_map[exercise_name] = template_ref.id
-
-            logger.info(f'  ✅ 准备创建: {exercise_name} -> {template_ref.id}')
-
-        # 提交批量操作
-        batch.commit()
-        logger.info(f'✅ 批量创建完成: {len(template_id_map)} 个模板')
+        template_id_map = create_templates(db, coach_id, exercise_names)
 
         return {
             'status': 'success',
@@ -88,3 +66,67 @@ def create_exercise_templates_batch(req: https_fn.CallableRequest) -> Dict[str,
             'status': 'error',
             'error': str(e)
         }
+
+
+def build_template_data(coach_id: str, exercise_name: str) -> Dict[str, Any]:
+    """新建动作模板的默认文档数据"""
+    return {
+        'name': exercise_name,
+        'tags': [],  # 默认空标签
+        'ownerId': coach_id,  # ✅ 修正：使用 ownerId 而不是 coachId
+        'videoUrls': [],  # ✅ 新增：视频 URL 列表
+        'thumbnailUrls': [],  # ✅ 新增：缩略图 URL 列表
+        'imageUrls': [],  # ✅ 新增：图片 URL 列表
+        'textGuidance': None,  # ✅ 新增：文字说明（可选）
+        'createdAt': firestore.SERVER_TIMESTAMP,
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    }
+
+
+def create_templates(
+    db,
+    coach_id: str,
+    exercise_names: List[str],
+    template_refs: Dict[str, Any] = None
+) -> Dict[str, str]:
+    """
+    在批量写中创建动作模板
+
+    Args:
+        db: Firestore 客户端
+        coach_id: 教练ID
+        exercise_names: 动作名称列表
+        template_refs: 预先分配的文档引用 {动作名: DocumentReference}（可选）
+
+    Returns:
+        {动作名: 模板ID}
+    """
+    template_refs = template_refs or {}
+    template_id_map = {}
+
+    # 每个批量写都递增动作库版本号，使各实例的动作库缓存失效
+    batch = db.batch()
+    stage_template_version_bump(batch, db, coach_id)
+    writes = 0
+    for exercise_name in exercise_names:
+        # 创建新模板文档（ID 在客户端生成）
+        template_ref = template_refs.get(exercise_name) or db.collection('exerciseTemplates').document()
+
+        # 版本号已在本批量写中递增，标记后触发器不再重复递增
+        batch.set(template_ref, {**build_template_data(coach_id, exercise_name), VERSION_BUMPED_FIELD: True})
+        template_id_map[exercise_name] = template_ref.id
+        writes += 1
+
+        logger.info(f'  ✅ 准备创建: {exercise_name} -> {template_ref.id}')
+
+        if writes % MAX_BATCH_WRITES == 0:
+            batch.commit()
+            batch = db.batch()
+            stage_template_version_bump(batch, db, coach_id)
+
+    # 提交批量操作
+    if writes % MAX_BATCH_WRITES:
+        batch.commit()
+    logger.info(f'✅ 批量创建完成: {len(template_id_map)} 个模板')
+
+    return template_id_map
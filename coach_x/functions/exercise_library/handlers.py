@@ -9,6 +9,7 @@ from firebase_admin import firestore
 from typing import Dict, Any
 
 from utils.logger import logger
+from .template_refs import get_template_plan_count, COLLECTION as TEMPLATE_REFS_COLLECTION
 
 
 @https_fn.on_call()
@@ -42,33 +43,23 @@ def delete_exercise_template(req: https_fn.CallableRequest):
         # 获取 Firestore 实例
         db = firestore.client()
 
-        # 1. 查询所有训练计划
-        plans_query = db.collection('exercisePlans').where('ownerId', '==', coach_id)
-        plans_snapshot = plans_query.stream()
-
-        # 2. 检查引用
-        ref_count = 0
-        for plan_doc in plans_snapshot:
-            plan_data = plan_doc.to_dict()
-            days = plan_data.get('days', [])
-
-            for day in days:
-                exercises = day.get('exercises', [])
-                for exercise in exercises:
-                    if exercise.get('exerciseTemplateId') == template_id:
-                        ref_count += 1
-
-        # 3. 如果有引用，返回错误
-        if ref_count > 0:
-            logger.warning(f'⚠️ 模板被 {ref_count} 个计划引用，无法删除')
+        # 1. 从引用索引读取引用该模板的计划数（单文档读取）
+        plan_count = get_template_plan_count(db, coach_id, template_id)
+
+        # 2. 如果有引用，返回错误
+        if plan_count > 0:
+            logger.warning(f'⚠️ 模板被 {plan_count} 个计划引用，无法删除')
             raise https_fn.HttpsError(
                 'failed-precondition',
-                f'模板正被 {ref_count} 个训练计划使用',
-                {'plan_count': ref_count}
+                f'模板正被 {plan_count} 个训练计划使用',
+                {'plan_count': plan_count}
             )
 
-        # 4. 删除模板
-        db.collection('exerciseTemplates').document(template_id).delete()
+        # 3. 删除模板及其（已无引用的）索引文档
+        batch = db.batch()
+        batch.delete(db.collection('exerciseTemplates').document(template_id))
+        batch.delete(db.collection(TEMPLATE_REFS_COLLECTION).document(template_id))
+        batch.commit()
 
         logger.info(f'✅ 删除动作模板成功: {template_id}')
         return {'status': 'success', 'message': '删除成功'}
@@ -0,0 +1,118 @@
+"""
+教练动作库快照缓存（实例级，跨请求复用）
+
+exerciseTemplateVersions/{coachId} 保存教练动作库的版本号：
+
+    {
+        'version': int,
+        'updatedAt': SERVER_TIMESTAMP
+    }
+
+- 服务端批量创建动作模板时，在同一批量写中递增一次版本号（stage_template_version_bump），
+  并在模板上写入 VERSION_BUMPED_FIELD 标记，触发器跳过这些创建
+- 其余写入（客户端直接写入、更新、删除）由 exercise_library/triggers.py 中的触发器递增版本号
+
+读取动作库时先读版本文档，与缓存版本一致则直接返回快照，
+否则重新读取整个动作库（只投影 name / tags）。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+from firebase_admin import firestore
+from utils.logger import logger
+
+COLLECTION = 'exerciseTemplateVersions'
+
+# 缓存的教练数上限（LRU 淘汰）
+MAX_CACHED_COACHES = 256
+
+# 服务端创建模板时写入的标记：版本号已在同一批量写中递增，触发器无需再递增
+VERSION_BUMPED_FIELD = 'versionBumped'
+
+# 动作库快照只需要的字段
+TEMPLATE_FIELDS = ['name', 'tags']
+
+_cache: 'OrderedDict[str, Tuple[int, List[Dict[str, Any]]]]' = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def stage_template_version_bump(batch, db, coach_id: str):
+    """把版本号递增加入批量写（调用方负责 commit）"""
+    batch.set(db.collection(COLLECTION).document(coach_id), {
+        'version': firestore.Increment(1),
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+
+
+def bump_template_version(db, coach_id: str):
+    """立即递增教练动作库版本号"""
+    db.collection(COLLECTION).document(coach_id).set({
+        'version': firestore.Increment(1),
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+
+
+def get_coach_templates(coach_id: str) -> List[Dict[str, Any]]:
+    """
+    获取教练动作库（版本未变化时使用缓存快照）
+
+    Returns:
+        模板列表 [{'id', 'name', 'tags'}]（副本，调用方可自由修改）
+    """
+    db = firestore.client()
+    version_doc = db.collection(COLLECTION).document(coach_id).get()
+    version = (version_doc.to_dict() or {}).get('version', 0) if version_doc.exists else 0
+
+    with _cache_lock:
+        cached = _cache.get(coach_id)
+        if cached and cached[0] == version:
+            _cache.move_to_end(coach_id)
+            _stats['hits'] += 1
+            return [dict(template) for template in cached[1]]
+        _stats['misses'] += 1
+
+    templates = _load_templates(db, coach_id)
+    logger.info(f'📚 动作库快照已刷新 - 教练: {coach_id}, 版本: {version}, 模板数: {len(templates)}')
+
+    with _cache_lock:
+        # 读取期间若有写入，版本号已递增，下次请求会重新读取
+        _cache[coach_id] = (version, templates)
+        _cache.move_to_end(coach_id)
+        while len(_cache) > MAX_CACHED_COACHES:
+            _cache.popitem(last=False)
+
+    return [dict(template) for template in templates]
+
+
+def invalidate_coach_templates(coach_id: str):
+    """丢弃本实例中该教练的缓存快照"""
+    with _cache_lock:
+        _cache.pop(coach_id, None)
+
+
+def get_template_cache_stats() -> Dict[str, Any]:
+    """缓存命中统计"""
+    with _cache_lock:
+        total = _stats['hits'] + _stats['misses']
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'size': len(_cache),
+            'hit_rate': round(_stats['hits'] / total, 4) if total else 0.0,
+        }
+
+
+def _load_templates(db, coach_id: str) -> List[Dict[str, Any]]:
+    query = db.collection('exerciseTemplates').where('ownerId', '==', coach_id).select(TEMPLATE_FIELDS)
+
+    templates = []
+    for doc in query.stream():
+        data = doc.to_dict()
+        templates.append({
+            'id': doc.id,
+            'name': data.get('name', ''),
+            'tags': data.get('tags', [])
+        })
+    return templates
@@ -0,0 +1,244 @@
+"""
+教练动作模板索引（请求内构建一次）
+
+AI 返回的动作名称按以下顺序匹配教练动作库：
+
+1. 原始名称精确匹配
+2. 规范化名称（NFKC、小写、去空白/括号/标点）
+3. 括号限定词移到名称前后（如 "杠铃卧推" 与 "卧推(杠铃)"）
+4. 别名表（中英文常用叫法）
+5. 三元组模糊匹配（相似度不低于 FUZZY_MATCH_THRESHOLD，且修饰词不冲突，
+   如上斜/下斜、单臂/双臂、杠铃/哑铃不会互相匹配）
+
+未匹配的名称在本地预分配文档 ID（不产生写入），
+请求结束前通过 flush() 一次批量创建。
+"""
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional, Set
+
+from firebase_admin import firestore
+from utils.logger import logger
+
+from .batch_handlers import create_templates
+
+# 模糊匹配的最低 Jaccard 相似度（容忍拼写差异和复数，不足以跨越单个修饰词的差异）
+FUZZY_MATCH_THRESHOLD = 0.75
+
+# 别名组：同一组内的名称视为同一动作
+EXERCISE_ALIASES: List[List[str]] = [
+    ['卧推', '平板卧推', 'bench press'],
+    ['深蹲', '杠铃深蹲', 'squat', 'back squat'],
+    ['硬拉', '传统硬拉', 'deadlift'],
+    ['引体向上', '引体', 'pull up', 'pull-up', 'pullup'],
+    ['俯卧撑', 'push up', 'push-up', 'pushup'],
+    ['高位下拉', 'lat pulldown'],
+    ['推举', '肩推', 'overhead press', 'shoulder press'],
+    ['侧平举', 'lateral raise'],
+    ['面拉', 'face pull'],
+    ['腿举', 'leg press'],
+    ['臀推', 'hip thrust'],
+    ['臀桥', 'glute bridge'],
+    ['卷腹', 'crunch'],
+    ['平板支撑', 'plank'],
+    ['提踵', 'calf raise'],
+]
+
+# 修饰词组：同组内不同取值的两个动作视为不同动作，模糊匹配时不互相匹配
+# (组名, 未写修饰词时的默认取值, {取值: 关键词（按规范化名称的子串匹配）})
+EXERCISE_MODIFIERS: List[tuple] = [
+    ('angle', 'flat', {
+        'incline': ['上斜', 'incline'],
+        'decline': ['下斜', 'decline'],
+        'flat': ['平板', 'flat'],
+    }),
+    ('side', 'both', {
+        'single': ['单臂', '单手', '单腿', '单侧', 'singlearm', 'onearm', 'singleleg', 'oneleg', 'unilateral'],
+        'both': ['双臂', '双手', '双腿', 'twoarm', 'twoleg'],
+    }),
+    ('equipment', None, {
+        'barbell': ['杠铃', 'barbell'],
+        'dumbbell': ['哑铃', 'dumbbell'],
+        'kettlebell': ['壶铃', 'kettlebell'],
+        'cable': ['绳索', '龙门架', 'cable'],
+        'smith': ['史密斯', 'smith'],
+        'machine': ['器械', 'machine'],
+    }),
+    ('grip', None, {
+        'narrow': ['窄握', 'closegrip', 'narrowgrip'],
+        'wide': ['宽握', 'widegrip'],
+    }),
+]
+
+_IGNORED_CHARS = re.compile(r'[\s\-_·・.,，、/\\()（）\[\]【】]+')
+_QUALIFIER = re.compile(r'[(（\[【]([^)）\]】]*)[)）\]】]')
+
+
+def normalize_name(name: str) -> str:
+    """规范化动作名称"""
+    name = unicodedata.normalize('NFKC', name or '').lower()
+    return _IGNORED_CHARS.sub('', name)
+
+
+def qualifier_variants(name: str) -> Set[str]:
+    """
+    括号限定词移到名称前 / 后的规范化写法（无括号时为空）
+
+    如 "卧推(杠铃)" -> {"杠铃卧推", "卧推杠铃"}；只移动括号内的整段，不打乱字符顺序
+    """
+    qualifiers = ''.join(_QUALIFIER.findall(name or ''))
+    if not qualifiers:
+        return set()
+    base = normalize_name(_QUALIFIER.sub(' ', name))
+    qualifiers = normalize_name(qualifiers)
+    return {qualifiers + base, base + qualifiers}
+
+
+def modifiers(normalized: str) -> Dict[str, Optional[str]]:
+    """识别规范化名称中的修饰词 {组名: 取值}（同组命中多个取值时为 None，不参与冲突判断）"""
+    result = {}
+    for group, default, values in EXERCISE_MODIFIERS:
+        found = {value for value, keywords in values.items() if any(k in normalized for k in keywords)}
+        if len(found) == 1:
+            result[group] = found.pop()
+        else:
+            result[group] = None if found else default
+    return result
+
+
+def modifiers_conflict(a: Dict[str, Optional[str]], b: Dict[str, Optional[str]]) -> bool:
+    """两个名称在同一修饰词组取值不同（未写修饰词且无默认取值的组不冲突）"""
+    return any(a[group] and b[group] and a[group] != b[group] for group in a)
+
+
+def trigrams(text: str) -> Set[str]:
+    """三元组（首尾补位，短名称也能产生三元组）"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_ALIAS_LOOKUP: Dict[str, int] = {
+    normalize_name(alias): group
+    for group, aliases in enumerate(EXERCISE_ALIASES)
+    for alias in aliases
+}
+
+
+class TemplateIndex:
+    """
+    教练动作模板索引
+
+    示例：
+        index = TemplateIndex(coach_id, templates)
+        template_id = index.resolve('卧推(杠铃)')
+        index.flush()  # 批量创建未匹配的模板
+    """
+
+    def __init__(self, coach_id: str, templates: List[Dict[str, Any]]):
+        self.coach_id = coach_id
+        self.templates = templates or []
+
+        self._by_name: Dict[str, str] = {}
+        self._by_normalized: Dict[str, str] = {}
+        self._by_qualifier: Dict[str, str] = {}
+        self._by_alias: Dict[int, str] = {}
+        self._trigrams: List[tuple] = []
+
+        # 待创建的模板 {动作名: DocumentReference}
+        self._pending: Dict[str, Any] = {}
+
+        for template in self.templates:
+            self._add(template.get('name', ''), template['id'])
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @property
+    def pending_names(self) -> List[str]:
+        return list(self._pending)
+
+    def match(self, exercise_name: str) -> Optional[str]:
+        """匹配已有模板（含本次请求预分配的模板），未匹配返回 None"""
+        if exercise_name in self._by_name:
+            return self._by_name[exercise_name]
+
+        normalized = normalize_name(exercise_name)
+        if not normalized:
+            return None
+
+        template_id = self._by_normalized.get(normalized) or self._by_qualifier.get(normalized)
+        if template_id:
+            return template_id
+
+        for variant in qualifier_variants(exercise_name):
+            template_id = self._by_normalized.get(variant) or self._by_qualifier.get(variant)
+            if template_id:
+                return template_id
+
+        alias_group = _ALIAS_LOOKUP.get(normalized)
+        if alias_group is not None and alias_group in self._by_alias:
+            return self._by_alias[alias_group]
+
+        return self._fuzzy_match(normalized)
+
+    def resolve(self, exercise_name: str) -> str:
+        """匹配已有模板，未匹配时预分配新模板 ID（flush 时统一创建）"""
+        template_id = self.match(exercise_name)
+        if template_id:
+            logger.info(f'✅ 匹配到动作模板: {exercise_name} -> {template_id}')
+            return template_id
+
+        db = firestore.client()
+        template_ref = db.collection('exerciseTemplates').document()
+        self._pending[exercise_name] = template_ref
+        self._add(exercise_name, template_ref.id)
+
+        logger.info(f'⚠️ 动作「{exercise_name}」不在库中，预分配新模板: {template_ref.id}')
+        return template_ref.id
+
+    def flush(self) -> Dict[str, str]:
+        """批量创建所有预分配的模板"""
+        if not self._pending:
+            return {}
+
+        pending, self._pending = self._pending, {}
+        template_id_map = create_templates(
+            firestore.client(), self.coach_id, list(pending), template_refs=pending
+        )
+        self.templates.extend(
+            {'id': template_id, 'name': name, 'tags': []}
+            for name, template_id in template_id_map.items()
+        )
+        return template_id_map
+
+    # ==================== 内部实现 ====================
+
+    def _add(self, name: str, template_id: str):
+        """登记模板（已登记的键保留先出现的模板）"""
+        self._by_name.setdefault(name, template_id)
+
+        normalized = normalize_name(name)
+        if not normalized:
+            return
+
+        self._by_normalized.setdefault(normalized, template_id)
+        for variant in qualifier_variants(name):
+            self._by_qualifier.setdefault(variant, template_id)
+
+        alias_group = _ALIAS_LOOKUP.get(normalized)
+        if alias_group is not None:
+            self._by_alias.setdefault(alias_group, template_id)
+
+        self._trigrams.append((trigrams(normalized), modifiers(normalized), template_id))
+
+    def _fuzzy_match(self, normalized: str) -> Optional[str]:
+        grams = trigrams(normalized)
+        query_modifiers = modifiers(normalized)
+        best_id, best_score = None, FUZZY_MATCH_THRESHOLD
+        for candidate, candidate_modifiers, template_id in self._trigrams:
+            if modifiers_conflict(query_modifiers, candidate_modifiers):
+                continue
+            score = len(grams & candidate) / len(grams | candidate)
+            if score >= best_score and (best_id is None or score > best_score):
+                best_id, best_score = template_id, score
+        return best_id
@@ -0,0 +1,154 @@
+"""
+动作模板引用索引
+
+templateRefs/{templateId} 记录每个动作模板被哪些训练计划引用：
+
+    {
+        'templateId': str,
+        'ownerId': str,
+        'plans': {planId: 该计划中引用次数},
+        'updatedAt': SERVER_TIMESTAMP
+    }
+
+plans/handlers.py 在创建、复制训练计划时，把计划写入和索引更新放在同一个批量写中；
+更新、删除时在同一个事务中读取旧计划并写入计划和索引，避免并发修改读到过期的旧 days。
+删除模板前的引用检查只需读取一个索引文档。
+
+每个教练首次删除模板时，从已有训练计划全量重建一次索引，
+完成标记保存在 templateRefIndexes/{coachId}。
+"""
+
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from firebase_admin import firestore
+from utils.logger import logger
+
+COLLECTION = 'templateRefs'
+INDEX_STATE_COLLECTION = 'templateRefIndexes'
+
+# 索引结构版本（结构变化时重新全量构建）
+INDEX_VERSION = 1
+
+
+def count_template_refs(days: Optional[List[Dict[str, Any]]]) -> Dict[str, int]:
+    """统计计划 days 中每个动作模板的引用次数"""
+    counts = Counter()
+    for day in days or []:
+        for exercise in day.get('exercises', []) or []:
+            template_id = exercise.get('exerciseTemplateId')
+            if template_id:
+                counts[template_id] += 1
+    return dict(counts)
+
+
+def stage_template_refs_update(
+    batch,
+    db,
+    owner_id: str,
+    plan_id: str,
+    old_days: Optional[List[Dict[str, Any]]],
+    new_days: Optional[List[Dict[str, Any]]],
+) -> int:
+    """
+    把计划引用变化加入批量写或事务（调用方负责 commit）
+
+    每个计划在索引中保存的是绝对引用次数而非增量，重复写入不会累积误差；
+    old_days 必须与写入在同一事务中读取，否则并发更新时可能基于过期的旧计划计算
+
+    Args:
+        batch: Firestore WriteBatch 或 Transaction
+        owner_id: 计划所有者（教练ID）
+        plan_id: 计划ID
+        old_days: 变更前的 days（创建/复制时为 None）
+        new_days: 变更后的 days（删除时为 None）
+
+    Returns:
+        更新的索引文档数
+    """
+    old_counts = count_template_refs(old_days)
+    new_counts = count_template_refs(new_days)
+
+    changed = 0
+    for template_id in set(old_counts) | set(new_counts):
+        count = new_counts.get(template_id, 0)
+        if count == old_counts.get(template_id, 0):
+            continue
+
+        batch.set(db.collection(COLLECTION).document(template_id), {
+            'templateId': template_id,
+            'ownerId': owner_id,
+            'plans': {plan_id: count if count > 0 else firestore.DELETE_FIELD},
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+        changed += 1
+
+    return changed
+
+
+def get_template_plan_count(db, coach_id: str, template_id: str) -> int:
+    """
+    获取引用该模板的训练计划数
+
+    索引已构建时只读取一个文档；否则先全量构建该教练的索引
+    """
+    ref_doc, state_doc = _get_docs(db, template_id, coach_id)
+
+    state = state_doc.to_dict() if state_doc.exists else {}
+    if state.get('version') != INDEX_VERSION:
+        plans_by_template = rebuild_template_refs(db, coach_id)
+        return len(plans_by_template.get(template_id, {}))
+
+    if not ref_doc.exists:
+        return 0
+
+    plans = ref_doc.to_dict().get('plans', {}) or {}
+    return sum(1 for count in plans.values() if count)
+
+
+def rebuild_template_refs(db, coach_id: str) -> Dict[str, Dict[str, int]]:
+    """
+    扫描教练的所有训练计划，全量重建引用索引
+
+    Returns:
+        {templateId: {planId: 引用次数}}
+    """
+    plans_by_template: Dict[str, Dict[str, int]] = {}
+    for plan_doc in db.collection('exercisePlans').where('ownerId', '==', coach_id).stream():
+        for template_id, count in count_template_refs(plan_doc.to_dict().get('days')).items():
+            plans_by_template.setdefault(template_id, {})[plan_doc.id] = count
+
+    # 覆盖写入（清除可能残留的旧条目），并写入完成标记
+    batch = db.batch()
+    writes = 0
+    for template_id, plans in plans_by_template.items():
+        batch.set(db.collection(COLLECTION).document(template_id), {
+            'templateId': template_id,
+            'ownerId': coach_id,
+            'plans': plans,
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+        })
+        writes += 1
+        if writes % 450 == 0:
+            batch.commit()
+            batch = db.batch()
+
+    batch.set(db.collection(INDEX_STATE_COLLECTION).document(coach_id), {
+        'version': INDEX_VERSION,
+        'templateCount': len(plans_by_template),
+        'builtAt': firestore.SERVER_TIMESTAMP,
+    })
+    batch.commit()
+
+    logger.info(f'🗂️ 动作模板引用索引已重建 - 教练: {coach_id}, 模板数: {len(plans_by_template)}')
+    return plans_by_template
+
+
+def _get_docs(db, template_id: str, coach_id: str):
+    """一次往返读取索引文档和构建标记（按传入顺序返回）"""
+    refs = [
+        db.collection(COLLECTION).document(template_id),
+        db.collection(INDEX_STATE_COLLECTION).document(coach_id),
+    ]
+    snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all(refs)}
+    return snapshots[refs[0].path], snapshots[refs[1].path]
@@ -0,0 +1,38 @@
+"""
+Firestore Triggers for the Exercise Library
+"""
+
+from firebase_functions import firestore_fn
+from firebase_admin import firestore
+from .template_cache import bump_template_version, VERSION_BUMPED_FIELD
+from utils import logger
+
+
+@firestore_fn.on_document_written(document="exerciseTemplates/{templateId}")
+def on_exercise_template_written(event: firestore_fn.Event[firestore_fn.Change[firestore_fn.DocumentSnapshot]]) -> None:
+    """
+    Trigger: When an exercise template is created, updated or deleted.
+    Bumps the owner's template library version so cached snapshots on warm
+    instances are refreshed. Templates created by the server already bumped the
+    version in the same batch and carry VERSION_BUMPED_FIELD, so their creation
+    is skipped; later updates and deletes are always handled here.
+    """
+    try:
+        change = event.data
+        if not change:
+            return
+
+        before = change.before.to_dict() if change.before and change.before.exists else {}
+        after = change.after.to_dict() if change.after and change.after.exists else {}
+
+        owner_id = after.get('ownerId') or before.get('ownerId')
+        if not owner_id:
+            return
+
+        if not before and after.get(VERSION_BUMPED_FIELD):
+            return
+
+        bump_template_version(firestore.client(), owner_id)
+
+    except Exception as e:
+        logger.error(f"Error in on_exercise_template_written: {e}")
@@ -52,6 +52,7 @@ from ai.handlers import (
     stream_training_plan,
     edit_plan_conversation,
     get_food_macros,
+    get_food_macros_batch,
     generate_diet_plan_with_skill,
     edit_diet_plan_conversation,
     generate_supplement_plan_conversation,
@@ -98,6 +99,9 @@ from exercise_library.handlers import (
 from exercise_library.batch_handlers import (
     create_exercise_templates_batch
 )
+from exercise_library.triggers import (
+    on_exercise_template_written
+)
 
 # ==================== 导入通知模块 ====================
 from notifications.triggers import (
@@ -138,6 +142,7 @@ __all__ = [
     'stream_training_plan',
     'edit_plan_conversation',
     'get_food_macros',
+    'get_food_macros_batch',
     'generate_diet_plan_with_skill',
     'edit_diet_plan_conversation',
     'generate_supplement_plan_conversation',
@@ -171,6 +176,7 @@ __all__ = [
     # 动作库
     'delete_exercise_template',
     'create_exercise_templates_batch',
+    'on_exercise_template_written',
 
     # 通知触发器
     'on_message_created',
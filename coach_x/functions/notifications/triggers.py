@@ -5,8 +5,18 @@ Firestore Triggers for Notifications
 from firebase_functions import firestore_fn, options
 from firebase_admin import firestore
 from .utils import get_user_fcm_token, send_fcm_notification
+from students.training_rollups import apply_training_change
 from utils import logger
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+
+def _update_training_rollup(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+    """Incrementally maintain the weekly trainingRollups document (never blocks notifications)."""
+    try:
+        apply_training_change(before, after)
+    except Exception as e:
+        logger.error(f"Error updating training rollup: {e}")
+
 
 @firestore_fn.on_document_created(document="messages/{messageId}")
 def on_message_created(event: firestore_fn.Event[firestore_fn.DocumentSnapshot]) -> None:
@@ -70,7 +80,7 @@ def on_message_created(event: firestore_fn.Event[firestore_fn.DocumentSnapshot])
 def on_training_created(event: firestore_fn.Event[firestore_fn.DocumentSnapshot]) -> None:
     """
     Trigger: When a student submits a new daily training record.
-    Sends a notification to the coach.
+    Updates the student's weekly training rollup and sends a notification to the coach.
     """
     try:
         snapshot = event.data
@@ -78,6 +88,8 @@ def on_training_created(event: firestore_fn.Event[firestore_fn.DocumentSnapshot]
             return
 
         training_data = snapshot.to_dict()
+        _update_training_rollup(None, training_data)
+
         student_id = training_data.get('studentID')
         coach_id = training_data.get('coachID')
         date = training_data.get('date')
@@ -117,7 +129,8 @@ def on_training_created(event: firestore_fn.Event[firestore_fn.DocumentSnapshot]
 def on_training_updated(event: firestore_fn.Event[firestore_fn.Change[firestore_fn.DocumentSnapshot]]) -> None:
     """
     Trigger: When a training record is updated (e.g., reviewed by coach).
-    Sends a notification to the student if isReviewed changes to True.
+    Updates the student's weekly training rollup, and sends a notification
+    to the student if isReviewed changes to True.
     """
     try:
         change = event.data
@@ -126,6 +139,7 @@ def on_training_updated(event: firestore_fn.Event[firestore_fn.Change[firestore_
 
         before = change.before.to_dict()
         after = change.after.to_dict()
+        _update_training_rollup(before, after)
 
         is_reviewed_before = before.get('isReviewed', False)
         is_reviewed_after = after.get('isReviewed', False)
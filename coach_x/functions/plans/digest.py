@@ -0,0 +1,205 @@
+"""
+计划摘要（Prompt 专用的紧凑文本）
+
+把训练计划 / 饮食计划文档转换为规范化的紧凑文本，代替整份 JSON 放入 Prompt：
+
+    训练计划「增肌四分化」（4 天）
+    [d0] 第1天 胸部日（strength）；备注：先做复合动作
+    [d0.e0] 杠铃卧推：10@60kg ×2, 8@65kg ×2；备注：下放 3 秒
+
+    饮食计划「减脂」（7 天，日均 蛋白质 150g / 碳水 180g / 脂肪 60g / 1900 kcal）
+    [d0] 第1天 训练日：P150 C180 F60 1900kcal
+    [d0.m0] 早餐：P30 C50 F15 450kcal
+    [d0.m0.f0] 鸡蛋 2个：P12 C1 F10 140kcal
+
+行首编号与修改工具的 0 起始索引一一对应（d=day_index, e=exercise_index,
+m=meal_index, f=food_item_index），模型可直接按编号定位。
+
+同一份计划的摘要文本是确定的，适合作为稳定的 Prompt 前缀；
+从 Firestore 读取的计划按 (计划ID, updatedAt) 缓存在实例内。
+客户端传入的计划可能含未保存的修改，不传 plan_id，每次重新生成。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from .models import ExercisePlan, DietPlan, Exercise, Macros
+
+# 缓存的摘要数上限（LRU 淘汰）
+MAX_CACHED_DIGESTS = 512
+
+_cache: 'OrderedDict[tuple, str]' = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+# ==================== 训练计划 ====================
+
+def format_sets(exercise: Exercise) -> str:
+    """紧凑表示组数据，连续相同的组合并（如 "10@60kg ×3, 8@65kg"）"""
+    runs: List[List[Any]] = []
+    for training_set in exercise.sets:
+        reps = str(training_set.reps or '').strip() or '?'
+        weight = str(training_set.weight or '').strip()
+        label = f'{reps}@{weight}' if weight else reps
+        if runs and runs[-1][0] == label:
+            runs[-1][1] += 1
+        else:
+            runs.append([label, 1])
+
+    if not runs:
+        return '无组数据'
+    return ', '.join(label if count == 1 else f'{label} ×{count}' for label, count in runs)
+
+
+def format_note(data: Optional[Dict[str, Any]]) -> str:
+    """备注后缀（多行备注合并为一行，无备注时为空）"""
+    note = ' '.join(str((data or {}).get('note') or '').split())
+    return f'；备注：{note}' if note else ''
+
+
+def build_exercise_plan_digest(plan: ExercisePlan, plan_data: Optional[Dict[str, Any]] = None) -> str:
+    """
+    生成训练计划摘要
+
+    Args:
+        plan: 训练计划
+        plan_data: 原始计划文档（训练日 / 动作的 note 不在模型中，从原始数据读取）
+    """
+    raw_days = (plan_data or {}).get('days') or []
+
+    lines = [f'训练计划「{plan.name or "未命名"}」（{len(plan.days)} 天）']
+    if plan.description:
+        lines.append(f'描述：{plan.description}')
+
+    for d, day in enumerate(plan.days):
+        raw_day = raw_days[d] if d < len(raw_days) else {}
+        raw_exercises = raw_day.get('exercises') or []
+        day_type = f'（{day.type}）' if day.type else ''
+        lines.append(f'[d{d}] 第{day.day}天 {day.name or "未命名"}{day_type}{format_note(raw_day)}')
+        for e, exercise in enumerate(day.exercises):
+            raw_exercise = raw_exercises[e] if e < len(raw_exercises) else {}
+            kind = '' if exercise.type in ('', 'strength') else f'（{exercise.type}）'
+            lines.append(
+                f'[d{d}.e{e}] {exercise.name}{kind}：{format_sets(exercise)}{format_note(raw_exercise)}'
+            )
+
+    return '\n'.join(lines)
+
+
+# ==================== 饮食计划 ====================
+
+def format_macros(macros: Macros) -> str:
+    """紧凑表示营养数据（如 "P30 C50 F15 450kcal"）"""
+    return (
+        f'P{macros.protein:.0f} C{macros.carbs:.0f} F{macros.fat:.0f} '
+        f'{macros.calories:.0f}kcal'
+    )
+
+
+def calculate_average_macros(plan: DietPlan) -> Macros:
+    """计算饮食计划的日均营养数据"""
+    total = Macros()
+    for day in plan.days:
+        total = total + day.calculate_macros()
+
+    day_count = len(plan.days) or 1
+    return Macros(
+        protein=total.protein / day_count,
+        carbs=total.carbs / day_count,
+        fat=total.fat / day_count,
+        calories=total.calories / day_count,
+    )
+
+
+def build_diet_plan_digest(plan: DietPlan) -> str:
+    """生成饮食计划摘要"""
+    average = calculate_average_macros(plan)
+    lines = [
+        f'饮食计划「{plan.name or "未命名"}」（{len(plan.days)} 天，日均 '
+        f'蛋白质 {average.protein:.0f}g / 碳水 {average.carbs:.0f}g / '
+        f'脂肪 {average.fat:.0f}g / {average.calories:.0f} kcal）'
+    ]
+    if plan.description:
+        lines.append(f'描述：{plan.description}')
+
+    for d, day in enumerate(plan.days):
+        lines.append(f'[d{d}] 第{day.day}天 {day.name or "未命名"}：{format_macros(day.calculate_macros())}')
+        for m, meal in enumerate(day.meals):
+            note = f'（{meal.note}）' if meal.note else ''
+            lines.append(f'[d{d}.m{m}] {meal.name}{note}：{format_macros(meal.calculate_macros())}')
+            for f, item in enumerate(meal.items):
+                amount = f' {item.amount}' if item.amount else ''
+                lines.append(f'[d{d}.m{m}.f{f}] {item.food}{amount}：{format_macros(item.get_macros())}')
+
+    return '\n'.join(lines)
+
+
+# ==================== 缓存入口 ====================
+
+def get_exercise_plan_digest(plan_data: Dict[str, Any], plan_id: Optional[str] = None) -> str:
+    """
+    获取训练计划摘要
+
+    Args:
+        plan_data: 训练计划文档
+        plan_id: 计划ID（仅对 Firestore 中已保存的计划传入，按 updatedAt 缓存）
+    """
+    return _get_digest('exercise', plan_data, plan_id,
+                       lambda: build_exercise_plan_digest(ExercisePlan.from_dict(plan_data), plan_data))
+
+
+def get_diet_plan_digest(plan_data: Dict[str, Any], plan_id: Optional[str] = None) -> str:
+    """
+    获取饮食计划摘要
+
+    Args:
+        plan_data: 饮食计划文档
+        plan_id: 计划ID（仅对 Firestore 中已保存的计划传入，按 updatedAt 缓存）
+    """
+    return _get_digest('diet', plan_data, plan_id,
+                       lambda: build_diet_plan_digest(DietPlan.from_dict(plan_data)))
+
+
+def get_digest_cache_stats() -> Dict[str, Any]:
+    """缓存命中统计"""
+    with _cache_lock:
+        total = _stats['hits'] + _stats['misses']
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'size': len(_cache),
+            'hit_rate': round(_stats['hits'] / total, 4) if total else 0.0,
+        }
+
+
+def clear_digest_cache():
+    """清空本实例的摘要缓存"""
+    with _cache_lock:
+        _cache.clear()
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def _get_digest(kind: str, plan_data: Dict[str, Any], plan_id: Optional[str], build) -> str:
+    updated_at = plan_data.get('updatedAt')
+    if not plan_id or not updated_at:
+        return build()
+
+    key = (kind, plan_id, updated_at)
+    with _cache_lock:
+        digest = _cache.get(key)
+        if digest is not None:
+            _cache.move_to_end(key)
+            _stats['hits'] += 1
+            return digest
+        _stats['misses'] += 1
+
+    digest = build()
+
+    with _cache_lock:
+        _cache[key] = digest
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_DIGESTS:
+            _cache.popitem(last=False)
+
+    return digest
@@ -10,6 +10,7 @@ from typing import Dict, Any
 import time
 
 from .models import ExercisePlan, DietPlan
+from exercise_library.template_refs import stage_template_refs_update
 from utils.logger import logger
 
 
@@ -113,8 +114,11 @@ def _create_plan(req: https_fn.CallableRequest, user_id: str) -> Dict[str, Any]:
             'updatedAt': now,
         }
         
-        # 保存到 Firestore
-        plan_ref.set(plan_doc)
+        # 保存到 Firestore（与动作模板引用索引在同一批量写中提交）
+        batch = db.batch()
+        batch.set(plan_ref, plan_doc)
+        stage_template_refs_update(batch, db, user_id, plan_id, None, plan_doc['days'])
+        batch.commit()
         
         logger.info(f'✅ 训练计划创建成功 - ID: {plan_id}')
         
@@ -164,16 +168,6 @@ def _update_plan(req: https_fn.CallableRequest, user_id: str) -> Dict[str, Any]:
         db = firestore.client()
         plan_ref = db.collection('exercisePlans').document(plan_id)
         
-        # 检查计划是否存在
-        plan_doc = plan_ref.get()
-        if not plan_doc.exists:
-            raise https_fn.HttpsError('not-found', '计划不存在')
-        
-        # 检查权限
-        plan_owner_id = plan_doc.to_dict().get('ownerId', '')
-        if plan_owner_id != user_id:
-            raise https_fn.HttpsError('permission-denied', '无权修改此计划')
-        
         # 更新时间戳
         now = int(time.time() * 1000)
         
@@ -185,8 +179,27 @@ def _update_plan(req: https_fn.CallableRequest, user_id: str) -> Dict[str, Any]:
             'updatedAt': now,
         }
         
-        # 更新 Firestore
-        plan_ref.update(update_data)
+        # 在同一事务中读取旧计划并写入计划和动作模板引用索引
+        # （并发更新时旧 days 不会过期，索引引用次数与计划保持一致）
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            # 检查计划是否存在
+            plan_doc = plan_ref.get(transaction=transaction)
+            if not plan_doc.exists:
+                raise https_fn.HttpsError('not-found', '计划不存在')
+            
+            # 检查权限
+            old_plan = plan_doc.to_dict()
+            plan_owner_id = old_plan.get('ownerId', '')
+            if plan_owner_id != user_id:
+                raise https_fn.HttpsError('permission-denied', '无权修改此计划')
+            
+            transaction.update(plan_ref, update_data)
+            stage_template_refs_update(
+                transaction, db, user_id, plan_id, old_plan.get('days'), update_data['days']
+            )
+        
+        update_in_transaction(db.transaction())
         
         logger.info(f'✅ 训练计划更新成功 - ID: {plan_id}')
         
@@ -278,18 +291,24 @@ def _delete_plan(req: https_fn.CallableRequest, user_id: str) -> Dict[str, Any]:
         db = firestore.client()
         plan_ref = db.collection('exercisePlans').document(plan_id)
         
-        # 检查计划是否存在
-        plan_doc = plan_ref.get()
-        if not plan_doc.exists:
-            raise https_fn.HttpsError('not-found', '计划不存在')
-        
-        # 检查权限
-        plan_owner_id = plan_doc.to_dict().get('ownerId', '')
-        if plan_owner_id != user_id:
-            raise https_fn.HttpsError('permission-denied', '无权删除此计划')
+        # 在同一事务中读取计划、删除计划并移除动作模板引用
+        @firestore.transactional
+        def delete_in_transaction(transaction):
+            # 检查计划是否存在
+            plan_doc = plan_ref.get(transaction=transaction)
+            if not plan_doc.exists:
+                raise https_fn.HttpsError('not-found', '计划不存在')
+            
+            # 检查权限
+            old_plan = plan_doc.to_dict()
+            plan_owner_id = old_plan.get('ownerId', '')
+            if plan_owner_id != user_id:
+                raise https_fn.HttpsError('permission-denied', '无权删除此计划')
+            
+            transaction.delete(plan_ref)
+            stage_template_refs_update(transaction, db, user_id, plan_id, old_plan.get('days'), None)
         
-        # 删除计划
-        plan_ref.delete()
+        delete_in_transaction(db.transaction())
         
         logger.info(f'✅ 训练计划删除成功 - ID: {plan_id}')
         
@@ -402,8 +421,11 @@ def _copy_plan(req: https_fn.CallableRequest, user_id: str) -> Dict[str, Any]:
             'updatedAt': now,
         }
         
-        # 保存新计划
-        new_plan_ref.set(new_plan)
+        # 保存新计划（与动作模板引用索引在同一批量写中提交）
+        batch = db.batch()
+        batch.set(new_plan_ref, new_plan)
+        stage_template_refs_update(batch, db, user_id, new_plan_id, None, new_plan['days'])
+        batch.commit()
         
         logger.info(f'✅ 训练计划复制成功 - 原ID: {plan_id}, 新ID: {new_plan_id}')
         
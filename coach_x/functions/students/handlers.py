@@ -6,6 +6,8 @@ from firebase_admin import firestore
 from utils import logger, db_helper
 from utils.param_parser import parse_int_param, parse_bool_param
 from .models import StudentListItem, StudentPlanInfo
+from .training_rollups import get_range_rollups, iter_rollup_days
+from utils.concurrency import run_concurrently
 import math
 
 
@@ -16,7 +18,8 @@ def fetch_students(req: https_fn.CallableRequest):
     
     请求参数:
         - page_size: 每页数量 (默认20)
-        - page_number: 页码，从1开始 (默认1)
+        - page_number: 页码，从1开始 (默认1，提供 start_after 时仅用于返回值)
+        - start_after: 分页游标，上一页返回的 next_cursor (可选，推荐)
         - search_name: 搜索姓名 (可选)
         - filter_plan_id: 筛选训练计划ID (可选)
         - include_plans: 是否包含计划信息 (默认False，可提升性能)
@@ -29,6 +32,7 @@ def fetch_students(req: https_fn.CallableRequest):
             - has_more: 是否还有更多数据
             - current_page: 当前页码
             - total_pages: 总页数
+            - next_cursor: 下一页游标 (没有更多数据时为 None)
     """
     try:
         # 检查认证
@@ -52,7 +56,7 @@ def fetch_students(req: https_fn.CallableRequest):
         search_name = req.data.get('search_name', '').strip()
         filter_plan_id = req.data.get('filter_plan_id', '').strip()
         include_plans = parse_bool_param(req.data.get('include_plans'), False)
-
+        start_after = (req.data.get('start_after') or '').strip()
 
         # 参数验证
         if page_size < 1 or page_size > 100:
@@ -60,82 +64,48 @@ def fetch_students(req: https_fn.CallableRequest):
         if page_number < 1:
             raise https_fn.HttpsError('invalid-argument', '页码必须大于0')
 
-        logger.info(f'查询学生列表: coach_id={coach_id}, page={page_number}, size={page_size}, search={search_name}, filter={filter_plan_id}')
-        
-        # 构建查询
+        logger.info(f'查询学生列表: coach_id={coach_id}, page={page_number}, size={page_size}, search={search_name}, filter={filter_plan_id}, cursor={start_after}')
+
         db = firestore.client()
-        query = db.collection('users') \
-            .where('role', '==', 'student') \
-            .where('coachId', '==', coach_id)
-        
-        # 添加搜索条件（前缀匹配）
-        if search_name:
-            query = query.order_by('name') \
-                .start_at([search_name]) \
-                .end_at([search_name + '\uf8ff'])
-        else:
-            # 默认按name排序（避免createdAt字段缺失或类型不一致导致的排序错误）
-            query = query.order_by('name')
-        
-        # 获取所有匹配的学生（用于计算总数和筛选）
-        all_students_docs = query.get()
-        all_students = []
-        
-        for student_doc in all_students_docs:
-            student_data = student_doc.to_dict()
-
-            # 只有在需要时才查询计划信息（性能优化）
-            exercise_plan = None
-            diet_plan = None
-            supplement_plan = None
-
-            if include_plans or filter_plan_id:
-                exercise_plan = _get_student_plan(db, student_doc.id, 'exercisePlans')
-                diet_plan = _get_student_plan(db, student_doc.id, 'dietPlans')
-                supplement_plan = _get_student_plan(db, student_doc.id, 'supplementPlans')
-
-            logger.info(f"exercise_plan: {exercise_plan}")
-            logger.info(f"diet_plan: {diet_plan}")
-            logger.info(f"supplement_plan: {supplement_plan}")
-            # 创建学生列表项
-            student_item = StudentListItem(
-                student_id=student_doc.id,
-                name=student_data.get('name', ''),
-                email=student_data.get('email', ''),
-                avatar_url=student_data.get('avatarUrl'),
-                coach_id=student_data.get('coachId'),
-                exercise_plan=exercise_plan,
-                diet_plan=diet_plan,
-                supplement_plan=supplement_plan,
-                created_at=student_data.get('createdAt')
+
+        if filter_plan_id:
+            # 按计划筛选：直接读取计划的 studentIds
+            docs, total_count, has_more, next_cursor = _fetch_students_filtered_by_plan(
+                db, coach_id, search_name, filter_plan_id, page_size, page_number, start_after
             )
+        else:
+            query = _build_students_query(db, coach_id, search_name)
+            total_count = _count_query(query)
+
+            # 游标分页：优先使用 start_after，未提供时按页码偏移（兼容旧客户端）
+            page_query = query
+            if start_after:
+                cursor_doc = db.collection('users').document(start_after).get()
+                if not cursor_doc.exists or cursor_doc.to_dict().get('coachId') != coach_id:
+                    raise https_fn.HttpsError('invalid-argument', '分页游标无效')
+                page_query = page_query.start_after(cursor_doc)
+            elif page_number > 1:
+                page_query = page_query.offset((page_number - 1) * page_size)
+
+            # 多取一条用于判断是否还有下一页
+            docs = list(page_query.limit(page_size + 1).get())
+            has_more = len(docs) > page_size
+            docs = docs[:page_size]
+            next_cursor = docs[-1].id if has_more else None
+
+            if total_count is None:
+                # 聚合查询失败时的兜底（至少覆盖已读取的范围）
+                total_count = (page_number - 1) * page_size + len(docs) + (1 if has_more else 0)
+
+        # 批量加载计划信息（每个计划集合查询一次），一次遍历挂载到学生上
+        plan_index = _load_student_plan_index(db, [doc.id for doc in docs]) \
+            if (include_plans or filter_plan_id) and docs else {}
+        page_students = [
+            _build_student_item(doc, plan_index.get(doc.id)) for doc in docs
+        ]
 
-            # 应用计划筛选
-            if filter_plan_id:
-                # 检查学生是否有该计划
-                has_plan = False
-                if exercise_plan and exercise_plan.id == filter_plan_id:
-                    has_plan = True
-                if diet_plan and diet_plan.id == filter_plan_id:
-                    has_plan = True
-                if supplement_plan and supplement_plan.id == filter_plan_id:
-                    has_plan = True
-
-                if has_plan:
-                    all_students.append(student_item)
-            else:
-                all_students.append(student_item)
-        
-        # 计算分页信息
-        total_count = len(all_students)
         total_pages = math.ceil(total_count / page_size) if total_count > 0 else 1
-        start_index = (page_number - 1) * page_size
-        end_index = start_index + page_size
-        has_more = end_index < total_count
-        
-        # 获取当前页的学生
-        page_students = all_students[start_index:end_index]
-        
+
         # 转换为字典格式
         students_data = [student.to_dict() for student in page_students]
 
@@ -148,7 +118,8 @@ def fetch_students(req: https_fn.CallableRequest):
                 'total_count': total_count,
                 'has_more': has_more,
                 'current_page': page_number,
-                'total_pages': total_pages
+                'total_pages': total_pages,
+                'next_cursor': next_cursor
             }
         }
     
@@ -224,35 +195,164 @@ def delete_student(req: https_fn.CallableRequest):
 
 # ==================== 辅助函数 ====================
 
-def _get_student_plan(db, student_id: str, collection_name: str):
-    """获取学生的计划信息"""
+def _build_students_query(db, coach_id: str, search_name: str = ''):
+    """构建教练名下学生的查询（按 name 排序，可选姓名前缀匹配）"""
+    query = db.collection('users') \
+        .where('role', '==', 'student') \
+        .where('coachId', '==', coach_id)
+
+    # 前缀匹配使用范围过滤而非 start_at/end_at，以便与 start_after 游标组合
+    if search_name:
+        query = query.where('name', '>=', search_name) \
+            .where('name', '<=', search_name + '\uf8ff')
+
+    # 按name排序（避免createdAt字段缺失或类型不一致导致的排序错误）
+    return query.order_by('name')
+
+
+def _count_query(query):
+    """使用聚合查询统计总数，失败时返回 None"""
     try:
-        plans = db.collection(collection_name) \
-            .where('studentIds', 'array_contains', student_id) \
-            .limit(1) \
-            .get()
-        
-        if not plans:
-            return None
-        
-        plan_doc = plans[0]
-        plan_data = plan_doc.to_dict()
-        
-        # 确定计划类型
-        plan_type = 'exercise' if collection_name == 'exercisePlans' else \
-                    'diet' if collection_name == 'dietPlans' else \
-                    'supplement'
-        
-        return StudentPlanInfo(
-            plan_id=plan_doc.id,
-            plan_name=plan_data.get('name', ''),
-            plan_type=plan_type
-        )
+        results = query.count().get()
+        return int(results[0][0].value)
     except Exception as e:
-        logger.error(f'获取学生计划失败: {collection_name}', e)
+        logger.warning(f'⚠️ 学生总数聚合查询失败: {str(e)}')
         return None
 
 
+# array_contains_any 单次查询最多的值数量（Firestore 限制）
+ARRAY_CONTAINS_ANY_LIMIT = 30
+
+# 最近训练卡片只投影需要的字段（不读取饮食、补充剂、关键帧等）
+RECENT_TRAINING_FIELDS = ['date', 'exercises', 'planSelection', 'totalDuration', 'isReviewed']
+
+# 计划集合 -> 计划类型
+PLAN_COLLECTIONS = {
+    'exercisePlans': 'exercise',
+    'dietPlans': 'diet',
+    'supplementPlans': 'supplement',
+}
+
+
+def _load_student_plan_index(db, student_ids: list) -> dict:
+    """
+    批量加载当前页学生的计划，建立学生 -> 计划索引
+
+    与逐个学生的 array_contains 查询语义一致（包含学生自己创建或其他人分配的计划），
+    每个集合按 ARRAY_CONTAINS_ANY_LIMIT 个学生一组查询
+
+    Returns:
+        {student_id: {'exercise': StudentPlanInfo, 'diet': ..., 'supplement': ...}}
+    """
+    index = {}
+    wanted = set(student_ids)
+    for collection_name, plan_type in PLAN_COLLECTIONS.items():
+        for start in range(0, len(student_ids), ARRAY_CONTAINS_ANY_LIMIT):
+            chunk = student_ids[start:start + ARRAY_CONTAINS_ANY_LIMIT]
+            try:
+                plans = db.collection(collection_name) \
+                    .where('studentIds', 'array_contains_any', chunk) \
+                    .get()
+            except Exception as e:
+                logger.error(f'加载学生计划失败: {collection_name}', e)
+                continue
+
+            for plan_doc in plans:
+                plan_data = plan_doc.to_dict()
+                plan_info = StudentPlanInfo(
+                    plan_id=plan_doc.id,
+                    plan_name=plan_data.get('name', ''),
+                    plan_type=plan_type
+                )
+                for student_id in plan_data.get('studentIds', []):
+                    if student_id in wanted:
+                        # 同类型多个计划时保留第一个
+                        index.setdefault(student_id, {}).setdefault(plan_type, plan_info)
+
+    return index
+
+
+def _build_student_item(student_doc, plans: dict = None) -> StudentListItem:
+    """由学生文档构建列表项（plans 为该学生在计划索引中的条目）"""
+    student_data = student_doc.to_dict()
+    plans = plans or {}
+
+    return StudentListItem(
+        student_id=student_doc.id,
+        name=student_data.get('name', ''),
+        email=student_data.get('email', ''),
+        avatar_url=student_data.get('avatarUrl'),
+        coach_id=student_data.get('coachId'),
+        exercise_plan=plans.get('exercise'),
+        diet_plan=plans.get('diet'),
+        supplement_plan=plans.get('supplement'),
+        created_at=student_data.get('createdAt')
+    )
+
+
+def _get_plan_student_ids(db, plan_id: str) -> list:
+    """
+    读取计划的 studentIds（计划不存在时返回空列表）
+
+    不要求计划属于该教练（学生自己创建的计划同样可以筛选），
+    调用方只保留该教练名下的学生
+    """
+    for collection_name in PLAN_COLLECTIONS:
+        plan_doc = db.collection(collection_name).document(plan_id).get()
+        if plan_doc.exists:
+            return plan_doc.to_dict().get('studentIds', [])
+    return []
+
+
+def _fetch_students_filtered_by_plan(
+    db,
+    coach_id: str,
+    search_name: str,
+    filter_plan_id: str,
+    page_size: int,
+    page_number: int,
+    start_after: str = ''
+):
+    """
+    按计划筛选学生：直接读取该计划的 studentIds，批量获取学生文档
+
+    Returns:
+        (当前页学生文档列表, 总数, 是否还有更多, 下一页游标)
+    """
+    student_ids = _get_plan_student_ids(db, filter_plan_id)
+    if not student_ids:
+        return [], 0, False, None
+
+    refs = [db.collection('users').document(student_id) for student_id in student_ids]
+    matched = []
+    for student_doc in db.get_all(refs):
+        if not student_doc.exists:
+            continue
+        student_data = student_doc.to_dict()
+        if student_data.get('role') != 'student' or student_data.get('coachId') != coach_id:
+            continue
+        if search_name and not student_data.get('name', '').startswith(search_name):
+            continue
+        matched.append(student_doc)
+
+    # 与主查询保持一致的排序（name + 文档ID）
+    matched.sort(key=lambda doc: (doc.to_dict().get('name', ''), doc.id))
+
+    total_count = len(matched)
+    start_index = (page_number - 1) * page_size
+    if start_after:
+        ids = [doc.id for doc in matched]
+        if start_after not in ids:
+            raise https_fn.HttpsError('invalid-argument', '分页游标无效')
+        start_index = ids.index(start_after) + 1
+
+    end_index = start_index + page_size
+    has_more = end_index < total_count
+    page_docs = matched[start_index:end_index]
+    next_cursor = page_docs[-1].id if has_more and page_docs else None
+    return page_docs, total_count, has_more, next_cursor
+
+
 def _remove_student_from_plans(db, student_id: str, collection_name: str):
     """从所有计划中移除学生"""
     try:
@@ -395,22 +495,31 @@ def fetch_student_detail(req: https_fn.CallableRequest):
 
         db = firestore.client()
 
-        # 1. 获取基本信息
-        basic_info = _get_basic_info(student_data, student_id, db)
-
-        # 2. 获取学生计划
-        plans = _get_student_plans(db, student_id)
-
-        # 3. 计算训练统计
-        stats = _calculate_training_stats(db, student_id, time_range)
-
-        # 4. 获取体重趋势
-        weight_trend = _get_weight_trend(db, student_id, student_data, time_range)
-
-        # 5. 获取最近训练记录
-        recent_trainings = _get_recent_trainings(db, student_id, limit=3)
+        # 1. 并发读取各项相互独立的数据（耗时约等于最慢的单个查询）
+        start_date_str = _get_range_start_date(time_range)
+        results = run_concurrently({
+            'basic_info': lambda: _get_basic_info(student_data, student_id, db),
+            'exercise_plan': lambda: _get_plan_detail(db, student_id, 'exercisePlans'),
+            'diet_plan': lambda: _get_plan_detail(db, student_id, 'dietPlans'),
+            'supplement_plan': lambda: _get_plan_detail(db, student_id, 'supplementPlans'),
+            'stats': lambda: _calculate_training_stats(db, student_id, time_range),
+            'weight_change': lambda: _calculate_weight_change(db, student_id, start_date_str),
+            'weight_trend': lambda: _get_weight_trend(db, student_id, student_data, time_range),
+            'recent_trainings': lambda: _get_recent_trainings(db, student_id, limit=3),
+        }, thread_name_prefix='student-detail')
+
+        basic_info = results['basic_info']
+        plans = {
+            'exercisePlan': results['exercise_plan'],
+            'dietPlan': results['diet_plan'],
+            'supplementPlan': results['supplement_plan']
+        }
+        stats = results['stats']
+        stats['weightChange'] = results['weight_change']
+        weight_trend = results['weight_trend']
+        recent_trainings = results['recent_trainings']
 
-        # 6. 生成AI摘要
+        # 2. 生成AI摘要
         ai_summary = _generate_ai_summary(stats, weight_trend)
 
         result = {
@@ -438,6 +547,15 @@ def fetch_student_detail(req: https_fn.CallableRequest):
 
 # ==================== 学生详情辅助函数 ====================
 
+def _get_range_start_date(time_range: str) -> str:
+    """时间范围对应的起始日期（YYYY-MM-DD）"""
+    from datetime import datetime, timedelta
+
+    days_map = {'1M': 30, '3M': 90, '6M': 180, '1Y': 365}
+    days = days_map.get(time_range, 90)
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+
 def _get_basic_info(student_data: dict, student_id: str, db):
     """获取学生基本信息"""
     from datetime import datetime
@@ -492,19 +610,6 @@ def _get_basic_info(student_data: dict, student_id: str, db):
     }
 
 
-def _get_student_plans(db, student_id: str):
-    """获取学生计划信息"""
-    exercise_plan = _get_plan_detail(db, student_id, 'exercisePlans')
-    diet_plan = _get_plan_detail(db, student_id, 'dietPlans')
-    supplement_plan = _get_plan_detail(db, student_id, 'supplementPlans')
-
-    return {
-        'exercisePlan': exercise_plan,
-        'dietPlan': diet_plan,
-        'supplementPlan': supplement_plan
-    }
-
-
 def _get_plan_detail(db, student_id: str, collection_name: str):
     """获取计划详细信息"""
     try:
@@ -531,57 +636,37 @@ def _get_plan_detail(db, student_id: str, collection_name: str):
 
 
 def _calculate_training_stats(db, student_id: str, time_range: str):
-    """计算训练统计数据"""
-    from datetime import datetime, timedelta
-
-    # 计算时间范围
-    end_date = datetime.now()
-    days_map = {'1M': 30, '3M': 90, '6M': 180, '1Y': 365}
-    days = days_map.get(time_range, 90)
-    start_date = end_date - timedelta(days=days)
+    """计算训练统计数据（不含体重变化）"""
+    from datetime import datetime
 
-    start_date_str = start_date.strftime('%Y-%m-%d')
+    start_date_str = _get_range_start_date(time_range)
 
     try:
-        # 获取时间范围内的训练记录
-        trainings = db.collection('dailyTrainings') \
-            .where('studentID', '==', student_id) \
-            .where('date', '>=', start_date_str) \
-            .get()
+        # 读取时间范围内的周汇总（trainingRollups），无需扫描原始训练记录
+        end_date_str = datetime.now().strftime('%Y-%m-%d')
+        rollups = get_range_rollups(db, student_id, start_date_str, end_date_str)
 
         total_sessions = 0
         completed_sessions = 0
         total_volume = 0  # 总训练容量（kg）
 
-        for training_doc in trainings:
-            training_data = training_doc.to_dict()
+        for _, day in iter_rollup_days(rollups, start_date_str, end_date_str):
             total_sessions += 1
 
             # 统计完成的训练
-            if training_data.get('completionStatus') in ['completed', 'partial']:
+            if day.get('completed'):
                 completed_sessions += 1
 
-            # 计算训练容量
-            exercises = training_data.get('exercises', [])
-            for exercise in exercises:
-                sets = exercise.get('sets', [])
-                for set_data in sets:
-                    try:
-                        weight = float(set_data.get('weight', 0) or 0)
-                        reps = float(set_data.get('reps', 0) or 0)
-                        total_volume += weight * reps
-                    except (ValueError, TypeError):
-                        continue
+            # 累加训练容量
+            total_volume += day.get('volume', 0)
 
         # 计算完成率
         adherence_rate = (completed_sessions / total_sessions * 100) if total_sessions > 0 else 0
 
-        # 获取体重变化
-        weight_change = _calculate_weight_change(db, student_id, start_date_str)
-
+        # weightChange 由调用方通过 _calculate_weight_change 并发获取后填入
         return {
             'totalSessions': total_sessions,
-            'weightChange': weight_change,
+            'weightChange': 0,
             'adherenceRate': round(adherence_rate, 1),
             'totalVolume': round(total_volume, 1)
         }
@@ -637,15 +722,9 @@ def _calculate_weight_change(db, student_id: str, start_date_str: str):
 
 def _get_weight_trend(db, student_id: str, student_data: dict, time_range: str):
     """获取体重趋势数据"""
-    from datetime import datetime, timedelta
-
-    # 计算时间范围
-    end_date = datetime.now()
-    days_map = {'1M': 30, '3M': 90, '6M': 180, '1Y': 365}
-    days = days_map.get(time_range, 90)
-    start_date = end_date - timedelta(days=days)
+    from datetime import datetime
 
-    start_date_str = start_date.strftime('%Y-%m-%d')
+    start_date_str = _get_range_start_date(time_range)
 
     try:
         # 获取时间范围内的体重数据
@@ -697,6 +776,7 @@ def _get_recent_trainings(db, student_id: str, limit: int = 3):
             .where('studentID', '==', student_id) \
             .order_by('date', direction=firestore.Query.DESCENDING) \
             .limit(limit) \
+            .select(RECENT_TRAINING_FIELDS) \
             .get()
 
         recent_trainings = []
@@ -705,10 +785,10 @@ def _get_recent_trainings(db, student_id: str, limit: int = 3):
             exercises = training_data.get('exercises', [])
 
             # 计算视频数量
-            video_count = 0
-            for exercise in exercises:
-                videos = exercise.get('medias', exercise.get('videos', []))
-                video_count += len(videos)
+            video_count = sum(
+                len(exercise.get('medias', exercise.get('videos', [])))
+                for exercise in exercises
+            )
 
             # 获取训练标题（从planSelection获取）
             title = 'Training Session'
@@ -815,13 +895,18 @@ def generate_student_ai_summary(req: https_fn.CallableRequest):
 
         db = firestore.client()
 
-        # 1. 计算训练统计
-        stats = _calculate_training_stats(db, student_id, time_range)
-
-        # 2. 获取体重趋势
-        weight_trend = _get_weight_trend(db, student_id, student_data, time_range)
-
-        # 3. 生成AI摘要
+        # 1. 并发计算训练统计、体重变化和体重趋势
+        start_date_str = _get_range_start_date(time_range)
+        results = run_concurrently({
+            'stats': lambda: _calculate_training_stats(db, student_id, time_range),
+            'weight_change': lambda: _calculate_weight_change(db, student_id, start_date_str),
+            'weight_trend': lambda: _get_weight_trend(db, student_id, student_data, time_range),
+        }, thread_name_prefix='student-summary')
+        stats = results['stats']
+        stats['weightChange'] = results['weight_change']
+        weight_trend = results['weight_trend']
+
+        # 2. 生成AI摘要
         ai_summary = _generate_ai_summary(stats, weight_trend)
 
         logger.info(f'✅ 生成AI摘要成功: {student_id}')
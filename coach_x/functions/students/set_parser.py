@@ -0,0 +1,105 @@
+"""
+训练组数值解析（带记忆缓存）
+
+"100kg"、"8-12"、"225lbs" 这类字面量在 dailyTrainings 中大量重复出现，
+解析结果按规范化后的字符串缓存（有界 LRU），所有统计路径共享同一份缓存。
+解析结果为不可变的 float / int / tuple，可以安全复用。
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+# 缓存条目上限（不同字面量的数量远小于该值）
+PARSE_CACHE_SIZE = 4096
+
+_WEIGHT_PATTERN = re.compile(r'([0-9.]+)\s*(kg|lbs|lb)?')
+
+
+def parse_weight_string(weight_str: str) -> Tuple[float, str]:
+    """
+    解析重量字符串，提取数值和单位
+
+    参数:
+        weight_str: 如 "100kg", "225lbs", "50"（数字也可以）
+
+    返回:
+        (value: float, unit: str) 元组
+    """
+    if not weight_str:
+        return (0.0, '')
+    return _parse_weight_cached(str(weight_str).strip().lower())
+
+
+def parse_reps_string(reps_str: str) -> int:
+    """
+    解析次数字符串
+
+    参数:
+        reps_str: 如 "10", "8-12"（数字也可以）
+
+    返回:
+        int (单值或范围平均值)
+    """
+    if not reps_str:
+        return 0
+    return _parse_reps_cached(str(reps_str).strip())
+
+
+def get_parse_cache_stats() -> Dict[str, Any]:
+    """解析缓存命中统计"""
+    stats = {}
+    for name, cached in (('weight', _parse_weight_cached), ('reps', _parse_reps_cached)):
+        info = cached.cache_info()
+        total = info.hits + info.misses
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'hit_rate': round(info.hits / total, 4) if total else 0.0,
+        }
+    return stats
+
+
+def clear_parse_cache():
+    """清空解析缓存及统计"""
+    _parse_weight_cached.cache_clear()
+    _parse_reps_cached.cache_clear()
+
+
+# ==================== 内部实现 ====================
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_weight_cached(text: str) -> Tuple[float, str]:
+    match = _WEIGHT_PATTERN.match(text)
+    if not match:
+        return (0.0, '')
+
+    try:
+        value = float(match.group(1))
+    except ValueError:
+        # 如 "1.2.3"
+        return (0.0, '')
+
+    unit = match.group(2) or ''
+    # 统一 lb 为 lbs
+    if unit == 'lb':
+        unit = 'lbs'
+    return (value, unit)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_reps_cached(text: str) -> int:
+    # 检查是否为范围格式 "8-12"
+    if '-' in text:
+        parts = text.split('-')
+        if len(parts) == 2:
+            try:
+                return (int(parts[0]) + int(parts[1])) // 2
+            except ValueError:
+                return 0
+
+    # 单个数字
+    try:
+        return int(text)
+    except ValueError:
+        return 0
@@ -0,0 +1,237 @@
+"""
+训练数据分析引擎
+
+把一段时间窗口内的训练记录一次性解析为列式 NumPy 数组（每组一行）：
+
+- weight_kg: 统一换算为 kg 的重量
+- reps: 次数
+- exercise_idx / date_idx: 动作、日期编号
+
+训练量、e1RM（Epley 公式）和最佳组均在数组上向量化计算；
+重量/次数字符串先在窗口内去重，再经 set_parser 的跨请求记忆缓存解析。
+"""
+from typing import Dict, Any, List, Iterable, Optional
+
+import numpy as np
+
+from .set_parser import parse_weight_string, parse_reps_string
+
+# 1 lbs = 0.45359237 kg
+LBS_TO_KG = 0.45359237
+
+DEFAULT_UNIT = 'kg'
+
+
+def to_kg(value: float, unit: str) -> float:
+    """按单位换算为 kg（无单位视为 kg）"""
+    return value * LBS_TO_KG if unit == 'lbs' else value
+
+
+def from_kg(value_kg: float, unit: str) -> float:
+    """把 kg 换算回显示单位"""
+    return value_kg / LBS_TO_KG if unit == 'lbs' else value_kg
+
+
+def estimate_1rm(weight, reps):
+    """Epley 公式估算 1RM（支持标量或数组；1 次即为重量本身，0 次为 0）"""
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    e1rm = np.where(reps > 1, weight * (1.0 + reps / 30.0), weight)
+    return np.where(reps > 0, e1rm, 0.0)
+
+
+class TrainingSets:
+    """
+    训练窗口的列式组数据
+
+    示例：
+        sets = TrainingSets.from_trainings(trainings)
+        volumes = sets.volume_by_date_exercise()
+        best = sets.best_sets()
+    """
+
+    def __init__(
+        self,
+        dates: List[str],
+        exercises: List[str],
+        date_idx: np.ndarray,
+        exercise_idx: np.ndarray,
+        weight: np.ndarray,
+        weight_kg: np.ndarray,
+        reps: np.ndarray,
+        units: np.ndarray,
+        unit_names: List[str],
+    ):
+        self.dates = dates
+        self.exercises = exercises
+        self.date_idx = date_idx
+        self.exercise_idx = exercise_idx
+        self.weight = weight
+        self.weight_kg = weight_kg
+        self.reps = reps
+        # 每组的单位编号（unit_names 的下标）
+        self.units = units
+        self.unit_names = unit_names
+
+    @classmethod
+    def from_trainings(cls, trainings: Iterable[Dict[str, Any]]) -> 'TrainingSets':
+        """
+        解析训练记录（dailyTrainings 文档数据）
+
+        没有日期、动作名或组的数据会被忽略
+        """
+        dates: Dict[str, int] = {}
+        exercises: Dict[str, int] = {}
+        date_idx: List[int] = []
+        exercise_idx: List[int] = []
+        weight_strs: List[str] = []
+        reps_strs: List[str] = []
+
+        for training in trainings:
+            date = training.get('date')
+            if not date:
+                continue
+            for exercise in training.get('exercises') or []:
+                name = exercise.get('name', '')
+                sets = exercise.get('sets') or []
+                if not name or not sets:
+                    continue
+                d = dates.setdefault(date, len(dates))
+                e = exercises.setdefault(name, len(exercises))
+                for set_data in sets:
+                    date_idx.append(d)
+                    exercise_idx.append(e)
+                    weight_strs.append(str(set_data.get('weight', '') or ''))
+                    reps_strs.append(str(set_data.get('reps', '') or ''))
+
+        weight, units, unit_names = _parse_weights(weight_strs)
+        lbs = unit_names.index('lbs') if 'lbs' in unit_names else -1
+        weight_kg = np.where(units == lbs, weight * LBS_TO_KG, weight)
+
+        return cls(
+            dates=list(dates),
+            exercises=list(exercises),
+            date_idx=np.asarray(date_idx, dtype=np.int32),
+            exercise_idx=np.asarray(exercise_idx, dtype=np.int32),
+            weight=weight,
+            weight_kg=weight_kg,
+            reps=_parse_reps(reps_strs),
+            units=units,
+            unit_names=unit_names,
+        )
+
+    def __len__(self) -> int:
+        return len(self.reps)
+
+    # ==================== 派生列 ====================
+
+    @property
+    def volume_kg(self) -> np.ndarray:
+        """每组训练量（kg × 次数）"""
+        return self.weight_kg * self.reps
+
+    @property
+    def e1rm_kg(self) -> np.ndarray:
+        """每组估算 1RM（kg）"""
+        return estimate_1rm(self.weight_kg, self.reps)
+
+    # ==================== 聚合 ====================
+
+    def volume_by_date_exercise(self) -> np.ndarray:
+        """(日期, 动作) 训练量矩阵（kg）"""
+        key = self.date_idx.astype(np.int64) * len(self.exercises) + self.exercise_idx
+        totals = np.bincount(key, weights=self.volume_kg, minlength=len(self.dates) * len(self.exercises))
+        return totals.reshape(len(self.dates), len(self.exercises))
+
+    def best_sets(self, by_date: bool = False) -> Dict[Any, Dict[str, Any]]:
+        """
+        各动作 e1RM 最高的一组（并列时重量优先，其次次数；忽略 0 次的组）
+
+        Args:
+            by_date: True 时按 (日期, 动作) 分组，键为 (date, name)
+
+        Returns:
+            {name 或 (date, name): {'weight', 'reps', 'unit', 'e1rmKg', 'date'}}
+        """
+        valid = np.flatnonzero(self.reps > 0)
+        if len(valid) == 0:
+            return {}
+
+        key = self.exercise_idx[valid].astype(np.int64)
+        if by_date:
+            key = self.date_idx[valid].astype(np.int64) * len(self.exercises) + key
+
+        e1rm = self.e1rm_kg[valid]
+        # lexsort 以最后一个键为主键：分组键 -> e1RM -> 重量 -> 次数，每组最后一行即最佳组
+        order = np.lexsort((self.reps[valid], self.weight_kg[valid], e1rm, key))
+        sorted_key = key[order]
+        last = np.r_[sorted_key[1:] != sorted_key[:-1], True]
+
+        best = {}
+        for position in order[last]:
+            i = valid[position]
+            name = self.exercises[self.exercise_idx[i]]
+            date = self.dates[self.date_idx[i]]
+            best[(date, name) if by_date else name] = {
+                'weight': float(self.weight[i]),
+                'reps': int(self.reps[i]),
+                'unit': self.unit_names[self.units[i]],
+                'e1rmKg': round(float(e1rm[position]), 1),
+                'date': date,
+            }
+        return best
+
+
+def volume_pr(
+    current: Dict[str, Dict[str, Any]],
+    previous: Dict[str, Dict[str, Any]],
+    order: Optional[List[str]] = None
+) -> Optional[str]:
+    """
+    两周都练过的动作中训练量提升最多的一个（换算为 kg 比较，并列时取 order 中靠前的）
+
+    Args:
+        current: 本周 {动作名: {'volume', 'unit'}}（周汇总的 exercises）
+        previous: 上周 {动作名: {'volume', 'unit'}}
+        order: 动作顺序（周汇总的 exerciseOrder，默认取 current 的顺序）
+
+    Returns:
+        动作名；没有两周都练过的动作时返回 None
+    """
+    names = [name for name in (order or current) if name in current and name in previous]
+    if not names:
+        return None
+
+    def volume_kg(entry: Dict[str, Any]) -> float:
+        return to_kg(entry.get('volume', 0), entry.get('unit', ''))
+
+    return max(names, key=lambda name: volume_kg(current[name]) - volume_kg(previous[name]))
+
+
+# ==================== 解析（按去重后的取值） ====================
+
+def _parse_weights(weight_strs: List[str]):
+    """解析重量字符串列，返回 (数值数组, 单位编号数组, 单位名列表)"""
+    unit_names = ['']
+    if not weight_strs:
+        return np.zeros(0), np.zeros(0, dtype=np.int8), unit_names
+
+    unique, inverse = np.unique(np.asarray(weight_strs, dtype=object), return_inverse=True)
+    values = np.zeros(len(unique))
+    units = np.zeros(len(unique), dtype=np.int8)
+    for i, text in enumerate(unique):
+        value, unit = parse_weight_string(text)
+        values[i] = value
+        if unit not in unit_names:
+            unit_names.append(unit)
+        units[i] = unit_names.index(unit)
+    return values[inverse], units[inverse], unit_names
+
+
+def _parse_reps(reps_strs: List[str]) -> np.ndarray:
+    """解析次数字符串列"""
+    if not reps_strs:
+        return np.zeros(0, dtype=np.int32)
+    unique, inverse = np.unique(np.asarray(reps_strs, dtype=object), return_inverse=True)
+    values = np.fromiter((parse_reps_string(text) for text in unique), dtype=np.int32, count=len(unique))
+    return values[inverse]
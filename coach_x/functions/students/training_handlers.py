@@ -6,10 +6,11 @@ from firebase_admin import firestore
 from google.cloud.firestore import SERVER_TIMESTAMP
 from utils import logger, db_helper
 from utils.param_parser import unwrap_protobuf_values
+from utils.concurrency import run_concurrently
+from .training_analytics import volume_pr, to_kg, from_kg
 from typing import Dict, Any, Tuple, Optional, List
 from datetime import datetime, timedelta
 import tempfile
-import re
 
 
 @https_fn.on_call()
@@ -215,96 +216,6 @@ def get_week_range(date: datetime) -> Tuple[str, str]:
     )
 
 
-def parse_weight_string(weight_str: str) -> Tuple[float, str]:
-    """
-    解析重量字符串，提取数值和单位
-
-    参数:
-        weight_str: 如 "100kg", "225lbs", "50"
-
-    返回:
-        (value: float, unit: str) 元组
-    """
-    if not weight_str:
-        return (0.0, '')
-
-    # 使用正则提取数字部分和单位部分
-    match = re.match(r'([0-9.]+)\s*(kg|lbs|lb)?', weight_str.strip().lower())
-
-    if match:
-        value = float(match.group(1))
-        unit = match.group(2) or ''
-        # 统一 lb 为 lbs
-        if unit == 'lb':
-            unit = 'lbs'
-        return (value, unit)
-
-    return (0.0, '')
-
-
-def parse_reps_string(reps_str: str) -> int:
-    """
-    解析次数字符串
-
-    参数:
-        reps_str: 如 "10", "8-12"
-
-    返回:
-        int (单值或范围平均值)
-    """
-    if not reps_str:
-        return 0
-
-    reps_str = reps_str.strip()
-
-    # 检查是否为范围格式 "8-12"
-    if '-' in reps_str:
-        parts = reps_str.split('-')
-        if len(parts) == 2:
-            try:
-                min_reps = int(parts[0])
-                max_reps = int(parts[1])
-                return (min_reps + max_reps) // 2
-            except ValueError:
-                return 0
-
-    # 单个数字
-    try:
-        return int(reps_str)
-    except ValueError:
-        return 0
-
-
-def calculate_volume(sets: List[Dict[str, Any]]) -> Tuple[float, str]:
-    """
-    计算训练量 (Volume = weight × reps × sets_count)
-
-    参数:
-        sets: TrainingSet[] 列表
-
-    返回:
-        (total_volume: float, unit: str) 元组
-    """
-    total_volume = 0.0
-    unit = ''
-
-    for set_data in sets:
-        weight_str = set_data.get('weight', '')
-        reps_str = set_data.get('reps', '')
-
-        weight_value, weight_unit = parse_weight_string(weight_str)
-        reps_value = parse_reps_string(reps_str)
-
-        # 累加 volume
-        total_volume += weight_value * reps_value
-
-        # 记录单位（取第一个非空单位）
-        if not unit and weight_unit:
-            unit = weight_unit
-
-    return (total_volume, unit)
-
-
 # ==================== 主函数 ====================
 
 
@@ -375,58 +286,38 @@ def fetch_weekly_home_stats(req: https_fn.CallableRequest):
 
         db = firestore.client()
 
-        # 查询本周的 dailyTrainings 记录
-        this_week_trainings = db.collection('dailyTrainings') \
-            .where('studentID', '==', student_id) \
-            .where('date', '>=', this_week_start) \
-            .where('date', '<=', this_week_end) \
-            .get()
+        # 并发读取：14 天训练汇总（本周 + 上周，缺失时一次投影查询重建）和体重记录
+        from .training_rollups import get_range_rollups
+        results = run_concurrently({
+            'rollups': lambda: get_range_rollups(db, student_id, last_week_start, this_week_end),
+            'weight_change': lambda: _calculate_weight_change(db, student_id),
+        }, thread_name_prefix='home-stats')
+        last_week_rollup, this_week_rollup = results['rollups']
 
-        # 查询上周的 dailyTrainings 记录
-        last_week_trainings = db.collection('dailyTrainings') \
-            .where('studentID', '==', student_id) \
-            .where('date', '>=', last_week_start) \
-            .where('date', '<=', last_week_end) \
-            .get()
-
-
-        # 转换为字典，方便处理
-        this_week_trainings_dict = {}
-        for doc in this_week_trainings:
-            data = doc.to_dict()
-            data['id'] = doc.id
-            this_week_trainings_dict[data['date']] = data
-
-        last_week_trainings_dict = {}
-        for doc in last_week_trainings:
-            data = doc.to_dict()
-            data['id'] = doc.id
-            last_week_trainings_dict[data['date']] = data
-
-        logger.info(f'本周训练记录: {len(this_week_trainings_dict)}天')
-        logger.info(f'上周训练记录: {len(last_week_trainings_dict)}天')
+        logger.info(f'本周训练记录: {this_week_rollup["daysTrained"]}天')
+        logger.info(f'上周训练记录: {last_week_rollup["daysTrained"]}天')
 
         # ==================== 计算统计数据 ====================
 
-        # 1. 体重变化统计（查询最近 N 条记录）
-        weight_change_stats = _calculate_weight_change(db, student_id)
+        # 1. 体重变化统计（最近 N 条记录，已并发读取）
+        weight_change_stats = results['weight_change']
 
         # 2. 卡路里变化统计
         calories_change_stats = _calculate_calories_change(
-            this_week_trainings_dict,
-            last_week_trainings_dict
+            this_week_rollup,
+            last_week_rollup
         )
 
         # 3. Volume PR 统计
         volume_pr_stats = _calculate_volume_pr(
-            this_week_trainings_dict,
-            last_week_trainings_dict
+            this_week_rollup,
+            last_week_rollup
         )
 
         # 4. 构建本周训练摘要（7天）
         trainings_summary = _build_trainings_summary(
             this_week_start,
-            this_week_trainings_dict
+            this_week_rollup['days']
         )
 
         # ==================== 构建返回数据 ====================
@@ -535,29 +426,12 @@ def _calculate_weight_change(
 
 
 def _calculate_calories_change(
-    this_week_trainings: Dict[str, Dict[str, Any]],
-    last_week_trainings: Dict[str, Dict[str, Any]]
+    this_week_rollup: Dict[str, Any],
+    last_week_rollup: Dict[str, Any]
 ) -> Dict[str, Any]:
-    """计算卡路里变化统计"""
-    # 计算本周总卡路里（从 meals 累加）
-    this_week_total = 0.0
-    for training in this_week_trainings.values():
-        diet = training.get('diet', {})
-        if diet:
-            meals = diet.get('meals', [])
-            for meal in meals:
-                meal_macros = meal.get('macros', {})
-                this_week_total += meal_macros.get('calories', 0)
-
-    # 计算上周总卡路里（从 meals 累加）
-    last_week_total = 0.0
-    for training in last_week_trainings.values():
-        diet = training.get('diet', {})
-        if diet:
-            meals = diet.get('meals', [])
-            for meal in meals:
-                meal_macros = meal.get('macros', {})
-                last_week_total += meal_macros.get('calories', 0)
+    """计算卡路里变化统计（周汇总中已按餐次累加）"""
+    this_week_total = this_week_rollup.get('calories', 0)
+    last_week_total = last_week_rollup.get('calories', 0)
 
     has_data = this_week_total > 0 or last_week_total > 0
 
@@ -583,57 +457,36 @@ def _calculate_calories_change(
 
 
 def _calculate_volume_pr(
-    this_week_trainings: Dict[str, Dict[str, Any]],
-    last_week_trainings: Dict[str, Dict[str, Any]]
+    this_week_rollup: Dict[str, Any],
+    last_week_rollup: Dict[str, Any]
 ) -> Dict[str, Any]:
-    """计算 Volume PR 统计（选一个动作示例）"""
-    # 收集本周所有动作的 Volume
-    this_week_volumes = {}
-    for training in this_week_trainings.values():
-        exercises = training.get('exercises', [])
-        if exercises:
-            for exercise in exercises:
-                name = exercise.get('name', '')
-                sets = exercise.get('sets', [])
-                if name and sets:
-                    volume, unit = calculate_volume(sets)
-                    if name not in this_week_volumes:
-                        this_week_volumes[name] = {'total': 0.0, 'unit': unit}
-                    this_week_volumes[name]['total'] += volume
-
-    # 收集上周所有动作的 Volume
-    last_week_volumes = {}
-    for training in last_week_trainings.values():
-        exercises = training.get('exercises', [])
-        if exercises:
-            for exercise in exercises:
-                name = exercise.get('name', '')
-                sets = exercise.get('sets', [])
-                if name and sets:
-                    volume, unit = calculate_volume(sets)
-                    if name not in last_week_volumes:
-                        last_week_volumes[name] = {'total': 0.0, 'unit': unit}
-                    last_week_volumes[name]['total'] += volume
-
-    # 找到第一个在两周都出现的动作
-    for exercise_name in this_week_volumes.keys():
-        if exercise_name in last_week_volumes:
-            this_week_vol = this_week_volumes[exercise_name]['total']
-            last_week_vol = last_week_volumes[exercise_name]['total']
-            unit = this_week_volumes[exercise_name]['unit']
-
-            improvement = round(this_week_vol - last_week_vol, 0)
-
-            return {
-                'exerciseName': exercise_name,
-                'currentWeekVolume': round(this_week_vol, 0),
-                'lastWeekVolume': round(last_week_vol, 0),
-                'improvement': improvement,
-                'unit': unit,
-                'hasData': True
-            }
+    """计算 Volume PR 统计（两周都练过的动作中训练量提升最多的一个）"""
+    this_week_volumes = this_week_rollup.get('exercises', {})
+    last_week_volumes = last_week_rollup.get('exercises', {})
+
+    exercise_name = volume_pr(
+        this_week_volumes,
+        last_week_volumes,
+        this_week_rollup.get('exerciseOrder')
+    )
+
+    if exercise_name:
+        unit = this_week_volumes[exercise_name]['unit']
+        this_week_vol = this_week_volumes[exercise_name]['volume']
+        # 上周可能以其他单位记录，换算为本周的显示单位
+        last_week_entry = last_week_volumes[exercise_name]
+        last_week_vol = from_kg(to_kg(last_week_entry['volume'], last_week_entry.get('unit', '')), unit)
+
+        return {
+            'exerciseName': exercise_name,
+            'currentWeekVolume': round(this_week_vol, 0),
+            'lastWeekVolume': round(last_week_vol, 0),
+            'improvement': round(this_week_vol - last_week_vol, 0),
+            'unit': unit,
+            'hasData': True
+        }
 
-    # 没有找到匹配的动作
+    # 没有两周都练过的动作
     return {
         'exerciseName': None,
         'currentWeekVolume': None,
@@ -648,7 +501,7 @@ def _build_trainings_summary(
     week_start: str,
     trainings_dict: Dict[str, Dict[str, Any]]
 ) -> List[Dict[str, Any]]:
-    """构建本周训练摘要（7天，周一到周日）"""
+    """构建本周训练摘要（7天，周一到周日；trainings_dict 以日期为键）"""
     summary = []
     start_date = datetime.strptime(week_start, '%Y-%m-%d')
 
@@ -0,0 +1,389 @@
+"""
+学生每周训练汇总（trainingRollups）
+
+按 ISO 周物化每个学生的训练汇总，文档 ID 为 {studentId}_{isoWeek}（如 abc_2025-W03）：
+
+- days: {日期: 当日汇总}，当日汇总包含训练量、卡路里、完成状态和各动作最佳组（按 e1RM）
+- daysTrained / totalVolume / calories / exercises: 由 days 重新聚合得到的周汇总
+
+dailyTrainings 的创建/更新触发器只重新解析发生变化的那一天，再从 days 重新聚合，
+重复投递的触发器也是幂等的。首页和教练端统计读取一两个汇总文档即可，无需扫描原始训练记录。
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from firebase_admin import firestore
+from utils import logger
+import numpy as np
+
+from .training_analytics import TrainingSets, from_kg
+from .set_parser import get_parse_cache_stats
+
+COLLECTION = 'trainingRollups'
+
+# 汇总结构版本（结构变化时旧文档会被重建）
+ROLLUP_VERSION = 2
+
+# 重建汇总时只投影需要的字段（不读取补充剂、审阅批注等）
+TRAINING_FIELDS = ['studentID', 'date', 'completionStatus', 'exercises', 'diet.meals']
+
+
+# ==================== 日期与文档 ID ====================
+
+def get_week_bounds(date_str: str) -> Tuple[str, str, str]:
+    """
+    获取日期所在 ISO 周
+
+    Returns:
+        (iso_week, week_start, week_end)，如 ('2025-W03', '2025-01-13', '2025-01-19')
+    """
+    date = datetime.strptime(date_str, '%Y-%m-%d')
+    iso_year, iso_week, _ = date.isocalendar()
+    week_start = date - timedelta(days=date.weekday())
+    week_end = week_start + timedelta(days=6)
+    return (
+        f'{iso_year}-W{iso_week:02d}',
+        week_start.strftime('%Y-%m-%d'),
+        week_end.strftime('%Y-%m-%d')
+    )
+
+
+def rollup_doc_id(student_id: str, date_str: str) -> str:
+    """日期所在周的汇总文档 ID"""
+    iso_week, _, _ = get_week_bounds(date_str)
+    return f'{student_id}_{iso_week}'
+
+
+# ==================== 汇总计算 ====================
+
+def summarize_training(training_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析一条 dailyTrainings 记录，得到当日汇总
+
+    Returns:
+        {
+            'volume': 总训练量（显示单位）,
+            'unit': 重量单位,
+            'calories': 饮食卡路里,
+            'completed': 是否完成（completed/partial）,
+            'exercises': [{'name', 'volume', 'unit', 'bestSet'}]
+        }
+    """
+    date = training_data.get('date') or '-'
+    return summarize_trainings([dict(training_data, date=date)])[date]
+
+
+def summarize_trainings(trainings: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    批量解析训练记录（整个窗口的组数据一次性向量化计算）
+
+    Returns:
+        {日期: 当日汇总}（同一日期有多条记录时以最后一条为准）
+    """
+    trainings = [data for data in trainings if data.get('date')]
+    sets = TrainingSets.from_trainings(trainings)
+    date_pos = {date: i for i, date in enumerate(sets.dates)}
+    exercise_pos = {name: i for i, name in enumerate(sets.exercises)}
+    volumes = sets.volume_by_date_exercise()
+    best_sets = sets.best_sets(by_date=True)
+    units = _first_units(sets)
+
+    days = {}
+    for data in trainings:
+        date = data['date']
+        exercises = []
+        day_volume_kg = 0.0
+        day_unit = ''
+        seen = set()
+
+        for exercise in data.get('exercises') or []:
+            name = exercise.get('name', '')
+            if not name or not exercise.get('sets') or name in seen:
+                continue
+            seen.add(name)
+
+            volume_kg = float(volumes[date_pos[date], exercise_pos[name]])
+            unit = units.get((date, name), '')
+            best_set = best_sets.get((date, name))
+            if best_set:
+                best_set = {key: best_set[key] for key in ('weight', 'reps', 'unit', 'e1rmKg')}
+
+            exercises.append({
+                'name': name,
+                'volume': round(from_kg(volume_kg, unit), 1),
+                'unit': unit,
+                'bestSet': best_set
+            })
+            day_volume_kg += volume_kg
+            if not day_unit and unit:
+                day_unit = unit
+
+        calories = 0.0
+        diet = data.get('diet') or {}
+        for meal in diet.get('meals') or []:
+            calories += (meal.get('macros') or {}).get('calories', 0) or 0
+
+        days[date] = {
+            'volume': round(from_kg(day_volume_kg, day_unit), 1),
+            'unit': day_unit,
+            'calories': round(calories, 1),
+            'completed': data.get('completionStatus') in ['completed', 'partial'],
+            'exercises': exercises
+        }
+
+    return days
+
+
+def _first_units(sets: TrainingSets) -> Dict[Tuple[str, str], str]:
+    """每个 (日期, 动作) 第一个带单位的组的单位"""
+    with_unit = np.flatnonzero(sets.units > 0)
+    key = sets.date_idx[with_unit].astype(np.int64) * max(1, len(sets.exercises)) + sets.exercise_idx[with_unit]
+    _, first = np.unique(key, return_index=True)
+
+    units = {}
+    for position in first:
+        i = with_unit[position]
+        units[(sets.dates[sets.date_idx[i]], sets.exercises[sets.exercise_idx[i]])] = \
+            sets.unit_names[sets.units[i]]
+    return units
+
+
+def build_rollup(student_id: str, date_str: str, days: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """由当周各日汇总重新聚合出周汇总文档"""
+    iso_week, week_start, week_end = get_week_bounds(date_str)
+
+    total_volume = 0.0
+    calories = 0.0
+    unit = ''
+    exercise_order: List[str] = []
+    exercises: Dict[str, Dict[str, Any]] = {}
+
+    for date in sorted(days):
+        day = days[date]
+        total_volume += day.get('volume', 0)
+        calories += day.get('calories', 0)
+        if not unit and day.get('unit'):
+            unit = day['unit']
+
+        for exercise in day.get('exercises', []):
+            name = exercise['name']
+            if name not in exercises:
+                exercise_order.append(name)
+                exercises[name] = {'volume': 0.0, 'unit': exercise.get('unit', ''), 'bestSet': None}
+
+            entry = exercises[name]
+            entry['volume'] = round(entry['volume'] + exercise.get('volume', 0), 1)
+            best_set = exercise.get('bestSet')
+            current = entry['bestSet']
+            if best_set and (current is None or best_set['e1rmKg'] > current['e1rmKg']):
+                entry['bestSet'] = dict(best_set, date=date)
+
+    return {
+        'studentId': student_id,
+        'isoWeek': iso_week,
+        'weekStart': week_start,
+        'weekEnd': week_end,
+        'days': days,
+        'daysTrained': len(days),
+        'totalVolume': round(total_volume, 1),
+        'unit': unit or 'kg',
+        'calories': round(calories, 1),
+        'exerciseOrder': exercise_order,
+        'exercises': exercises,
+        'version': ROLLUP_VERSION,
+        'updatedAt': firestore.SERVER_TIMESTAMP
+    }
+
+
+# ==================== 触发器增量维护 ====================
+
+def apply_training_change(
+    before: Optional[Dict[str, Any]],
+    after: Optional[Dict[str, Any]]
+) -> None:
+    """
+    根据 dailyTrainings 的变化增量更新周汇总
+
+    Args:
+        before: 变化前的文档数据（创建时为 None）
+        after: 变化后的文档数据（删除时为 None）
+    """
+    before_key = _training_key(before)
+    after_key = _training_key(after)
+
+    if before_key and before_key == after_key and \
+            summarize_training(before) == summarize_training(after):
+        # 只改了审阅状态、关键帧等与汇总无关的字段
+        return
+
+    db = firestore.client()
+
+    # 日期或学生发生变化时，从旧的周汇总中移除
+    if before_key and before_key != after_key:
+        _update_day(db, before_key[0], before_key[1], None)
+
+    if after_key:
+        _update_day(db, after_key[0], after_key[1], summarize_training(after))
+
+
+def _training_key(data: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """(studentID, date)，字段缺失或日期无效时返回 None"""
+    if not data:
+        return None
+    student_id = data.get('studentID')
+    date_str = data.get('date')
+    if not student_id or not date_str:
+        return None
+    try:
+        datetime.strptime(date_str, '%Y-%m-%d')
+    except (ValueError, TypeError):
+        return None
+    return (student_id, date_str)
+
+
+def _update_day(db, student_id: str, date_str: str, day_summary: Optional[Dict[str, Any]]):
+    """在事务中更新某一天的汇总并重新聚合"""
+    ref = db.collection(COLLECTION).document(rollup_doc_id(student_id, date_str))
+
+    @firestore.transactional
+    def update_in_transaction(transaction):
+        snapshot = ref.get(transaction=transaction)
+        data = snapshot.to_dict() if snapshot.exists else None
+
+        if data and data.get('version') == ROLLUP_VERSION:
+            days = dict(data.get('days') or {})
+        else:
+            # 首次写入（或结构升级）：从原始记录重建整周，避免丢失历史数据
+            days = _load_week_days(db, student_id, date_str, transaction=transaction)
+
+        if day_summary is None:
+            days.pop(date_str, None)
+        else:
+            days[date_str] = day_summary
+
+        transaction.set(ref, build_rollup(student_id, date_str, days))
+
+    update_in_transaction(db.transaction())
+    logger.info(f'📦 训练汇总已更新: {ref.id} ({date_str})')
+
+
+def _load_week_days(db, student_id: str, date_str: str, transaction=None) -> Dict[str, Dict[str, Any]]:
+    """扫描原始训练记录，得到整周的各日汇总"""
+    _, week_start, week_end = get_week_bounds(date_str)
+    query = db.collection('dailyTrainings') \
+        .where('studentID', '==', student_id) \
+        .where('date', '>=', week_start) \
+        .where('date', '<=', week_end) \
+        .select(TRAINING_FIELDS)
+
+    docs = query.get(transaction=transaction) if transaction else query.get()
+    return summarize_trainings([
+        data for data in (doc.to_dict() for doc in docs) if _training_key(data)
+    ])
+
+
+# ==================== 读取 ====================
+
+def get_range_rollups(db, student_id: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """
+    读取覆盖 [start_date, end_date] 的所有周汇总（按周排序）
+
+    缺失的周用一次原始记录查询（按整周对齐）重建，并在事务中写回，之后的请求只读汇总文档
+    """
+    week_dates = []
+    current = datetime.strptime(get_week_bounds(start_date)[1], '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    while current <= end:
+        week_dates.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=7)
+
+    refs = [db.collection(COLLECTION).document(rollup_doc_id(student_id, date)) for date in week_dates]
+    snapshots = {snapshot.id: snapshot for snapshot in db.get_all(refs)}
+
+    rollups = {}
+    missing = []
+    for date, ref in zip(week_dates, refs):
+        snapshot = snapshots.get(ref.id)
+        data = snapshot.to_dict() if snapshot and snapshot.exists else None
+        if data and data.get('version') == ROLLUP_VERSION:
+            rollups[date] = data
+        else:
+            missing.append((date, ref))
+
+    if missing:
+        logger.info(f'📦 训练汇总缺失 {len(missing)} 周，从原始记录重建: {student_id}')
+        days_by_week = _load_days_by_week(db, student_id, missing[0][0], get_week_bounds(missing[-1][0])[2])
+        rebuilt = {
+            date: build_rollup(student_id, date, days_by_week.get(ref.id, {}))
+            for date, ref in missing
+        }
+        try:
+            rollups.update(_store_rebuilt_rollups(db, missing, rebuilt))
+        except Exception as e:
+            logger.warning(f'⚠️ 写入训练汇总失败: {student_id}, {str(e)}')
+            rollups.update(rebuilt)
+
+    return [rollups[date] for date in week_dates]
+
+
+def _store_rebuilt_rollups(
+    db,
+    missing: List[Tuple[str, Any]],
+    rebuilt: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    在事务中写回重建的周汇总
+
+    重建使用的是事务外读取的原始记录。事务内重新读取汇总文档，期间已由触发器
+    （apply_training_change）写入当前版本的周直接采用已存储的数据，只写入仍缺失或版本过旧的周，
+    避免覆盖并发的增量更新。
+
+    Returns:
+        {周起始日期: 周汇总}
+    """
+    refs = [ref for _, ref in missing]
+
+    @firestore.transactional
+    def store_in_transaction(transaction):
+        snapshots = {snapshot.id: snapshot for snapshot in db.get_all(refs, transaction=transaction)}
+        stored = {}
+        for date, ref in missing:
+            snapshot = snapshots.get(ref.id)
+            data = snapshot.to_dict() if snapshot and snapshot.exists else None
+            if data and data.get('version') == ROLLUP_VERSION:
+                stored[date] = data
+            else:
+                transaction.set(ref, rebuilt[date])
+                stored[date] = rebuilt[date]
+        return stored
+
+    return store_in_transaction(db.transaction())
+
+
+def _load_days_by_week(db, student_id: str, start_date: str, end_date: str) -> Dict[str, Dict[str, Any]]:
+    """一次查询原始训练记录，按汇总文档 ID 分组得到各日汇总"""
+    docs = db.collection('dailyTrainings') \
+        .where('studentID', '==', student_id) \
+        .where('date', '>=', start_date) \
+        .where('date', '<=', end_date) \
+        .select(TRAINING_FIELDS) \
+        .get()
+
+    # 整个窗口一次性解析，再按周拆分
+    days = summarize_trainings([
+        data for data in (doc.to_dict() for doc in docs) if _training_key(data)
+    ])
+    days_by_week: Dict[str, Dict[str, Any]] = {}
+    for date, day in days.items():
+        days_by_week.setdefault(rollup_doc_id(student_id, date), {})[date] = day
+
+    logger.info(f'📊 组数值解析缓存: {get_parse_cache_stats()}')
+    return days_by_week
+
+
+def iter_rollup_days(rollups: List[Dict[str, Any]], start_date: str, end_date: str):
+    """遍历若干周汇总中落在 [start_date, end_date] 内的各日汇总，产出 (日期, 当日汇总)"""
+    for rollup in rollups:
+        for date, day in sorted((rollup.get('days') or {}).items()):
+            if start_date <= date <= end_date:
+                yield date, day
@@ -0,0 +1,112 @@
+"""
+测试 utils/concurrency.py 中的依赖感知并发读取
+"""
+import sys
+import os
+import threading
+import time
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.concurrency import run_with_dependencies
+
+
+def test_dependent_task_receives_results():
+    """测试依赖任务按名称收到上游结果"""
+    results = run_with_dependencies(
+        {
+            'user': lambda: {'planId': 'p1'},
+            'plan': lambda user: f"plan:{user['planId']}",
+            'memory': lambda: 'memory',
+        },
+        dependencies={'plan': ['user']},
+    )
+    assert results == {'user': {'planId': 'p1'}, 'plan': 'plan:p1', 'memory': 'memory'}
+    print("✅ 测试通过: dependent_task_receives_results")
+
+
+def test_dependent_task_starts_without_waiting_for_unrelated():
+    """测试依赖任务在上游完成后立即开始，不等待无关的慢任务"""
+    slow_done = threading.Event()
+    started = {}
+
+    def slow():
+        time.sleep(0.3)
+        slow_done.set()
+        return 'slow'
+
+    def plan(user):
+        started['slow_done'] = slow_done.is_set()
+        return 'plan'
+
+    results = run_with_dependencies(
+        {'user': lambda: 'user', 'plan': plan, 'slow': slow},
+        dependencies={'plan': ['user']},
+    )
+    assert results['slow'] == 'slow'
+    assert started['slow_done'] is False
+    print("✅ 测试通过: dependent_task_starts_without_waiting_for_unrelated")
+
+
+def test_invalid_dependencies():
+    """测试未知依赖和循环依赖抛出 ValueError"""
+    for tasks, dependencies in (
+        ({'a': lambda missing: 1}, {'a': ['missing']}),
+        ({'a': lambda b: 1, 'b': lambda a: 2}, {'a': ['b'], 'b': ['a']}),
+    ):
+        try:
+            run_with_dependencies(tasks, dependencies=dependencies)
+        except ValueError:
+            continue
+        raise AssertionError(f'应抛出 ValueError: {dependencies}')
+    print("✅ 测试通过: invalid_dependencies")
+
+
+def test_task_error_propagates():
+    """测试任务异常向上抛出"""
+    def fail():
+        raise RuntimeError('boom')
+
+    try:
+        run_with_dependencies({'fail': fail, 'ok': lambda: 1})
+    except RuntimeError as e:
+        assert str(e) == 'boom'
+    else:
+        raise AssertionError('应抛出 RuntimeError')
+    print("✅ 测试通过: task_error_propagates")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 concurrency 单元测试...\n")
+
+    tests = [
+        test_dependent_task_receives_results,
+        test_dependent_task_starts_without_waiting_for_unrelated,
+        test_invalid_dependencies,
+        test_task_error_propagates,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
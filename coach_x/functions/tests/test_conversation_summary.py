@@ -0,0 +1,101 @@
+"""
+测试 ai/conversation_summary.py 中的对话历史压缩
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.conversation_summary import (
+    KEEP_RECENT_TURNS,
+    COMPACT_THRESHOLD,
+    MAX_SUMMARY_CHARS,
+    first_sentence,
+    fold_into_summary,
+    compact_conversation_history,
+)
+from users.models import UserLLMProfile
+
+
+def _turn(i):
+    return {
+        'timestamp': 1760000000000 + i * 60000,
+        'user_message': f'第{i}个问题：深蹲膝盖疼怎么办？补充说明',
+        'ai_response': f'建议{i}：先降低重量。然后检查膝盖方向。',
+        'context': {'type': 'chat'},
+    }
+
+
+def test_first_sentence():
+    """测试首句提取：按句末标点截断、压缩空白、超长加省略号"""
+    assert first_sentence('先降低重量。然后检查。', 50) == '先降低重量。'
+    assert first_sentence('  hello   world ', 50) == 'hello world'
+    assert first_sentence('a' * 30, 10) == 'a' * 10 + '…'
+    assert first_sentence('', 10) == ''
+    print("✅ 测试通过: first_sentence")
+
+
+def test_compact_keeps_recent_turns():
+    """测试超过阈值时折叠较早对话，保留最近几轮原文"""
+    profile = UserLLMProfile(user_id='u1', conversation_history=[_turn(i) for i in range(COMPACT_THRESHOLD)])
+    assert compact_conversation_history(profile) is False
+
+    profile.add_conversation('新问题', '新回答')
+    assert compact_conversation_history(profile) is True
+
+    folded = COMPACT_THRESHOLD + 1 - KEEP_RECENT_TURNS
+    assert len(profile.conversation_history) == KEEP_RECENT_TURNS
+    assert profile.conversation_history[-1]['user_message'] == '新问题'
+    assert profile.summarized_count == folded
+    lines = profile.conversation_summary.split('\n')
+    assert len(lines) == folded
+    assert '第0个问题：深蹲膝盖疼怎么办？' in lines[0] and '补充说明' not in lines[0]
+    assert '回复：建议0：先降低重量。' in lines[0]
+    print("✅ 测试通过: compact_keeps_recent_turns")
+
+
+def test_summary_is_bounded():
+    """测试滚动摘要长度有上限，超出时丢弃最早的条目"""
+    summary = ''
+    for i in range(200):
+        summary = fold_into_summary(summary, [_turn(i)])
+
+    assert len(summary) <= MAX_SUMMARY_CHARS
+    assert '第199个问题' in summary.split('\n')[-1]
+    assert '第0个问题' not in summary
+    print("✅ 测试通过: summary_is_bounded")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 conversation_summary 单元测试...\n")
+
+    tests = [
+        test_first_sentence,
+        test_compact_keeps_recent_turns,
+        test_summary_is_bounded,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
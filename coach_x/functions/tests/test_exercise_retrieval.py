@@ -0,0 +1,117 @@
+"""
+测试 ai/training_plan/exercise_retrieval.py 中的肌群识别与动作库检索排序
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.training_plan.exercise_retrieval import (
+    ExerciseLibraryIndex,
+    detect_muscle_groups,
+    select_exercise_templates,
+)
+
+
+TEMPLATES = [
+    {'id': 't0', 'name': 'Narrow Grip Bench Press', 'tags': []},
+    {'id': 't1', 'name': 'Warm-up Jog', 'tags': []},
+    {'id': 't2', 'name': 'Lat Pulldown', 'tags': []},
+    {'id': 't3', 'name': 'Barbell Row', 'tags': []},
+    {'id': 't4', 'name': 'Dumbbell Front Raise', 'tags': []},
+    {'id': 't5', 'name': 'Lateral Raise', 'tags': []},
+    {'id': 't6', 'name': 'Overhead Press', 'tags': []},
+    {'id': 't7', 'name': 'Back Squat', 'tags': ['legs']},
+    {'id': 't8', 'name': '坐姿划船', 'tags': []},
+    {'id': 't9', 'name': '哑铃侧平举', 'tags': ['肩部']},
+]
+
+
+def ids(templates):
+    return [t['id'] for t in templates]
+
+
+def test_english_keywords_match_whole_words():
+    """测试英文关键词按单词边界匹配（允许复数），不命中单词内部的子串"""
+    assert detect_muscle_groups('Lateral Raise') == {'shoulder'}
+    assert detect_muscle_groups('Dumbbell Front Raise') == {'shoulder'}
+    assert detect_muscle_groups('Narrow Grip Bench Press') == {'chest'}
+    assert detect_muscle_groups('Warm-up') == set()
+    assert detect_muscle_groups('Lat Pulldown') == {'back'}
+    assert detect_muscle_groups('Barbell Rows') == {'back'}
+    assert detect_muscle_groups('Triceps Dips') == {'arm'}
+    assert detect_muscle_groups('Push-ups') == {'chest'}
+    print("✅ 测试通过: 英文单词边界匹配")
+
+
+def test_chinese_keywords_match_substrings():
+    """测试中文关键词按子串匹配"""
+    assert detect_muscle_groups('单臂哑铃划船') == {'back'}
+    assert detect_muscle_groups('练手臂') == {'arm'}
+    assert detect_muscle_groups('胸部和肱三头肌') == {'chest', 'arm'}
+    assert detect_muscle_groups('') == set()
+    print("✅ 测试通过: 中文子串匹配")
+
+
+def test_shoulder_query_ranking():
+    """测试肩部查询：肩部动作排在前面，lateral / narrow 不再带入背部动作"""
+    index = ExerciseLibraryIndex(TEMPLATES)
+    selected = ids(index.search('肩部训练 shoulder', top_k=4))
+
+    assert set(selected) == {'t4', 't5', 't6', 't9'}
+    assert 't2' not in selected and 't3' not in selected
+    print("✅ 测试通过: 肩部检索排序")
+
+
+def test_back_query_ranking():
+    """测试背部查询：背部动作排在前面，词法命中加分，同分保持动作库顺序；固定模板不占用 top_k"""
+    index = ExerciseLibraryIndex(TEMPLATES)
+
+    # Back Squat 同时命中肌群和单词 back，排在最前
+    assert ids(index.search('back day', top_k=4)) == ['t7', 't2', 't3', 't8']
+    assert ids(index.search('划船', top_k=2, include_ids=['t0'])) == ['t0', 't8', 't2']
+    print("✅ 测试通过: 背部检索排序")
+
+
+def test_small_library_unchanged():
+    """测试动作库不超过 top_k 时原样返回"""
+    assert select_exercise_templates(TEMPLATES, 'leg', top_k=len(TEMPLATES)) == TEMPLATES
+    assert select_exercise_templates([], 'leg') == []
+    print("✅ 测试通过: 小动作库原样返回")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 exercise_retrieval 单元测试...\n")
+
+    tests = [
+        test_english_keywords_match_whole_words,
+        test_chinese_keywords_match_substrings,
+        test_shoulder_query_ranking,
+        test_back_query_ranking,
+        test_small_library_unchanged,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,312 @@
+"""
+测试 ai/food_macros/cache.py 中的两级食物营养缓存
+"""
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.food_macros import cache as cache_module
+from ai.food_macros import handlers
+from ai.food_macros.cache import (
+    FoodMacrosCache,
+    MISS,
+    MEMORY_TTL_SECONDS,
+    MEMORY_NEGATIVE_TTL_SECONDS,
+    STATUS_NOT_FOUND,
+    cache_key,
+)
+
+
+CHICKEN = {'protein': 31.0, 'carbs': 0.0, 'fat': 3.6, 'calories': 165.0}
+
+
+# ==================== 内存版 Firestore 与可控时钟 ====================
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeRef:
+    def __init__(self, db, doc_id):
+        self.db = db
+        self.id = doc_id
+
+    def get(self):
+        self.db.reads += 1
+        return FakeSnapshot(self.id, self.db.docs.get(self.id))
+
+    def set(self, data):
+        self.db.writes += 1
+        self.db.docs[self.id] = dict(data)
+
+
+class FakeCollection:
+    def __init__(self, db):
+        self.db = db
+
+    def document(self, doc_id):
+        return FakeRef(self.db, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    def set(self, ref, data):
+        self.pending.append((ref.id, dict(data)))
+
+    def commit(self):
+        self.db.commits += 1
+        self.db.docs.update(self.pending)
+
+
+class FakeDB:
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self)
+
+    def get_all(self, refs):
+        self.reads += 1
+        # Firestore 不保证返回顺序
+        return [FakeSnapshot(ref.id, self.docs.get(ref.id)) for ref in reversed(list(refs))]
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeClaudeClient:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def call_claude(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.response
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_cache(**kwargs):
+    """新建缓存实例，Firestore 和时钟替换为内存实现"""
+    db = FakeDB()
+    clock = FakeClock()
+    cache_module.firestore = SimpleNamespace(client=lambda: db, SERVER_TIMESTAMP='SERVER_TIMESTAMP')
+    cache_module.time = clock
+    return FoodMacrosCache(**kwargs), db, clock
+
+
+# ==================== 测试 ====================
+
+def test_cache_key_normalized():
+    """测试缓存键：按规范化名称 + 语言寻址"""
+    assert cache_key(' 鸡胸肉。', '中文') == cache_key('鸡胸肉', '中文')
+    assert cache_key('Chicken  Breast', 'English') == cache_key('chicken breast', ' english ')
+    assert cache_key('鸡胸肉', '中文') != cache_key('鸡胸肉', 'English')
+    print("✅ 测试通过: 缓存键规范化")
+
+
+def test_memory_then_firestore():
+    """测试两级缓存：写入后内存命中；清空内存后从 Firestore 命中并回填内存"""
+    cache, db, _ = make_cache()
+    assert cache.get('鸡胸肉', '中文') is MISS
+
+    cache.set('鸡胸肉', '中文', CHICKEN)
+    assert cache.get('鸡胸肉', '中文') == CHICKEN
+    assert db.writes == 1
+
+    cache.clear_memory()
+    reads = db.reads
+    assert cache.get(' 鸡胸肉 ', '中文') == CHICKEN
+    assert cache.get('鸡胸肉', '中文') == CHICKEN
+    assert db.reads == reads + 1
+
+    stats = cache.get_stats()
+    assert stats['memory_hits'] == 2
+    assert stats['firestore_hits'] == 1
+    assert stats['misses'] == 1
+    print("✅ 测试通过: 两级缓存")
+
+
+def test_ttl_expiry():
+    """测试 TTL：内存条目到期后回源 Firestore，Firestore 条目过期后视为未命中"""
+    cache, db, clock = make_cache()
+    cache.set('鸡胸肉', '中文', CHICKEN)
+
+    clock.now += MEMORY_TTL_SECONDS + 1
+    reads = db.reads
+    assert cache.get('鸡胸肉', '中文') == CHICKEN
+    assert db.reads == reads + 1
+
+    cache.clear_memory()
+    key = cache_key('鸡胸肉', '中文')
+    db.docs[key]['expiresAt'] = datetime.now(timezone.utc) - timedelta(seconds=1)
+    assert cache.get('鸡胸肉', '中文') is MISS
+    print("✅ 测试通过: TTL 过期")
+
+
+def test_negative_cache_persistent_vs_transient():
+    """测试负缓存：模型无效数据持久化到 Firestore；临时错误只在内存中短暂缓存"""
+    cache, db, clock = make_cache()
+
+    cache.set_negative('不存在的食物', '中文')
+    assert cache.get('不存在的食物', '中文') is None
+    assert db.docs[cache_key('不存在的食物', '中文')]['status'] == STATUS_NOT_FOUND
+
+    cache.set_negative('限流的食物', '中文', persist=False)
+    assert cache.get('限流的食物', '中文') is None
+    assert cache_key('限流的食物', '中文') not in db.docs
+
+    # 内存负缓存到期：临时错误重新查询，持久化的负缓存仍从 Firestore 命中
+    clock.now += MEMORY_NEGATIVE_TTL_SECONDS + 1
+    assert cache.get('限流的食物', '中文') is MISS
+    assert cache.get('不存在的食物', '中文') is None
+    assert cache.get_stats()['negative_hits'] == 3
+    print("✅ 测试通过: 负缓存")
+
+
+def test_lru_eviction():
+    """测试 LRU：超出容量时淘汰最久未使用的条目"""
+    cache, db, _ = make_cache(max_entries=2)
+    cache.set('鸡胸肉', '中文', CHICKEN)
+    cache.set('牛肉', '中文', CHICKEN)
+    cache.get('鸡胸肉', '中文')
+    cache.set('米饭', '中文', CHICKEN)
+
+    reads = db.reads
+    assert cache.get('鸡胸肉', '中文') == CHICKEN
+    assert db.reads == reads
+    assert cache.get('牛肉', '中文') == CHICKEN
+    assert db.reads == reads + 1
+    print("✅ 测试通过: LRU 淘汰")
+
+
+def test_get_many_single_firestore_read():
+    """测试批量读取：内存未命中的食物合并为一次 get_all，结果按名称对应"""
+    cache, db, _ = make_cache()
+    cache.set('鸡胸肉', '中文', CHICKEN)
+    cache.set_negative('不存在的食物', '中文')
+    cache.clear_memory()
+    cache.set('牛肉', '中文', CHICKEN)
+
+    reads = db.reads
+    results = cache.get_many(['鸡胸肉', '牛肉', '不存在的食物', '米饭'], '中文')
+    assert db.reads == reads + 1
+    assert results['鸡胸肉'] == CHICKEN
+    assert results['牛肉'] == CHICKEN
+    assert results['不存在的食物'] is None
+    assert results['米饭'] is MISS
+
+    # 回填内存后不再读取 Firestore
+    cache.get_many(['鸡胸肉', '不存在的食物'], '中文')
+    assert db.reads == reads + 1
+    assert cache.get_many([], '中文') == {}
+    print("✅ 测试通过: 批量读取")
+
+
+def test_set_many_single_batch_commit():
+    """测试批量写入：一次 WriteBatch 提交，临时失败的负缓存只写内存"""
+    cache, db, _ = make_cache()
+    cache.set_many(
+        {'鸡胸肉': CHICKEN, '不存在的食物': None, '限流的食物': None},
+        '中文',
+        memory_only=['限流的食物'],
+    )
+
+    assert db.commits == 1
+    assert db.writes == 0
+    assert db.docs[cache_key('鸡胸肉', '中文')]['macros'] == CHICKEN
+    assert db.docs[cache_key('不存在的食物', '中文')]['status'] == STATUS_NOT_FOUND
+    assert cache_key('限流的食物', '中文') not in db.docs
+    assert cache.get('限流的食物', '中文') is None
+
+    cache.set_many({'限流的食物': None}, '中文', memory_only=['限流的食物'])
+    assert db.commits == 1
+    print("✅ 测试通过: 批量写入")
+
+
+def test_batch_results_matched_by_name():
+    """测试批量 Claude 结果：模型调换顺序、漏掉或改写名称时只按名称匹配"""
+    client = FakeClaudeClient({'success': True, 'data': {'foods': [
+        {'name': '米饭', 'protein': 2.6, 'carbs': 25.9, 'fat': 0.3, 'calories': 116},
+        {'name': ' 鸡胸肉 ', 'protein': 31, 'carbs': 0, 'fat': 3.6, 'calories': 165},
+        {'name': '鸡胸肉', 'protein': 99, 'carbs': 0, 'fat': 0, 'calories': 999},
+        {'name': '西兰花（熟）', 'protein': 2.8, 'carbs': 7, 'fat': 0.4, 'calories': 34},
+        {'name': '燕麦', 'protein': 'N/A'},
+    ]}})
+    handlers.get_claude_client = lambda: client
+
+    results, transient = handlers._fetch_macros_batch_from_claude(['鸡胸肉', '西兰花', '燕麦', '米饭'], 'u1')
+    assert not transient
+    assert client.calls[0]['user_id'] == 'u1'
+    assert list(results) == ['米饭', '鸡胸肉']
+    assert results['鸡胸肉'] == CHICKEN
+    assert results['米饭']['calories'] == 116.0
+    assert '西兰花' not in results and '燕麦' not in results
+
+    # API 失败为临时错误；JSON 解析失败说明模型返回了无效数据
+    handlers.get_claude_client = lambda: FakeClaudeClient({'success': False, 'error': 'rate limited'})
+    assert handlers._fetch_macros_batch_from_claude(['鸡胸肉']) == ({}, True)
+    handlers.get_claude_client = lambda: FakeClaudeClient({'success': False, 'raw_text': 'oops'})
+    assert handlers._fetch_macros_batch_from_claude(['鸡胸肉']) == ({}, False)
+    print("✅ 测试通过: 批量结果按名称匹配")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 food_macros cache 单元测试...\n")
+
+    tests = [
+        test_cache_key_normalized,
+        test_memory_then_firestore,
+        test_ttl_expiry,
+        test_negative_cache_persistent_vs_transient,
+        test_lru_eviction,
+        test_get_many_single_firestore_read,
+        test_set_many_single_batch_commit,
+        test_batch_results_matched_by_name,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
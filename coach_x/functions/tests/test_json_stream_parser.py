@@ -0,0 +1,107 @@
+"""
+测试 ai/json_stream_parser.py 中的增量 JSON 解析器
+
+模拟 Claude tool_delta 事件将 JSON 切成任意片段的情况
+"""
+import sys
+import os
+import json
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.json_stream_parser import JsonArrayStreamParser
+
+
+TOOL_INPUT = {
+    'day': 1,
+    'name': '胸部训练 {"exercises": [}',
+    'note': '注意 \\"热身\\"',
+    'exercises': [
+        {'name': '卧推', 'sets': [{'reps': '10', 'weight': '60kg'}]},
+        {'name': '飞鸟 "上斜"', 'sets': [{'reps': '12', 'weight': '10kg'}, {'reps': '8-12', 'weight': '体重'}]},
+        {'name': '俯卧撑', 'sets': [{'reps': '力竭', 'weight': '体重'}]},
+    ],
+}
+
+
+def _feed_in_chunks(parser, text, chunk_size):
+    results = []
+    for i in range(0, len(text), chunk_size):
+        results.extend(parser.feed(text[i:i + chunk_size]))
+    return results
+
+
+def test_parse_elements_across_any_chunking():
+    """测试任意切分方式下都能完整解析出所有元素"""
+    text = json.dumps(TOOL_INPUT, ensure_ascii=False)
+    for chunk_size in [1, 2, 3, 7, 16, len(text)]:
+        parser = JsonArrayStreamParser('exercises')
+        results = _feed_in_chunks(parser, text, chunk_size)
+        assert results == TOOL_INPUT['exercises'], f'chunk_size={chunk_size}: {results}'
+        assert parser.emitted_count == 3
+    print("✅ 测试通过: parse_elements_across_any_chunking")
+
+
+def test_element_emitted_when_closing_brace_arrives():
+    """测试元素在右花括号到达时立即返回，无需等待数组结束"""
+    parser = JsonArrayStreamParser('changes')
+    assert parser.feed('{"analysis": "降低重量", "changes": [{"type": "a"') == []
+    assert parser.feed('}') == [{'type': 'a'}]
+    assert parser.feed(', {"type": "b", "after": {"sets": [1, 2]}}') == [{'type': 'b', 'after': {'sets': [1, 2]}}]
+    print("✅ 测试通过: element_emitted_when_closing_brace_arrives")
+
+
+def test_ignore_nested_arrays_with_same_key():
+    """测试只追踪顶层字段，忽略嵌套的同名数组"""
+    parser = JsonArrayStreamParser('changes')
+    text = json.dumps({
+        'meta': {'changes': [{'type': 'nested'}]},
+        'changes': [{'type': 'top'}],
+        'summary': 'ok',
+    })
+    assert parser.feed(text) == [{'type': 'top'}]
+    print("✅ 测试通过: ignore_nested_arrays_with_same_key")
+
+
+def test_ignore_other_arrays():
+    """测试其他数组字段不会被解析"""
+    parser = JsonArrayStreamParser('exercises')
+    assert parser.feed('{"tags": [{"a": 1}], "exercises": []}') == []
+    assert parser.emitted_count == 0
+    print("✅ 测试通过: ignore_other_arrays")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 json_stream_parser 单元测试...\n")
+
+    tests = [
+        test_parse_elements_across_any_chunking,
+        test_element_emitted_when_closing_brace_arrives,
+        test_ignore_nested_arrays_with_same_key,
+        test_ignore_other_arrays,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,140 @@
+"""
+测试 ai/food_macros/nutrition_table.py 中的本地营养表名称匹配
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.food_macros.nutrition_table import (
+    NutritionTable,
+    MIN_MATCH_CONFIDENCE,
+    MIN_FUZZY_LENGTH,
+    get_nutrition_table,
+    lookup_local_macros,
+)
+
+
+ROWS = [
+    {'name_zh': '燕麦片', 'name_en': 'rolled oats', 'pinyin': 'yanmaipian', 'aliases': '燕麦|oatmeal',
+     'protein': '13.2', 'carbs': '67.7', 'fat': '6.5', 'calories': '379'},
+    {'name_zh': '梨', 'name_en': 'pear', 'pinyin': 'li', 'aliases': '',
+     'protein': '0.4', 'carbs': '13.3', 'fat': '0.2', 'calories': '51'},
+    {'name_zh': '测试', 'name_en': 'abcdefghij', 'pinyin': '', 'aliases': '',
+     'protein': '1', 'carbs': '1', 'fat': '1', 'calories': '1'},
+    {'name_zh': '无效', 'name_en': 'invalid', 'pinyin': '', 'aliases': '',
+     'protein': 'N/A', 'carbs': '1', 'fat': '1', 'calories': '1'},
+]
+
+
+def matched_name(table, food_name):
+    match = table.lookup(food_name)
+    return match['name'] if match else None
+
+
+def test_exact_alias_and_pinyin():
+    """测试精确匹配：中文名、英文名、别名、拼音（忽略大小写、空格和标点）"""
+    table = NutritionTable(ROWS)
+
+    assert len(table) == 3
+    assert matched_name(table, '燕麦片') == '燕麦片'
+    assert matched_name(table, 'Rolled Oats') == '燕麦片'
+    assert matched_name(table, 'oatmeal') == '燕麦片'
+    assert matched_name(table, '燕麦') == '燕麦片'
+    assert matched_name(table, 'yan mai pian') == '燕麦片'
+    assert matched_name(table, '梨') == '梨'
+    assert matched_name(table, 'pears') == '梨'
+    assert table.lookup('燕麦片')['confidence'] == 1.0
+    assert matched_name(table, 'invalid') is None
+    assert table.lookup('  ') is None
+    print("✅ 测试通过: 精确 / 别名 / 拼音匹配")
+
+
+def test_fuzzy_threshold():
+    """测试模糊匹配阈值：相似度达到 0.9 才匹配，过短的名称只做精确匹配"""
+    table = NutritionTable(ROWS)
+
+    # 10 个字符中 1 个不同：相似度 0.9
+    match = table.lookup('abcdefghiX')
+    assert match['name'] == '测试'
+    assert match['confidence'] == MIN_MATCH_CONFIDENCE
+    assert table.lookup('abcdefghXY') is None
+
+    assert MIN_FUZZY_LENGTH == 3
+    assert table.lookup('lo') is None
+    assert table.lookup('梨子') is None
+    print("✅ 测试通过: 模糊匹配阈值")
+
+
+def test_real_table_lookups():
+    """测试随代码打包的营养表：常见叫法、拼音、复数和拼写错误"""
+    table = get_nutrition_table()
+
+    assert matched_name(table, 'Chicken Breast') == '鸡胸肉'
+    assert matched_name(table, '鸡脯肉') == '鸡胸肉'
+    assert matched_name(table, 'ji xiong rou') == '鸡胸肉'
+    assert matched_name(table, 'chicken breasts') == '鸡胸肉'
+    assert matched_name(table, 'eggs') == '鸡蛋'
+    assert matched_name(table, 'shrimps') == '虾'
+    assert matched_name(table, '鲑鱼') == '三文鱼'
+    assert matched_name(table, 'sanwenyu') == '三文鱼'
+
+    assert matched_name(table, 'chiken breast') == '鸡胸肉'
+    assert matched_name(table, 'salmonn') == '三文鱼'
+    assert table.lookup('chiken breast')['confidence'] < 1.0
+
+    assert lookup_local_macros('鸡胸肉') == {'protein': 31.0, 'carbs': 0.0, 'fat': 3.6, 'calories': 165.0}
+    print("✅ 测试通过: 营养表常见查询")
+
+
+def test_real_table_near_misses():
+    """测试相近但不同的食物不串用数据，交给 Claude 查询"""
+    table = get_nutrition_table()
+
+    assert matched_name(table, '鸡蛋') == '鸡蛋'
+    assert matched_name(table, '鸡蛋白') == '鸡蛋白'
+    assert matched_name(table, 'egg whites') == '鸡蛋白'
+    assert matched_name(table, '鸡蛋饼') is None
+    assert matched_name(table, '鸡胸肉饭') is None
+    assert matched_name(table, 'salmon fillet') is None
+    assert matched_name(table, '虾球') is None
+    assert matched_name(table, '奶牛') is None
+    assert matched_name(table, '鸡') is None
+    assert lookup_local_macros('beef steak') is None
+    print("✅ 测试通过: 相近名称不误匹配")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 nutrition_table 单元测试...\n")
+
+    tests = [
+        test_exact_alias_and_pinyin,
+        test_fuzzy_threshold,
+        test_real_table_lookups,
+        test_real_table_near_misses,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
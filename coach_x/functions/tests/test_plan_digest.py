@@ -0,0 +1,147 @@
+"""
+测试 plans/digest.py 中的计划摘要
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from plans.digest import (
+    get_exercise_plan_digest,
+    get_diet_plan_digest,
+    get_digest_cache_stats,
+    clear_digest_cache,
+)
+
+
+EXERCISE_PLAN = {
+    'name': '增肌四分化',
+    'updatedAt': 1760000000000,
+    'days': [
+        {
+            'day': 1,
+            'type': 'strength',
+            'name': '胸部日',
+            'note': '先做复合动作',
+            'exercises': [
+                {
+                    'name': '杠铃卧推',
+                    'type': 'strength',
+                    'exerciseTemplateId': 'tpl_1',
+                    'sets': [
+                        {'reps': '10', 'weight': '60kg'},
+                        {'reps': '10', 'weight': '60kg'},
+                        {'reps': '8', 'weight': '65kg'},
+                    ],
+                },
+                {
+                    'name': '俯卧撑',
+                    'type': 'strength',
+                    'note': '核心收紧，\n下放到底',
+                    'sets': [{'reps': '15', 'weight': ''}],
+                },
+            ],
+        },
+    ],
+}
+
+DIET_PLAN = {
+    'name': '减脂',
+    'updatedAt': 1760000000000,
+    'days': [
+        {
+            'day': 1,
+            'name': '训练日',
+            'meals': [
+                {
+                    'name': '早餐',
+                    'note': '',
+                    'items': [
+                        {'food': '鸡蛋', 'amount': '2个', 'protein': 12, 'carbs': 1, 'fat': 10, 'calories': 140},
+                        {'food': '燕麦', 'amount': '50g', 'protein': 6, 'carbs': 30, 'fat': 3, 'calories': 190},
+                    ],
+                },
+            ],
+        },
+        {'day': 2, 'name': '休息日', 'meals': []},
+    ],
+}
+
+
+def test_exercise_digest_lines():
+    """测试训练计划摘要：编号与索引对应，连续相同的组合并，保留训练日和动作备注"""
+    digest = get_exercise_plan_digest(EXERCISE_PLAN)
+    lines = digest.split('\n')
+
+    assert lines[0] == '训练计划「增肌四分化」（1 天）'
+    assert '[d0] 第1天 胸部日（strength）；备注：先做复合动作' in lines
+    assert '[d0.e0] 杠铃卧推：10@60kg ×2, 8@65kg' in lines
+    assert '[d0.e1] 俯卧撑：15；备注：核心收紧， 下放到底' in lines
+    print("✅ 测试通过: 训练计划摘要")
+
+
+def test_diet_digest_lines():
+    """测试饮食计划摘要：日均营养、逐级汇总和食物编号"""
+    digest = get_diet_plan_digest(DIET_PLAN)
+    lines = digest.split('\n')
+
+    assert lines[0] == '饮食计划「减脂」（2 天，日均 蛋白质 9g / 碳水 16g / 脂肪 6g / 165 kcal）'
+    assert '[d0] 第1天 训练日：P18 C31 F13 330kcal' in lines
+    assert '[d0.m0] 早餐：P18 C31 F13 330kcal' in lines
+    assert '[d0.m0.f1] 燕麦 50g：P6 C30 F3 190kcal' in lines
+    assert '[d1] 第2天 休息日：P0 C0 F0 0kcal' in lines
+    print("✅ 测试通过: 饮食计划摘要")
+
+
+def test_digest_cache_by_plan_version():
+    """测试缓存：同一 (计划ID, updatedAt) 命中，updatedAt 变化后重新生成，无 ID 不缓存"""
+    clear_digest_cache()
+
+    first = get_exercise_plan_digest(EXERCISE_PLAN, plan_id='plan_1')
+    assert get_exercise_plan_digest(EXERCISE_PLAN, plan_id='plan_1') == first
+    assert get_digest_cache_stats()['hits'] == 1
+
+    renamed = dict(EXERCISE_PLAN, name='新计划', updatedAt=1760000001000)
+    assert '新计划' in get_exercise_plan_digest(renamed, plan_id='plan_1')
+
+    get_exercise_plan_digest(EXERCISE_PLAN)
+    stats = get_digest_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+    print("✅ 测试通过: 摘要缓存")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 plan digest 单元测试...\n")
+
+    tests = [
+        test_exercise_digest_lines,
+        test_diet_digest_lines,
+        test_digest_cache_by_plan_version,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,181 @@
+"""
+测试 ai/rate_limiter.py 中的准入控制（令牌桶 + 并发上限 + 公平队列）
+"""
+import sys
+import os
+import time
+import threading
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.rate_limiter import (
+    ClaudeRateLimiter,
+    TokenBucket,
+    RateLimitQueueTimeout,
+    DEFAULT_EXPECTED_OUTPUT_TOKENS,
+    rate_limit_user,
+    current_rate_limit_user,
+)
+
+MODEL = 'claude-test'
+
+
+def test_token_bucket_wait_and_refund():
+    """测试令牌桶扣除、等待时间和退还"""
+    bucket = TokenBucket(60)  # 每秒补充 1 个
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+    bucket.refund(30)
+    assert bucket.wait_time(30) == 0
+    # 超过容量的请求等桶满即可放行
+    assert bucket.wait_time(1000) <= 30.0
+    # 额度为 0 表示不限制
+    assert TokenBucket(0).wait_time(10 ** 9) == 0
+    print("✅ 测试通过: token_bucket_wait_and_refund")
+
+
+def test_max_in_flight_per_model():
+    """测试同一模型的并发上限，release 后放行下一个"""
+    limiter = ClaudeRateLimiter(max_in_flight=1, max_queue_wait=0.2)
+    first = limiter.acquire(MODEL, 10, 10)
+
+    # 其他模型不受影响
+    other = limiter.acquire('other-model', 10, 10)
+    other.release()
+
+    try:
+        limiter.acquire(MODEL, 10, 10)
+        assert False, '并发已满时应排队超时'
+    except RateLimitQueueTimeout:
+        pass
+
+    first.release()
+    limiter.acquire(MODEL, 10, 10).release()
+    print("✅ 测试通过: max_in_flight_per_model")
+
+
+def test_output_tokens_refunded_by_actual_usage():
+    """测试预扣的输出额度在记录实际用量时按实际用量退还"""
+    limiter = ClaudeRateLimiter(output_tokens_per_minute=1000, max_queue_wait=0.2)
+    ticket = limiter.acquire(MODEL, 10, 1000)
+    ticket.record_usage({'input_tokens': 10, 'output_tokens': 100})
+    ticket.release()
+    # 退还 900 后可以立即放行
+    limiter.acquire(MODEL, 10, 800).release()
+    print("✅ 测试通过: output_tokens_refunded_by_actual_usage")
+
+
+def test_blocked_model_does_not_block_others():
+    """测试某个模型并发已满、有请求排队时，其他模型的请求仍可立即放行"""
+    limiter = ClaudeRateLimiter(max_in_flight=1, max_queue_wait=2)
+    first = limiter.acquire(MODEL, 10, 10)
+
+    waiter = threading.Thread(target=lambda: limiter.acquire(MODEL, 10, 10, user='waiting').release())
+    waiter.start()
+    time.sleep(0.05)
+
+    started_at = time.monotonic()
+    limiter.acquire('other-model', 10, 10, user='other').release()
+    assert time.monotonic() - started_at < 0.5
+
+    first.release()
+    waiter.join(timeout=2)
+    print("✅ 测试通过: blocked_model_does_not_block_others")
+
+
+def test_output_reservation_follows_actual_usage():
+    """测试输出预扣不超过 max_tokens，并随实际输出量调整"""
+    limiter = ClaudeRateLimiter(max_queue_wait=0.2)
+
+    ticket = limiter.acquire(MODEL, 10, 16384)
+    assert ticket.output_tokens == DEFAULT_EXPECTED_OUTPUT_TOKENS
+    ticket.record_usage({'input_tokens': 10, 'output_tokens': 48})
+    ticket.release()
+
+    ticket = limiter.acquire(MODEL, 10, 16384)
+    assert ticket.output_tokens < DEFAULT_EXPECTED_OUTPUT_TOKENS
+    ticket.release()
+
+    assert limiter.acquire(MODEL, 10, 100).output_tokens <= 100
+    print("✅ 测试通过: output_reservation_follows_actual_usage")
+
+
+def test_fair_queue_round_robin():
+    """测试公平队列：多个等待用户按轮转顺序放行"""
+    limiter = ClaudeRateLimiter(max_in_flight=1, max_queue_wait=5)
+    blocker = limiter.acquire(MODEL, 1, 1, user='blocker')
+    order = []
+    order_lock = threading.Lock()
+
+    def worker(user):
+        ticket = limiter.acquire(MODEL, 1, 1, user=user)
+        with order_lock:
+            order.append(user)
+        ticket.release()
+
+    # coach 先排入 3 个请求，student 随后排入 1 个
+    threads = []
+    for user in ['coach', 'coach', 'coach', 'student']:
+        thread = threading.Thread(target=worker, args=(user,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+
+    blocker.release()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order[:2] == ['coach', 'student'], order
+    assert order.count('coach') == 3
+    print("✅ 测试通过: fair_queue_round_robin")
+
+
+def test_rate_limit_user_context():
+    """测试用户标识上下文的设置与恢复"""
+    default_user = current_rate_limit_user()
+    with rate_limit_user('u1'):
+        assert current_rate_limit_user() == 'u1'
+        with rate_limit_user(None):
+            assert current_rate_limit_user() == default_user
+    assert current_rate_limit_user() == default_user
+    print("✅ 测试通过: rate_limit_user_context")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 rate_limiter 单元测试...\n")
+
+    tests = [
+        test_token_bucket_wait_and_refund,
+        test_max_in_flight_per_model,
+        test_output_tokens_refunded_by_actual_usage,
+        test_blocked_model_does_not_block_others,
+        test_output_reservation_follows_actual_usage,
+        test_fair_queue_round_robin,
+        test_rate_limit_user_context,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
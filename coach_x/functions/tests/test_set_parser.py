@@ -0,0 +1,91 @@
+"""
+测试 students/set_parser.py 中的训练组数值解析及记忆缓存
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from students.set_parser import (
+    parse_weight_string,
+    parse_reps_string,
+    get_parse_cache_stats,
+    clear_parse_cache,
+)
+
+
+def test_parse_weight_string():
+    """测试重量解析：数值、单位、lb 统一为 lbs"""
+    assert parse_weight_string('100kg') == (100.0, 'kg')
+    assert parse_weight_string(' 225 LBS ') == (225.0, 'lbs')
+    assert parse_weight_string('45lb') == (45.0, 'lbs')
+    assert parse_weight_string('50') == (50.0, '')
+    assert parse_weight_string(60) == (60.0, '')
+    assert parse_weight_string('') == (0.0, '')
+    assert parse_weight_string('bodyweight') == (0.0, '')
+    assert parse_weight_string('1.2.3kg') == (0.0, '')
+    print("✅ 测试通过: parse_weight_string")
+
+
+def test_parse_reps_string():
+    """测试次数解析：单值、范围取平均、无效值"""
+    assert parse_reps_string('10') == 10
+    assert parse_reps_string('8-12') == 10
+    assert parse_reps_string(' 5 ') == 5
+    assert parse_reps_string(8) == 8
+    assert parse_reps_string('') == 0
+    assert parse_reps_string('AMRAP') == 0
+    assert parse_reps_string('8-x') == 0
+    print("✅ 测试通过: parse_reps_string")
+
+
+def test_parse_cache_hit_rate():
+    """测试重复字面量命中缓存，规范化后的写法共享同一条目"""
+    clear_parse_cache()
+    for _ in range(10):
+        parse_weight_string('100kg')
+        parse_weight_string('100KG ')
+        parse_reps_string('8-12')
+
+    stats = get_parse_cache_stats()
+    assert stats['weight']['misses'] == 1, stats
+    assert stats['weight']['hits'] == 19, stats
+    assert stats['weight']['size'] == 1, stats
+    assert stats['reps']['misses'] == 1, stats
+    assert stats['reps']['hit_rate'] == 0.9, stats
+    print("✅ 测试通过: parse_cache_hit_rate")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 set_parser 单元测试...\n")
+
+    tests = [
+        test_parse_weight_string,
+        test_parse_reps_string,
+        test_parse_cache_hit_rate,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,133 @@
+"""
+测试 exercise_library/template_index.py 中的动作名称匹配
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from exercise_library.template_index import (
+    TemplateIndex,
+    normalize_name,
+    qualifier_variants,
+    modifiers,
+    modifiers_conflict,
+)
+
+
+TEMPLATES = [
+    {'id': 'bench', 'name': '杠铃卧推'},
+    {'id': 'leg_press', 'name': '腿举'},
+    {'id': 'pull_up', 'name': '引体向上'},
+    {'id': 'db_bench', 'name': 'Dumbbell Bench Press'},
+    {'id': 'incline', 'name': 'Paused Incline Dumbbell Bench Press'},
+    {'id': 'rdl', 'name': 'Romanian Deadlift (Barbell)'},
+    {'id': 'row', 'name': '双臂哑铃划船'},
+]
+
+
+def make_index():
+    return TemplateIndex('coach_1', [dict(t) for t in TEMPLATES])
+
+
+def test_normalize_name():
+    """测试规范化：NFKC、小写、去掉空白/括号/标点"""
+    assert normalize_name('Bench  Press（Barbell）') == 'benchpressbarbell'
+    assert normalize_name('Ｌａｔ Pull-down') == 'latpulldown'
+    assert normalize_name('卧推 · 杠铃') == '卧推杠铃'
+    assert normalize_name('') == ''
+    print("✅ 测试通过: 名称规范化")
+
+
+def test_normalized_and_qualifier_match():
+    """测试规范化匹配和括号限定词前后移动，不再按字符组成匹配"""
+    index = make_index()
+
+    assert index.match('杠铃卧推') == 'bench'
+    assert index.match('dumbbell bench-press') == 'db_bench'
+    assert index.match('卧推(杠铃)') == 'bench'
+    assert index.match('卧推【杠铃】') == 'bench'
+    assert index.match('Barbell Romanian Deadlift') == 'rdl'
+    assert qualifier_variants('卧推(杠铃)') == {'杠铃卧推', '卧推杠铃'}
+    assert qualifier_variants('杠铃卧推') == set()
+
+    # 字符相同但顺序不同的是不同动作
+    assert index.match('举腿') is None
+    assert index.match('推卧铃杠') is None
+    print("✅ 测试通过: 规范化与限定词匹配")
+
+
+def test_alias_match():
+    """测试别名表：中英文叫法匹配到同一模板"""
+    index = make_index()
+
+    assert index.match('Leg Press') == 'leg_press'
+    assert index.match('pull-up') == 'pull_up'
+    assert index.match('引体') == 'pull_up'
+    assert index.match('Deadlift') is None
+    print("✅ 测试通过: 别名匹配")
+
+
+def test_fuzzy_match():
+    """测试模糊匹配：容忍拼写差异和复数，相似度不足时不匹配"""
+    index = make_index()
+
+    assert index.match('Dumbell Bench Press') == 'db_bench'
+    assert index.match('Dumbbell Bench Presses') == 'db_bench'
+    assert index.match('Decline Bench Press') is None
+    assert index.match('Dumbbell Row') is None
+    print("✅ 测试通过: 模糊匹配")
+
+
+def test_fuzzy_match_blocks_modifier_conflicts():
+    """测试修饰词冲突：上斜/下斜、单臂/双臂、杠铃/哑铃即使相似度很高也不匹配"""
+    index = make_index()
+
+    # 与 'Paused Incline Dumbbell Bench Press' 的相似度高于阈值，仅角度不同
+    assert index.match('Paused Decline Dumbbell Bench Press') is None
+    assert index.match('Paused Incline Dumbell Bench Press') == 'incline'
+    assert index.match('单臂哑铃划船') is None
+    assert index.match('Romanian Deadlift (Dumbbell)') is None
+
+    assert modifiers(normalize_name('上斜哑铃卧推'))['angle'] == 'incline'
+    assert modifiers(normalize_name('卧推'))['angle'] == 'flat'
+    assert modifiers_conflict(modifiers('单臂哑铃划船'), modifiers('哑铃划船'))
+    assert not modifiers_conflict(modifiers('杠铃卧推'), modifiers('卧推'))
+    print("✅ 测试通过: 修饰词冲突")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 template_index 单元测试...\n")
+
+    tests = [
+        test_normalize_name,
+        test_normalized_and_qualifier_match,
+        test_alias_match,
+        test_fuzzy_match,
+        test_fuzzy_match_blocks_modifier_conflicts,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
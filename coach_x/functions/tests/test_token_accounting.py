@@ -0,0 +1,112 @@
+"""
+测试 ai/token_accounting.py 中的 token 记账与输入预算
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ai.token_accounting import (
+    TokenLedger,
+    estimate_text_tokens,
+    fit_to_budget,
+)
+from ai.rate_limiter import estimate_input_tokens
+
+
+USAGE = {
+    'input_tokens': 100,
+    'output_tokens': 50,
+    'cache_creation_input_tokens': 0,
+    'cache_read_input_tokens': 900,
+}
+
+
+def test_ledger_groups_by_dimension():
+    """测试用量按 用户 / 接口 / 模型 汇总"""
+    ledger = TokenLedger()
+    ledger.record('u1', 'chat', 'sonnet', USAGE, estimated_input_tokens=1200)
+    ledger.record('u1', 'edit_plan', 'sonnet', USAGE, over_budget=True)
+    ledger.record('u2', 'chat', 'haiku', USAGE)
+
+    by_endpoint = ledger.snapshot('endpoint')
+    assert by_endpoint['chat']['calls'] == 2
+    assert by_endpoint['chat']['cache_read_input_tokens'] == 1800
+    assert by_endpoint['chat']['estimated_input_tokens'] == 1200
+    assert by_endpoint['edit_plan']['over_budget'] == 1
+
+    assert ledger.snapshot('user')['u1']['input_tokens'] == 200
+    assert ledger.snapshot('model')['haiku']['output_tokens'] == 50
+
+    ledger.reset()
+    assert ledger.snapshot() == {}
+    print("✅ 测试通过: 用量汇总")
+
+
+def test_estimate_text_tokens_cjk():
+    """测试 token 估算：CJK 字符（含全角标点）约 1 token/字，其余约 4 字符/token"""
+    assert estimate_text_tokens('x' * 400) == 100
+    assert estimate_text_tokens('杠铃卧推' * 25) == 100
+    assert estimate_text_tokens('深蹲：squat') == 4
+    assert estimate_text_tokens('胸部', None, 'abcdefgh') == 4
+    assert estimate_input_tokens({'messages': [{'role': 'user', 'content': '卧推' * 500}]}) > 1000
+    print("✅ 测试通过: CJK token 估算")
+
+
+def test_fit_to_budget_trims_in_order():
+    """测试超出预算时按级别逐级裁剪，直到不超出预算"""
+    rendered = []
+
+    def render(count):
+        rendered.append(count)
+        return 'x' * (count * 40)  # 每个条目约 10 tokens
+
+    text = fit_to_budget(render, levels=(40, 20, 10), fixed_tokens=100, budget=350)
+    assert rendered == [40, 20]
+    assert estimate_text_tokens(text) == 200
+    print("✅ 测试通过: 逐级裁剪")
+
+
+def test_fit_to_budget_unlimited_and_exhausted():
+    """测试预算为 0 时不裁剪；所有级别都超出时返回最严格级别"""
+    render = lambda count: 'x' * (count * 40)
+
+    assert len(fit_to_budget(render, levels=(40, 10), fixed_tokens=10 ** 6, budget=0)) == 1600
+    assert len(fit_to_budget(render, levels=(40, 10), fixed_tokens=10 ** 6, budget=100)) == 400
+    print("✅ 测试通过: 预算边界")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 token_accounting 单元测试...\n")
+
+    tests = [
+        test_ledger_groups_by_dimension,
+        test_estimate_text_tokens_cjk,
+        test_fit_to_budget_trims_in_order,
+        test_fit_to_budget_unlimited_and_exhausted,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
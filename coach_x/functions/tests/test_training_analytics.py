@@ -0,0 +1,128 @@
+"""
+测试 students/training_analytics.py 中的训练量、e1RM 与 PR 计算
+"""
+import sys
+import os
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from students.training_analytics import (
+    LBS_TO_KG,
+    TrainingSets,
+    estimate_1rm,
+    to_kg,
+    from_kg,
+    volume_pr,
+)
+
+
+def close(a, b, tolerance=1e-6):
+    return abs(a - b) < tolerance
+
+
+def test_estimate_1rm():
+    """测试 Epley 公式：1 次为重量本身，0 次为 0，支持数组"""
+    assert close(float(estimate_1rm(100, 1)), 100.0)
+    assert close(float(estimate_1rm(100, 5)), 100 * (1 + 5 / 30))
+    assert float(estimate_1rm(100, 0)) == 0.0
+
+    values = estimate_1rm([100, 60, 80], [10, 1, 0])
+    assert [round(float(v), 1) for v in values] == [133.3, 60.0, 0.0]
+    print("✅ 测试通过: e1RM 估算")
+
+
+def test_unit_conversion():
+    """测试单位换算：lbs <-> kg 可逆，无单位和 kg 不换算"""
+    assert close(to_kg(100, 'lbs'), 100 * LBS_TO_KG)
+    assert to_kg(100, 'kg') == 100
+    assert to_kg(100, '') == 100
+    assert close(from_kg(to_kg(225, 'lbs'), 'lbs'), 225)
+    print("✅ 测试通过: 单位换算")
+
+
+def test_training_sets_mixed_units():
+    """测试组数据解析：lbs 统一换算为 kg，最佳组保留原单位，0 次的组不参与"""
+    sets = TrainingSets.from_trainings([
+        {'date': '2025-01-13', 'exercises': [
+            {'name': '卧推', 'sets': [{'weight': '100kg', 'reps': '5'}, {'weight': '225lbs', 'reps': '5'}]},
+            {'name': '深蹲', 'sets': [{'weight': '140kg', 'reps': '0'}]},
+            {'name': '', 'sets': [{'weight': '20kg', 'reps': '10'}]},
+        ]},
+        {'exercises': [{'name': '硬拉', 'sets': [{'weight': '180kg', 'reps': '1'}]}]},
+    ])
+
+    assert len(sets) == 3
+    assert sets.exercises == ['卧推', '深蹲']
+    assert close(float(sets.weight_kg[1]), 225 * LBS_TO_KG)
+
+    volumes = sets.volume_by_date_exercise()
+    assert close(float(volumes[0, 0]), 500 + 225 * LBS_TO_KG * 5)
+    assert float(volumes[0, 1]) == 0.0
+
+    best = sets.best_sets()
+    assert best['卧推']['unit'] == 'lbs'
+    assert best['卧推']['weight'] == 225.0
+    assert best['卧推']['e1rmKg'] == round(225 * LBS_TO_KG * (1 + 5 / 30), 1)
+    assert '深蹲' not in best
+    print("✅ 测试通过: 混合单位组数据")
+
+
+def test_volume_pr():
+    """测试 Volume PR：取两周都练过的动作中提升最多的（按 kg 比较），并列取靠前的"""
+    this_week = {
+        '卧推': {'volume': 1000.0, 'unit': 'kg'},
+        '深蹲': {'volume': 2000.0, 'unit': 'kg'},
+        '划船': {'volume': 900.0, 'unit': 'kg'},
+        '硬拉': {'volume': 3000.0, 'unit': 'kg'},
+    }
+    last_week = {
+        '卧推': {'volume': 900.0, 'unit': 'kg'},
+        '深蹲': {'volume': 1500.0, 'unit': 'kg'},
+        # 2000 lbs ≈ 907 kg：按 kg 比较后实际是退步
+        '划船': {'volume': 2000.0, 'unit': 'lbs'},
+    }
+
+    assert volume_pr(this_week, last_week) == '深蹲'
+    assert volume_pr(this_week, {'划船': last_week['划船']}) == '划船'
+    assert volume_pr(this_week, {}) is None
+
+    tied = {'卧推': {'volume': 1000.0, 'unit': 'kg'}, '深蹲': {'volume': 1600.0, 'unit': 'kg'}}
+    assert volume_pr(tied, last_week) == '卧推'
+    assert volume_pr(tied, last_week, order=['深蹲', '卧推']) == '深蹲'
+    print("✅ 测试通过: Volume PR")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 training_analytics 单元测试...\n")
+
+    tests = [
+        test_estimate_1rm,
+        test_unit_conversion,
+        test_training_sets_mixed_units,
+        test_volume_pr,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,258 @@
+"""
+测试 students/training_rollups.py 中的周汇总构建与增量维护
+"""
+import sys
+import os
+from types import SimpleNamespace
+
+# 添加 functions 目录到 Python 路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from students import training_rollups
+from students.training_rollups import (
+    ROLLUP_VERSION,
+    get_week_bounds,
+    rollup_doc_id,
+    build_rollup,
+    apply_training_change,
+    get_range_rollups,
+)
+
+
+# ==================== 内存版 Firestore ====================
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeRef:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self.id, self.db.docs.get((self.collection, self.id)))
+
+
+class FakeQuery:
+    def __init__(self, db, collection, filters=()):
+        self.db = db
+        self.collection = collection
+        self.filters = filters
+
+    def where(self, field, op, value):
+        return FakeQuery(self.db, self.collection, self.filters + ((field, op, value),))
+
+    def select(self, fields):
+        return self
+
+    def get(self, transaction=None):
+        if self.db.on_query:
+            self.db.on_query()
+        ops = {'==': lambda a, b: a == b, '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b}
+        return [
+            FakeSnapshot(doc_id, data)
+            for (collection, doc_id), data in sorted(self.db.docs.items())
+            if collection == self.collection
+            and all(ops[op](data.get(field), value) for field, op, value in self.filters)
+        ]
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id):
+        return FakeRef(self.db, self.collection, doc_id)
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self.db = db
+
+    def set(self, ref, data):
+        self.db.docs[(ref.collection, ref.id)] = dict(data)
+        self.db.writes.append(ref.id)
+
+
+class FakeDB:
+    def __init__(self):
+        self.docs = {}
+        self.writes = []
+        self.on_query = None
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def get_all(self, refs, transaction=None):
+        return [ref.get() for ref in refs]
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def add_training(self, doc_id, data):
+        self.docs[('dailyTrainings', doc_id)] = data
+
+
+def use_fake_db():
+    """把模块内的 firestore 替换为内存实现"""
+    db = FakeDB()
+    training_rollups.firestore = SimpleNamespace(
+        client=lambda: db,
+        transactional=lambda fn: fn,
+        SERVER_TIMESTAMP='SERVER_TIMESTAMP',
+    )
+    return db
+
+
+def training(date, weight='100kg', reps='5', student_id='s1'):
+    return {
+        'studentID': student_id,
+        'date': date,
+        'completionStatus': 'completed',
+        'exercises': [{'name': '深蹲', 'sets': [{'weight': weight, 'reps': reps}]}],
+    }
+
+
+# ==================== 测试 ====================
+
+def test_week_bounds():
+    """测试 ISO 周边界：周一开始、周日结束，跨年周归属正确的 ISO 年"""
+    assert get_week_bounds('2025-01-15') == ('2025-W03', '2025-01-13', '2025-01-19')
+    assert get_week_bounds('2025-01-13') == ('2025-W03', '2025-01-13', '2025-01-19')
+    assert get_week_bounds('2025-01-19') == ('2025-W03', '2025-01-13', '2025-01-19')
+    assert get_week_bounds('2024-12-30') == ('2025-W01', '2024-12-30', '2025-01-05')
+    assert get_week_bounds('2021-01-03') == ('2020-W53', '2020-12-28', '2021-01-03')
+    assert rollup_doc_id('s1', '2025-01-19') == 's1_2025-W03'
+    assert rollup_doc_id('s1', '2025-01-20') == 's1_2025-W04'
+    print("✅ 测试通过: 周边界")
+
+
+def test_build_rollup_aggregates_days():
+    """测试周汇总：训练量/卡路里累加，动作按首次出现排序，最佳组取 e1RM 最高的一天"""
+    days = {
+        '2025-01-15': {
+            'volume': 500.0, 'unit': 'kg', 'calories': 1800.0, 'completed': True,
+            'exercises': [{'name': '深蹲', 'volume': 500.0, 'unit': 'kg',
+                           'bestSet': {'weight': 100.0, 'reps': 5, 'unit': 'kg', 'e1rmKg': 116.7}}],
+        },
+        '2025-01-13': {
+            'volume': 300.0, 'unit': 'kg', 'calories': 2000.0, 'completed': True,
+            'exercises': [
+                {'name': '卧推', 'volume': 200.0, 'unit': 'kg',
+                 'bestSet': {'weight': 80.0, 'reps': 5, 'unit': 'kg', 'e1rmKg': 93.3}},
+                {'name': '深蹲', 'volume': 100.0, 'unit': 'kg',
+                 'bestSet': {'weight': 100.0, 'reps': 1, 'unit': 'kg', 'e1rmKg': 103.3}},
+            ],
+        },
+    }
+    rollup = build_rollup('s1', '2025-01-15', days)
+
+    assert rollup['isoWeek'] == '2025-W03'
+    assert rollup['daysTrained'] == 2
+    assert rollup['totalVolume'] == 800.0
+    assert rollup['calories'] == 3800.0
+    assert rollup['exerciseOrder'] == ['卧推', '深蹲']
+    assert rollup['exercises']['深蹲']['volume'] == 600.0
+    assert rollup['exercises']['深蹲']['bestSet']['date'] == '2025-01-15'
+    assert rollup['version'] == ROLLUP_VERSION
+
+    assert build_rollup('s1', '2025-01-15', {})['unit'] == 'kg'
+    print("✅ 测试通过: 周汇总聚合")
+
+
+def test_apply_training_change_updates_day():
+    """测试触发器增量更新：首次写入从原始记录重建整周，改日期时从旧周移除"""
+    db = use_fake_db()
+    db.add_training('t1', training('2025-01-13'))
+    db.add_training('t2', training('2025-01-15', weight='110kg'))
+
+    apply_training_change(None, training('2025-01-15', weight='110kg'))
+    rollup = db.docs[('trainingRollups', 's1_2025-W03')]
+    assert sorted(rollup['days']) == ['2025-01-13', '2025-01-15']
+    assert rollup['totalVolume'] == 1050.0
+
+    # 同一天的修改只替换当天的汇总
+    db.add_training('t2', training('2025-01-15', weight='120kg'))
+    apply_training_change(training('2025-01-15', weight='110kg'), training('2025-01-15', weight='120kg'))
+    rollup = db.docs[('trainingRollups', 's1_2025-W03')]
+    assert rollup['totalVolume'] == 1100.0
+
+    # 改到下一周：旧周移除当天，新周写入
+    db.add_training('t2', training('2025-01-20', weight='120kg'))
+    apply_training_change(training('2025-01-15', weight='120kg'), training('2025-01-20', weight='120kg'))
+    assert sorted(db.docs[('trainingRollups', 's1_2025-W03')]['days']) == ['2025-01-13']
+    assert sorted(db.docs[('trainingRollups', 's1_2025-W04')]['days']) == ['2025-01-20']
+
+    # 与汇总无关的字段变化不写入
+    writes = len(db.writes)
+    reviewed = dict(training('2025-01-20', weight='120kg'), isReviewed=True)
+    apply_training_change(training('2025-01-20', weight='120kg'), reviewed)
+    assert len(db.writes) == writes
+    print("✅ 测试通过: 增量更新")
+
+
+def test_range_rollups_keep_concurrent_update():
+    """测试补建缺失周：重建期间触发器已写入的周不被覆盖"""
+    db = use_fake_db()
+    db.add_training('t1', training('2025-01-13'))
+    db.add_training('t2', training('2025-01-20'))
+
+    concurrent = build_rollup('s1', '2025-01-13', {'2025-01-13': {'volume': 999.0, 'exercises': []}})
+
+    def write_concurrently():
+        db.on_query = None
+        db.docs[('trainingRollups', 's1_2025-W03')] = concurrent
+
+    db.on_query = write_concurrently
+    rollups = get_range_rollups(db, 's1', '2025-01-14', '2025-01-21')
+
+    assert [r['isoWeek'] for r in rollups] == ['2025-W03', '2025-W04']
+    assert rollups[0]['totalVolume'] == 999.0
+    assert db.docs[('trainingRollups', 's1_2025-W03')]['totalVolume'] == 999.0
+    assert db.writes == ['s1_2025-W04']
+    assert rollups[1]['totalVolume'] == 500.0
+
+    # 之后的请求只读汇总文档
+    db.on_query = lambda: (_ for _ in ()).throw(AssertionError('不应查询原始记录'))
+    assert [r['totalVolume'] for r in get_range_rollups(db, 's1', '2025-01-13', '2025-01-26')] == [999.0, 500.0]
+    print("✅ 测试通过: 补建缺失周")
+
+
+def run_all_tests():
+    """运行所有测试"""
+    print("\n🧪 开始运行 training_rollups 单元测试...\n")
+
+    tests = [
+        test_week_bounds,
+        test_build_rollup_aggregates_days,
+        test_apply_training_change_updates_day,
+        test_range_rollups_keep_concurrent_update,
+    ]
+
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ 测试失败: {test.__name__}")
+            print(f"   错误: {e}")
+            failed += 1
+
+    print(f"\n{'='*50}")
+    print(f"测试结果: {passed} 通过, {failed} 失败")
+    print(f"{'='*50}\n")
+
+    return failed == 0
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
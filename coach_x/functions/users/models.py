@@ -38,7 +38,9 @@ class UserLLMProfile:
         training_preferences: Optional[Dict[str, Any]] = None,
         conversation_history: Optional[List[Dict[str, Any]]] = None,
         language_preference: str = '中文',
-        updated_at: Optional[int] = None
+        updated_at: Optional[int] = None,
+        conversation_summary: str = '',
+        summarized_count: int = 0
     ):
         self.user_id = user_id
         self.training_preferences = training_preferences or {
@@ -52,6 +54,9 @@ class UserLLMProfile:
         self.conversation_history = conversation_history or []
         self.language_preference = language_preference
         self.updated_at = updated_at or int(datetime.now().timestamp() * 1000)
+        # 较早对话折叠后的滚动摘要，及已折叠的对话条数
+        self.conversation_summary = conversation_summary
+        self.summarized_count = summarized_count
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -60,7 +65,9 @@ class UserLLMProfile:
             'training_preferences': self.training_preferences,
             'conversation_history': self.conversation_history,
             'language_preference': self.language_preference,
-            'updated_at': self.updated_at
+            'updated_at': self.updated_at,
+            'conversation_summary': self.conversation_summary,
+            'summarized_count': self.summarized_count
         }
     
     @staticmethod
@@ -71,7 +78,9 @@ class UserLLMProfile:
             training_preferences=data.get('training_preferences'),
             conversation_history=data.get('conversation_history'),
             language_preference=data.get('language_preference', '中文'),
-            updated_at=data.get('updated_at')
+            updated_at=data.get('updated_at'),
+            conversation_summary=data.get('conversation_summary', ''),
+            summarized_count=data.get('summarized_count', 0)
         )
     
     def add_conversation(
@@ -128,10 +137,14 @@ class UserLLMProfile:
         """
         return self.conversation_history[-limit:] if self.conversation_history else []
     
-    def build_memory_context(self) -> str:
+    def build_memory_context(self, include_recent: bool = True) -> str:
         """
         构建给 Claude 的 memory context
         
+        Args:
+            include_recent: 是否包含最近对话摘要（对话本身已作为多轮消息发送时设为 False，
+                使 system prompt 在会话内保持稳定以命中缓存）
+        
         Returns:
             格式化的 memory context 字符串
         """
@@ -158,7 +171,7 @@ class UserLLMProfile:
             context_parts.append(f"常见目标：{', '.join(prefs['common_goals'])}")
         
         # 2. 最近对话摘要（只包含用户的请求模式）
-        recent = self.get_recent_conversations(limit=3)
+        recent = self.get_recent_conversations(limit=3) if include_recent else []
         if recent:
             context_parts.append("\n最近的对话模式：")
             for conv in recent:
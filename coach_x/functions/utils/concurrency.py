@@ -0,0 +1,90 @@
+"""
+请求级并发读取工具
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Optional, Sequence
+
+# 默认最大线程数（Firestore 读取为 I/O 密集型）
+DEFAULT_MAX_WORKERS = 8
+
+
+def run_concurrently(
+    tasks: Dict[str, Callable[[], Any]],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    thread_name_prefix: str = 'fanout'
+) -> Dict[str, Any]:
+    """
+    在请求级线程池中并发执行相互独立的读取任务并汇总结果
+
+    Args:
+        tasks: {名称: 无参函数}
+        max_workers: 最大线程数
+        thread_name_prefix: 线程名前缀（便于日志排查）
+
+    Returns:
+        {名称: 返回值}（任一任务抛出异常时向上抛出）
+    """
+    max_workers = max(1, min(max_workers, len(tasks)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix) as executor:
+        futures = {name: executor.submit(task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def run_with_dependencies(
+    tasks: Dict[str, Callable[..., Any]],
+    dependencies: Optional[Dict[str, Sequence[str]]] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    thread_name_prefix: str = 'fanout'
+) -> Dict[str, Any]:
+    """
+    按依赖关系并发执行读取任务：没有依赖的任务立即开始，
+    其余任务在所依赖的任务全部完成后立刻提交（不等待其他无关任务）
+
+    示例：
+        results = run_with_dependencies(
+            {
+                'user': lambda: load_user(),
+                'plans': lambda user: load_plans(user),
+                'memory': lambda: load_memory(),
+            },
+            dependencies={'plans': ['user']},
+        )
+
+    Args:
+        tasks: {名称: 函数}，依赖任务的结果按名称作为关键字参数传入
+        dependencies: {名称: 依赖的任务名列表}
+        max_workers: 最大线程数
+        thread_name_prefix: 线程名前缀（便于日志排查）
+
+    Returns:
+        {名称: 返回值}（任一任务抛出异常时向上抛出）
+    """
+    dependencies = dependencies or {}
+    unknown = {dep for deps in dependencies.values() for dep in deps} - set(tasks)
+    if unknown:
+        raise ValueError(f'未知的依赖任务: {sorted(unknown)}')
+
+    results: Dict[str, Any] = {}
+    pending = dict(tasks)
+    max_workers = max(1, min(max_workers, len(tasks)))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix) as executor:
+        running = {}
+
+        def submit_ready():
+            for name in [n for n in pending if all(dep in results for dep in dependencies.get(n, ()))]:
+                task = pending.pop(name)
+                kwargs = {dep: results[dep] for dep in dependencies.get(name, ())}
+                running[executor.submit(task, **kwargs)] = name
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+            submit_ready()
+
+        if pending:
+            raise ValueError(f'任务存在循环依赖: {sorted(pending)}')
+
+    return results
@@ -27,6 +27,7 @@ abstract class StudentRepository {
     String? searchName,
     String? filterPlanId,
     bool includePlans = true, // 是否包含计划信息，默认true保持向后兼容
+    String? startAfter, // 分页游标：上一页最后一个学生的ID
   });
 
   /// 删除学生
@@ -14,6 +14,7 @@ class StudentRepositoryImpl implements StudentRepository {
     String? searchName,
     String? filterPlanId,
     bool includePlans = true,
+    String? startAfter,
   }) async {
     try {
       // 1. 尝试从缓存读取
@@ -51,6 +52,10 @@ class StudentRepositoryImpl implements StudentRepository {
         params['filter_plan_id'] = filterPlanId;
       }
 
+      if (startAfter != null && startAfter.isNotEmpty) {
+        params['start_after'] = startAfter;
+      }
+
       AppLogger.info('调用fetch_students: $params');
 
       final response = await CloudFunctionsService.call(
@@ -55,6 +55,8 @@ class StudentsNotifier extends StateNotifier<StudentsPageState> {
         searchName: state.searchQuery,
         filterPlanId: state.filterPlanId,
         includePlans: true, // ✅ 明确传入，确保返回计划信息
+        // 游标分页：从当前列表最后一个学生之后继续读取
+        startAfter: state.students.isNotEmpty ? state.students.last.id : null,
       );
 
       // 追加到现有列表